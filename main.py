@@ -4,13 +4,27 @@ import argparse
 import json
 import os
 import random
+import shutil
 import signal
-import time
+import sys
+import tempfile
 
+from cardano.wt.artifact_store import ArtifactStore
 from cardano.wt.blockfrost import BlockfrostApi
 from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.coordinator import VendCoordinator
+from cardano.wt.exclusions import ExclusionTracker
+from cardano.wt.fairness import FairScheduler
+from cardano.wt.fee_cache import FeeCache
+from cardano.wt.journal import VendJournal
+from cardano.wt.leases import InventoryLeases
 from cardano.wt.mint import Mint
-from cardano.wt.nft_vending_machine import NftVendingMachine
+from cardano.wt.multi_collection import CollectionRunner
+from cardano.wt.nft_vending_machine import NftVendingMachine, WhitelistClaims
+from cardano.wt.poll_scheduler import PollScheduler
+from cardano.wt.refunds import RefundEngine
+from cardano.wt.retry import RetryScheduler
+from cardano.wt.simulation import InMemoryCardanoCli, Simulation, SimulatedChain
 from cardano.wt.utxo import Utxo
 from cardano.wt.whitelist.no_whitelist import NoWhitelist
 from cardano.wt.whitelist.asset_whitelist import SingleUseWhitelist, UnlimitedWhitelist
@@ -40,10 +54,19 @@ BLOCKFROST_PROTOCOL_TRANSLATOR = {
 }
 
 # Vending machine internal constants (global required)
+ARCHIVE_SUBDIR = 'archive'
+CLI_PROFILE_FILE = 'cli_profile.json'
+DEAD_LETTER_FILE = 'dead_letters.jsonl'
+EXCLUSIONS_FILE = 'exclusions.json'
+INVENTORY_FILE = 'inventory.json'
+JOURNAL_FILE = 'vend_journal.jsonl'
+LEASES_FILE = 'leases.json'
 LOCKED_SUBDIR = 'in_proc'
+MANIFEST_FILE = 'validation_manifest.json'
 METADATA_SUBDIR = 'metadata'
+REFUND_JOURNAL_FILE = 'refund_journal.jsonl'
+SIMULATION_REPORT_FILE = 'simulation_report.json'
 WL_CONSUMED_DIR_SUBDIR = 'wl_consumed'
-WAIT_TIMEOUT = 15
 
 _program_is_running = True
 
@@ -54,6 +77,29 @@ def end_program(signum, frame):
 def set_interrupt_signal(end_program_func):
     signal.signal(signal.SIGINT, end_program_func)
 
+def is_program_running():
+    return _program_is_running
+
+def machine_file_for(output_dir, filename, idx):
+    if not idx:
+        return os.path.join(output_dir, filename)
+    file_name, file_ext = os.path.splitext(filename)
+    return os.path.join(output_dir, f"{file_name}_{idx}{file_ext}")
+
+def exclusions_file_for(output_dir, idx):
+    return machine_file_for(output_dir, EXCLUSIONS_FILE, idx)
+
+def get_refund_engine(args, idx, payment_addr, payment_sign_key, blockfrost_api, cardano_cli):
+    if not args.refunds:
+        return None
+    journal = VendJournal(machine_file_for(args.output_dir, REFUND_JOURNAL_FILE, idx)).replay()
+    return RefundEngine(payment_addr, payment_sign_key, blockfrost_api, cardano_cli, journal, fee_policy=args.refund_fee_policy, batch_max=args.refund_batch_max, max_wait=args.refund_max_wait)
+
+def get_leases(args, idx):
+    if not args.lease_slots:
+        return None
+    return InventoryLeases(ttl_slots=args.lease_slots, state_file=machine_file_for(args.output_dir, LEASES_FILE, idx)).load()
+
 def seed_random():
     random.seed(321)
 
@@ -79,12 +125,31 @@ def generate_cardano_cli_protocol(translator, blockfrost_input):
 
 def rewritten_protocol_params(blockfrost_protocol_json, output_dir):
     cardanocli_protocol_json = generate_cardano_cli_protocol(BLOCKFROST_PROTOCOL_TRANSLATOR, blockfrost_protocol_json)
-    print(cardanocli_protocol_json)
     protocol_filename = os.path.join(output_dir, 'protocol.json')
-    with open(protocol_filename, 'w') as protocol_file:
+    if os.path.exists(protocol_filename):
+        with open(protocol_filename, 'r') as protocol_file:
+            if json.load(protocol_file) == cardanocli_protocol_json:
+                return protocol_filename
+    print(cardanocli_protocol_json)
+    tmp_filename = f"{protocol_filename}.tmp"
+    with open(tmp_filename, 'w') as protocol_file:
         json.dump(cardanocli_protocol_json, protocol_file)
+    os.replace(tmp_filename, protocol_filename)
     return protocol_filename
 
+def protocol_params_refresher(blockfrost_api, output_dir):
+    """
+    :return: Callable rewriting the cardano-cli protocol parameters whenever
+        Blockfrost's (TTL-cached) parameters change
+    """
+    return lambda: rewritten_protocol_params(blockfrost_api.get_protocol_parameters(), output_dir)
+
+def dump_cli_profile(nft_vending_machine, output_dir):
+    cli_profile = nft_vending_machine.cli_stats()
+    print(f"cardano-cli profile: {json.dumps(cli_profile, indent=4)}")
+    with open(os.path.join(output_dir, CLI_PROFILE_FILE), 'w') as cli_profile_file:
+        json.dump(cli_profile, cli_profile_file, indent=4)
+
 def get_whitelist_type(args, wl_output_dir):
     assert(not (args.no_whitelist and (args.single_use_asset_whitelist or args.unlimited_asset_whitelist)))
     if args.no_whitelist:
@@ -94,6 +159,12 @@ def get_whitelist_type(args, wl_output_dir):
     if args.unlimited_asset_whitelist:
         return UnlimitedWhitelist(args.unlimited_asset_whitelist, wl_output_dir)
 
+def get_fair_scheduler(args):
+    if not (args.fairness or args.per_address_cap):
+        return None
+    weights = {sender: int(weight) for sender, weight in args.sender_weight} if args.sender_weight else {}
+    return FairScheduler(args.fairness if args.fairness else FairScheduler.FIFO, per_address_cap=args.per_address_cap, weights=weights)
+
 def get_donation_amt(donate, free_mint):
     return 0 if ((not donate) or free_mint) else 1000000
 
@@ -101,6 +172,180 @@ def get_mint_price(mint_price, free_mint):
     assert(not (free_mint and mint_price))
     return 0 if free_mint else mint_price
 
+def run_simulation(args):
+    sim_dir = tempfile.mkdtemp(prefix='simulation-', dir=args.output_dir)
+    ensure_output_dirs_made(sim_dir)
+    metadata_dir = shutil.copytree(args.metadata_dir, os.path.join(sim_dir, 'nfts'))
+    whitelist_assets = []
+    whitelist_dir = args.single_use_asset_whitelist if args.single_use_asset_whitelist else args.unlimited_asset_whitelist
+    if whitelist_dir:
+        whitelist_dir = shutil.copytree(whitelist_dir, os.path.join(sim_dir, 'whitelist'))
+        whitelist_assets = sorted(os.listdir(whitelist_dir))
+        args.single_use_asset_whitelist = whitelist_dir if args.single_use_asset_whitelist else None
+        args.unlimited_asset_whitelist = whitelist_dir if args.unlimited_asset_whitelist else None
+    else:
+        args.no_whitelist = True
+    whitelist = get_whitelist_type(args, os.path.join(sim_dir, WL_CONSUMED_DIR_SUBDIR))
+    mint_price = get_mint_price(args.mint_price, args.free_mint)
+    mint = Mint(args.mint_policy, mint_price, get_donation_amt(args.donation, args.free_mint), metadata_dir, args.mint_script_file, 'simulated_policy.skey', whitelist)
+
+    chain = SimulatedChain(latency=args.sim_chain_latency)
+    cardano_cli = InMemoryCardanoCli(protocol_params=args.protocol_params, max_workers=args.cli_workers, latency=args.sim_cli_latency)
+    nft_vending_machine = NftVendingMachine(
+        Simulation.synthetic_address('payment'),
+        'simulated_payment.skey',
+        Simulation.synthetic_address('profit'),
+        args.vend_randomly,
+        args.single_vend_max,
+        mint,
+        chain,
+        cardano_cli,
+        max_tx_size=args.max_tx_size,
+        batch_buyers_max=args.batch_buyers_max,
+        lookup_workers=args.lookup_workers,
+        submit_workers=args.submit_workers,
+        retry_scheduler=RetryScheduler(max_attempts=1),
+        vends_per_cycle=args.vends_per_cycle,
+        fair_scheduler=get_fair_scheduler(args)
+    )
+    nft_vending_machine.validate()
+    payments = Simulation.synthetic_payments(args.sim_payments, mint_price, args.single_vend_max, num_senders=args.sim_senders, whitelist_assets=whitelist_assets, seed=args.sim_seed)
+    report = Simulation(nft_vending_machine, chain, payments, payments_per_cycle=args.sim_payments_per_cycle).run(sim_dir, LOCKED_SUBDIR, METADATA_SUBDIR)
+    cardano_cli.shutdown()
+    print(f"Simulation report: {json.dumps(report, indent=4)}")
+    with open(os.path.join(args.output_dir, SIMULATION_REPORT_FILE), 'w') as report_file:
+        json.dump(report, report_file, indent=4)
+    return report
+
+def get_collection(config, collection_config, blockfrost_api, cardano_cli, fee_cache, max_tx_size):
+    args = argparse.Namespace(**collection_config)
+    args.no_whitelist = not (args.single_use_asset_whitelist or args.unlimited_asset_whitelist)
+    ensure_output_dirs_made(args.output_dir)
+    whitelist = get_whitelist_type(args, os.path.join(args.output_dir, WL_CONSUMED_DIR_SUBDIR))
+    mint = Mint(args.mint_policy, get_mint_price(args.mint_price, args.free_mint), get_donation_amt(args.donation, args.free_mint), args.metadata_dir, args.mint_script_file, args.mint_sign_key, whitelist, inventory_file=os.path.join(args.output_dir, INVENTORY_FILE), validation_workers=config['validation_workers'], manifest_file=os.path.join(args.output_dir, MANIFEST_FILE), full_revalidate=config['full_revalidate'], metadata_store_file=args.metadata_store, metadata_cbor=config['metadata_cbor'])
+    artifact_store = ArtifactStore(
+            args.artifact_hot_dir if args.artifact_hot_dir else args.output_dir,
+            os.path.join(args.output_dir, ARCHIVE_SUBDIR)
+    )
+    nft_vending_machine = NftVendingMachine(
+        args.payment_addr,
+        args.payment_sign_key,
+        args.profit_addr,
+        args.vend_randomly,
+        args.single_vend_max,
+        mint,
+        blockfrost_api,
+        cardano_cli,
+        mainnet=config['mainnet'],
+        artifact_store=artifact_store,
+        max_tx_size=max_tx_size,
+        batch_buyers_max=args.batch_buyers_max,
+        lookup_workers=args.lookup_workers,
+        submit_workers=args.submit_workers,
+        retry_scheduler=RetryScheduler(max_attempts=args.retry_max_attempts, dead_letter_file=os.path.join(args.output_dir, DEAD_LETTER_FILE)),
+        vends_per_cycle=args.vends_per_cycle,
+        journal=VendJournal(os.path.join(args.output_dir, JOURNAL_FILE)).replay(),
+        fair_scheduler=get_fair_scheduler(args),
+        fee_cache=fee_cache,
+        refund_engine=get_refund_engine(args, 0, args.payment_addr, args.payment_sign_key, blockfrost_api, cardano_cli),
+        leases=get_leases(args, 0),
+        metadata_cbor=config['metadata_cbor']
+    )
+    exclusions = [ExclusionTracker(state_file=exclusions_file_for(args.output_dir, 0)).load()]
+    poll_schedulers = [PollScheduler(min_wait=config['poll_min_wait'], max_wait=config['poll_max_wait'])]
+    return CollectionRunner.Collection(args.name, VendCoordinator([nft_vending_machine]), args.output_dir, exclusions, poll_schedulers)
+
+def run_collections(args):
+    config = CollectionRunner.read_config(args.config)
+    os.makedirs(config['output_dir'], exist_ok=True)
+    rate_limiter = BlockfrostApi.RateLimiter(config['api_calls_per_sec'])
+    blockfrost_api = BlockfrostApi(config['blockfrost_project'], mainnet=config['mainnet'], preview=config['preview'], rate_limiter=rate_limiter, protocol_params_ttl=config['protocol_params_ttl'])
+    blockfrost_protocol_params = blockfrost_api.get_protocol_parameters()
+    protocol_params = rewritten_protocol_params(blockfrost_protocol_params, config['output_dir'])
+    cardano_cli = CardanoCli(protocol_params=protocol_params, max_workers=config['cli_workers'], cli_path=config['cardano_cli'])
+    fee_cache = FeeCache(protocol_params, bucket_bytes=config['fee_cache_bucket_bytes'], verify_every=config['fee_cache_verify_every'], refresh_params=protocol_params_refresher(blockfrost_api, config['output_dir'])) if config['fee_cache'] else None
+
+    collections = []
+    setup_failures = {}
+    for collection_config in config['collections']:
+        try:
+            collections.append(get_collection(config, collection_config, blockfrost_api, cardano_cli, fee_cache, int(blockfrost_protocol_params['max_tx_size'])))
+        except Exception as e:
+            print(f"WARNING: Could not set up collection {collection_config['name']}, skipping it: {e}")
+            setup_failures[collection_config['name']] = f"setup: {e}"
+    runner = CollectionRunner(collections)
+    runner.failed.update(setup_failures)
+    print(f"Serving collection(s) {runner.validate()} with {rate_limiter.calls_per_sec} Blockfrost calls/sec shared between them")
+    if runner.failed:
+        print(f"WARNING: Collection(s) not served: {runner.failed}")
+    if args.command == 'validate-collections':
+        print('Successfully validated multi-collection configuration!')
+        return
+
+    runner.recover()
+    for collection in collections:
+        collection.coordinator.machines[0].artifact_store.start()
+    processed = runner.serve(LOCKED_SUBDIR, METADATA_SUBDIR, is_program_running)
+    cardano_cli.shutdown()
+    for collection in collections:
+        machine = collection.coordinator.machines[0]
+        machine.artifact_store.stop()
+        if machine.mint.inventory is not None:
+            machine.mint.inventory.save()
+        machine.journal.close()
+        if machine.refund_engine:
+            machine.refund_engine.journal.close()
+        if machine.leases is not None:
+            machine.leases.save()
+        for machine_exclusions in collection.exclusions:
+            machine_exclusions.save()
+    print(f"Mint requests picked up per collection: {processed}")
+    print(f"Blockfrost calls held back by the rate limiter: {rate_limiter.waits}")
+    if fee_cache:
+        print(f"Fee cache at shutdown: {fee_cache.stats()}")
+
+def get_collections_parser():
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument('--config', required=True, help='JSON file listing the collections to serve (see README) and the settings they share')
+    return parser
+
+def get_simulation_parser():
+    parser = argparse.ArgumentParser(add_help=False)
+
+    price = parser.add_mutually_exclusive_group(required=True)
+    price.add_argument('--mint-price', type=int, help='Price in LOVELACE that is being charged for each NFT (min 5₳)')
+    price.add_argument('--free-mint', action='store_true', help='Perform a free mint (user gets a rebate of their ADA and receives "--single-vend-max")')
+
+    parser.add_argument('--mint-policy', required=True, help='Policy ID of the mint being performed')
+    parser.add_argument('--mint-script-file', required=True, help='Local path of scripting file for mint')
+    parser.add_argument('--metadata-dir', required=True, help='Local folder where Cardano NFT metadata (e.g., 721s) are stored, the simulation works on a copy')
+    parser.add_argument('--output-dir', required=True, help='Local folder where the simulation scratch directory and report are stored')
+    parser.add_argument('--single-vend-max', type=int, required=True, help='Backend limit enforced on NFTs vended at once')
+    parser.add_argument('--vend-randomly', action='store_true', help='Randomly pick from the metadata directory (using seed 321) when listing')
+    parser.add_argument('--donation', action='store_true', help='Send a 1₳ donation per txn to the dev (no worries!)')
+    parser.add_argument('--protocol-params', type=str, help='cardano-cli protocol parameters file used for fees (default is the fake CLI fee constants)')
+    parser.add_argument('--max-tx-size', type=int, default=16384, help='Maximum transaction size in bytes (default is 16384)')
+    parser.add_argument('--cli-workers', type=int, default=1, help='Number of mint requests to run through the in-memory cardano-cli concurrently (default is 1 [serial])')
+    parser.add_argument('--lookup-workers', type=int, default=1, help='Number of mint requests whose sender is looked up concurrently (default is 1)')
+    parser.add_argument('--submit-workers', type=int, default=1, help='Number of signed transactions submitted concurrently (default is 1)')
+    parser.add_argument('--batch-buyers-max', type=int, default=1, help='Maximum number of buyers packed into a single mint transaction (default is 1)')
+    parser.add_argument('--vends-per-cycle', type=int, help='Maximum number of mint requests picked up per cycle (default is unlimited)')
+    parser.add_argument('--fairness', choices=FairScheduler.POLICIES, help='Order in which the senders of a cycle are served (default is fifo)')
+    parser.add_argument('--per-address-cap', type=int, help='Maximum number of mint requests from one sending address picked up per cycle (default is unlimited)')
+    parser.add_argument('--sender-weight', nargs=2, action='append', metavar=('SENDER_ADDR', 'WEIGHT'), help='Requests taken per turn from SENDER_ADDR under the weighted policy, may be repeated')
+    parser.add_argument('--sim-payments', type=int, required=True, help='Number of synthetic payments, each for 1 to --single-vend-max NFTs')
+    parser.add_argument('--sim-senders', type=int, default=1, help='Number of distinct sending addresses the payments rotate through (default is 1)')
+    parser.add_argument('--sim-payments-per-cycle', type=int, help='Payments arriving before each vend cycle (default is all at once)')
+    parser.add_argument('--sim-seed', type=int, default=321, help='Seed for the synthetic payment amounts (default is 321)')
+    parser.add_argument('--sim-cli-latency', type=float, default=0.0, help='Artificial seconds added to every cardano-cli call (default is 0)')
+    parser.add_argument('--sim-chain-latency', type=float, default=0.0, help='Artificial seconds added to every chain call (default is 0)')
+
+    whitelist = parser.add_mutually_exclusive_group()
+    whitelist.add_argument('--single-use-asset-whitelist', type=str, help='Asset-based whitelist directory (copied), each payment carries one of its assets in turn')
+    whitelist.add_argument('--unlimited-asset-whitelist', type=str, help='Asset-based whitelist directory (copied), each payment carries one of its assets in turn')
+    parser.set_defaults(no_whitelist=False)
+    return parser
+
 def get_parser():
     parser = argparse.ArgumentParser(add_help=False)
 
@@ -122,6 +367,34 @@ def get_parser():
     parser.add_argument('--single-vend-max', type=int, required=True, help='Backend limit enforced on NFTs vended at once')
     parser.add_argument('--vend-randomly', action='store_true', help='Randomly pick from the metadata directory (using seed 321) when listing')
     parser.add_argument('--donation', action='store_true', help='Send a 1₳ donation per txn to the dev (no worries!)')
+    parser.add_argument('--artifact-hot-dir', type=str, help='Local folder (e.g., a tmpfs mount like /dev/shm/vm) for in-flight transaction files, completed files are archived under the output directory (default is the output directory)')
+    parser.add_argument('--cardano-cli', type=str, default=CardanoCli.DEFAULT_CLI_PATH, help='Executable used for cardano-cli calls (default is cardano-cli on the PATH)')
+    parser.add_argument('--api-calls-per-sec', type=float, default=10, help='Ceiling on Blockfrost calls per second across every thread (default is 10)')
+    parser.add_argument('--protocol-params-ttl', type=float, default=3600, help='Seconds the protocol parameters fetched from Blockfrost are reused before being fetched (and rewritten for cardano-cli and the fee cache) again (default is 3600)')
+    parser.add_argument('--validation-workers', type=int, default=1, help='Number of processes the metadata directory is validated across at startup (0 uses the core count, default is 1 [serial])')
+    parser.add_argument('--metadata-store', type=str, help='SQLite metadata store (see scripts/metadata_store.py) to vend from instead of moving files out of --metadata-dir, new files in --metadata-dir are imported into it at startup')
+    parser.add_argument('--full-revalidate', action='store_true', help='Validate every metadata file at startup instead of trusting the files the validation manifest in the output directory saw unchanged')
+    parser.add_argument('--cli-workers', type=int, default=1, help='Number of mint requests to run through cardano-cli concurrently (0 uses the core count, default is 1 [serial])')
+    parser.add_argument('--lookup-workers', type=int, default=1, help='Number of mint requests whose sender is looked up on chain concurrently (default is 1)')
+    parser.add_argument('--submit-workers', type=int, default=1, help='Number of signed transactions submitted concurrently (default is 1)')
+    parser.add_argument('--retry-max-attempts', type=int, default=5, help='Attempts made (with exponential backoff) for a mint request failing unexpectedly before it is written to the dead-letter file in the output directory (default is 5)')
+    parser.add_argument('--vends-per-cycle', type=int, help='Maximum number of mint requests picked up per polling cycle, the next cycle starts immediately when more are waiting (default is unlimited)')
+    parser.add_argument('--poll-min-wait', type=float, default=5, help='Seconds to wait before polling again after payments were processed (default is 5)')
+    parser.add_argument('--poll-max-wait', type=float, default=120, help='Ceiling on the gradually growing wait between polls while no payments arrive (default is 120)')
+    parser.add_argument('--extra-payment', nargs=2, action='append', metavar=('PAYMENT_ADDR', 'PAYMENT_SIGN_KEY'), help='Additional payment address (and its signing key) served in parallel from the same inventory and whitelist, may be repeated')
+    parser.add_argument('--refunds', action='store_true', help='Return rejected payments (e.g., too little lovelace or native tokens) to their senders in batched transactions instead of leaving them for manual review')
+    parser.add_argument('--refund-fee-policy', choices=RefundEngine.FEE_POLICIES, default=RefundEngine.FEE_SPLIT, help='How a refund txn fee is shared by its senders: split (evenly) or proportional (to the lovelace refunded) (default is split)')
+    parser.add_argument('--refund-batch-max', type=int, default=20, help='Maximum number of rejected UTxOs refunded in one transaction (default is 20)')
+    parser.add_argument('--refund-max-wait', type=float, default=300, help='Seconds the oldest rejected UTxO waits for a refund batch to fill up (default is 300)')
+    parser.add_argument('--fee-cache', action='store_true', help='Reuse fees of same-shaped transactions (inputs, outputs, witnesses, size bucket) instead of calling calculate-min-fee for every vend')
+    parser.add_argument('--fee-cache-bucket-bytes', type=int, default=256, help='Width of the transaction size buckets, cached fees are padded by txFeePerByte times this width (default is 256)')
+    parser.add_argument('--fee-cache-verify-every', type=int, default=100, help='Recompute every Nth cached fee with calculate-min-fee to verify it, 0 never verifies (default is 100)')
+    parser.add_argument('--fairness', choices=FairScheduler.POLICIES, help='Order in which the senders of a polling cycle are served: fifo (chain order), round_robin (one request per sender in turn) or weighted (--sender-weight requests per sender in turn) (default is fifo), requests from one sender are served in chain order')
+    parser.add_argument('--per-address-cap', type=int, help='Maximum number of mint requests from one sending address picked up per polling cycle, the rest wait for the next cycle (default is unlimited)')
+    parser.add_argument('--sender-weight', nargs=2, action='append', metavar=('SENDER_ADDR', 'WEIGHT'), help='Requests taken per turn from SENDER_ADDR under the weighted policy (others take 1), may be repeated')
+    parser.add_argument('--lease-slots', type=int, help='Reserve the NFTs of each mint txn for this many slots (enforced with --invalid-hereafter), NFTs whose txn has not confirmed by then go back into the inventory and the payment is vended again (default is no leases)')
+    parser.add_argument('--metadata-cbor', action='store_true', help='Hand cardano-cli each txn metadata as raw CBOR (--metadata-cbor-file) assembled from the NFT fragments precompiled during validation, strings over 64 bytes chunked, instead of JSON it re-encodes on every build')
+    parser.add_argument('--batch-buyers-max', type=int, default=1, help='Maximum number of buyers packed into a single mint transaction, batches are also capped by max_tx_size (default is 1 [one txn per buyer])')
 
     whitelist = parser.add_mutually_exclusive_group(required=True)
     whitelist.add_argument('--no-whitelist', action='store_true', help='No whitelist required for mints')
@@ -132,10 +405,22 @@ def get_parser():
     subcommands = cli_parser.add_subparsers(title='subcommands', required=True, dest='command', description='valid subcommands', help='Options for the vending machine instantiation')
     subcommands.add_parser('run', help='Run the vending machine with the specified configuration', parents=[parser])
     subcommands.add_parser('validate', help='Only validate the vending machine with the specified configuration, do NOT run', parents=[parser])
+    subcommands.add_parser('run-collections', help='Serve every collection of a multi-collection config file from this one process', parents=[get_collections_parser()])
+    subcommands.add_parser('validate-collections', help='Only validate the collections of a multi-collection config file, do NOT run', parents=[get_collections_parser()])
+    subcommands.add_parser('simulate', help='Vend a synthetic stream of payments against an in-memory chain and cardano-cli, then report throughput', parents=[get_simulation_parser()])
     return cli_parser
 
 if __name__ == "__main__":
     _args = get_parser().parse_args()
+    if _args.command == 'simulate':
+        seed_random()
+        run_simulation(_args)
+        sys.exit(0)
+    if _args.command in ['run-collections', 'validate-collections']:
+        set_interrupt_signal(end_program)
+        seed_random()
+        run_collections(_args)
+        sys.exit(0)
 
     set_interrupt_signal(end_program)
     seed_random()
@@ -144,37 +429,81 @@ if __name__ == "__main__":
     _mint_price = get_mint_price(_args.mint_price, _args.free_mint)
     _donation_amt = get_donation_amt(_args.donation, _args.free_mint)
     _whitelist = get_whitelist_type(_args, os.path.join(_args.output_dir, WL_CONSUMED_DIR_SUBDIR))
-    _mint = Mint(_args.mint_policy, _mint_price, _donation_amt, _args.metadata_dir, _args.mint_script_file, _args.mint_sign_key, _whitelist)
+    _mint = Mint(_args.mint_policy, _mint_price, _donation_amt, _args.metadata_dir, _args.mint_script_file, _args.mint_sign_key, _whitelist, inventory_file=os.path.join(_args.output_dir, INVENTORY_FILE), validation_workers=_args.validation_workers, manifest_file=os.path.join(_args.output_dir, MANIFEST_FILE), full_revalidate=_args.full_revalidate, metadata_store_file=_args.metadata_store, metadata_cbor=_args.metadata_cbor)
 
-    _blockfrost_api = BlockfrostApi(_args.blockfrost_project, mainnet=_args.mainnet, preview=_args.preview)
+    _blockfrost_api = BlockfrostApi(_args.blockfrost_project, mainnet=_args.mainnet, preview=_args.preview, rate_limiter=BlockfrostApi.RateLimiter(_args.api_calls_per_sec), protocol_params_ttl=_args.protocol_params_ttl)
 
     _blockfrost_protocol_params = _blockfrost_api.get_protocol_parameters()
     _protocol_params = rewritten_protocol_params(_blockfrost_protocol_params, _args.output_dir)
     max_txn_fee = (_blockfrost_protocol_params['min_fee_a'] * _blockfrost_protocol_params['max_tx_size']) + _blockfrost_protocol_params['min_fee_b']
     print(f"Max txn fee is a * size(tx) + b: {max_txn_fee}");
-    _cardano_cli = CardanoCli(protocol_params=_protocol_params)
+    _cardano_cli = CardanoCli(protocol_params=_protocol_params, max_workers=_args.cli_workers, cli_path=_args.cardano_cli)
+    _artifact_store = ArtifactStore(
+            _args.artifact_hot_dir if _args.artifact_hot_dir else _args.output_dir,
+            os.path.join(_args.output_dir, ARCHIVE_SUBDIR)
+    )
 
-    _nft_vending_machine = NftVendingMachine(
-            _args.payment_addr,
-            _args.payment_sign_key,
+    _retry_scheduler = RetryScheduler(max_attempts=_args.retry_max_attempts, dead_letter_file=os.path.join(_args.output_dir, DEAD_LETTER_FILE))
+    _journal = VendJournal(os.path.join(_args.output_dir, JOURNAL_FILE)).replay()
+    _whitelist_claims = WhitelistClaims()
+    _fair_scheduler = get_fair_scheduler(_args)
+    _fee_cache = FeeCache(_protocol_params, bucket_bytes=_args.fee_cache_bucket_bytes, verify_every=_args.fee_cache_verify_every, refresh_params=protocol_params_refresher(_blockfrost_api, _args.output_dir)) if _args.fee_cache else None
+    _payments = [(_args.payment_addr, _args.payment_sign_key)] + (_args.extra_payment if _args.extra_payment else [])
+    _nft_vending_machines = [
+        NftVendingMachine(
+            payment_addr,
+            payment_sign_key,
             _args.profit_addr,
             _args.vend_randomly,
             _args.single_vend_max,
             _mint,
             _blockfrost_api,
             _cardano_cli,
-            mainnet=_args.mainnet
-    )
-    _nft_vending_machine.validate()
-    print(f"Initialized vending machine with the following parameters")
-    print(_nft_vending_machine.as_json())
+            mainnet=_args.mainnet,
+            artifact_store=_artifact_store,
+            max_tx_size=int(_blockfrost_protocol_params['max_tx_size']),
+            batch_buyers_max=_args.batch_buyers_max,
+            lookup_workers=_args.lookup_workers,
+            submit_workers=_args.submit_workers,
+            retry_scheduler=_retry_scheduler,
+            vends_per_cycle=_args.vends_per_cycle,
+            journal=_journal,
+            whitelist_claims=_whitelist_claims,
+            fair_scheduler=_fair_scheduler,
+            fee_cache=_fee_cache,
+            refund_engine=get_refund_engine(_args, idx, payment_addr, payment_sign_key, _blockfrost_api, _cardano_cli),
+            leases=get_leases(_args, idx),
+            metadata_cbor=_args.metadata_cbor
+        ) for idx, (payment_addr, payment_sign_key) in enumerate(_payments)
+    ]
+    _coordinator = VendCoordinator(_nft_vending_machines)
+    _coordinator.validate()
+    print(f"Initialized vending machine(s) with the following parameters")
+    for _nft_vending_machine in _nft_vending_machines:
+        print(_nft_vending_machine.as_json())
 
     if _args.command == 'validate':
         print('Successfully validated vending machine configuration!')
     elif _args.command == 'run':
-        exclusions = set()
-        while _program_is_running:
-            _nft_vending_machine.vend(_args.output_dir, LOCKED_SUBDIR, METADATA_SUBDIR, exclusions)
-            time.sleep(WAIT_TIMEOUT)
+        exclusions = [ExclusionTracker(state_file=exclusions_file_for(_args.output_dir, idx)).load() for idx in range(len(_nft_vending_machines))]
+        _coordinator.recover(exclusions)
+        _poll_schedulers = [PollScheduler(min_wait=_args.poll_min_wait, max_wait=_args.poll_max_wait) for machine in _nft_vending_machines]
+        _artifact_store.start()
+        _coordinator.serve(_args.output_dir, LOCKED_SUBDIR, METADATA_SUBDIR, exclusions, _poll_schedulers, is_program_running)
+        _cardano_cli.shutdown()
+        _artifact_store.stop()
+        _mint.inventory.save()
+        _journal.close()
+        for _nft_vending_machine in _nft_vending_machines:
+            if _nft_vending_machine.refund_engine:
+                _nft_vending_machine.refund_engine.journal.close()
+            if _nft_vending_machine.leases is not None:
+                _nft_vending_machine.leases.save()
+        for machine_exclusions in exclusions:
+            machine_exclusions.save()
+            print(f"Exclusions at shutdown: {machine_exclusions.stats()}")
+        dump_cli_profile(_nft_vending_machines[0], _args.output_dir)
+        if _fee_cache:
+            print(f"Fee cache at shutdown: {_fee_cache.stats()}")
     else:
         raise ValueError(f"Unknown vending machine subcommand: {_args.subparser_name}")
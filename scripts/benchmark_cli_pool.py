@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import os
+import tempfile
+import time
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.fake_cardano_cli import FakeCardanoCli
+
+DUMMY_LOVELACE = 10000000
+
+def dummy_tx_in(txn_num):
+    return f"--tx-in {hashlib.sha256(str(txn_num).encode('UTF-8')).hexdigest()}#0"
+
+def build_fee_sign(cardano_cli, output_dir, txn_num, address, signing_key):
+    tx_ins = [dummy_tx_in(txn_num)]
+    tx_outs = [f"--tx-out '{address}+{DUMMY_LOVELACE}'"]
+    txn_id = f"bench_{txn_num}"
+    build_tmp = cardano_cli.build_raw_txn(output_dir, txn_id, tx_ins, tx_outs, 0, None, [])
+    fee = cardano_cli.calculate_min_fee(build_tmp, len(tx_ins), len(tx_outs), 1)
+    tx_outs = [f"--tx-out '{address}+{DUMMY_LOVELACE - fee}'"]
+    build = cardano_cli.build_raw_txn(output_dir, txn_id, tx_ins, tx_outs, fee, None, [])
+    return cardano_cli.sign_txn([signing_key], build)
+
+def run_serial(cardano_cli, output_dir, num_txns, address, signing_key):
+    start = time.time()
+    for txn_num in range(num_txns):
+        build_fee_sign(cardano_cli, output_dir, txn_num, address, signing_key)
+    return time.time() - start
+
+def run_pooled(cardano_cli, output_dir, num_txns, address, signing_key):
+    start = time.time()
+    futures = cardano_cli.submit_batch([
+        (lambda txn_num=txn_num: build_fee_sign(cardano_cli, output_dir, txn_num, address, signing_key)) for txn_num in range(num_txns)
+    ])
+    for future in futures:
+        future.result()
+    elapsed = time.time() - start
+    cardano_cli.shutdown()
+    return elapsed
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Compare serial and pooled cardano-cli throughput for build, fee and sign')
+    parser.add_argument('--address', required=True, help='Cardano address used as the output of every benchmark transaction')
+    parser.add_argument('--cardano-cli', type=str, default=CardanoCli.DEFAULT_CLI_PATH, help='Executable used for cardano-cli calls (e.g., the output of FakeCardanoCli.command() for offline runs)')
+    parser.add_argument('--fake-cli-latency', type=float, help='Benchmark against the deterministic fake cardano-cli with this many seconds of latency per call (overrides --cardano-cli)')
+    parser.add_argument('--num-txns', type=int, default=50, help='Number of transactions to build, fee and sign in each mode')
+    parser.add_argument('--protocol-params', required=True, help='Local path of a cardano-cli formatted protocol parameters file')
+    parser.add_argument('--signing-key', required=True, help='Location on disk of a signing key used to sign every benchmark transaction')
+    parser.add_argument('--workers', type=int, default=0, help='Size of the worker pool (default is 0 [core count])')
+    return parser
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    output_dir = tempfile.mkdtemp(prefix='cardano-cli-bench-')
+    os.mkdir(os.path.join(output_dir, CardanoCli.TXN_DIR))
+
+    cli_path = FakeCardanoCli.command(latency=args.fake_cli_latency) if args.fake_cli_latency is not None else args.cardano_cli
+
+    serial_cli = CardanoCli(protocol_params=args.protocol_params, cli_path=cli_path)
+    serial_secs = run_serial(serial_cli, output_dir, args.num_txns, args.address, args.signing_key)
+
+    pooled_cli = CardanoCli(protocol_params=args.protocol_params, max_workers=args.workers, cli_path=cli_path)
+    pooled_secs = run_pooled(pooled_cli, output_dir, args.num_txns, args.address, args.signing_key)
+
+    print(f"serial: {args.num_txns} txns in {serial_secs:.2f}s ({args.num_txns / serial_secs:.2f} txns/sec)")
+    print(f"pooled ({pooled_cli.max_workers} workers): {args.num_txns} txns in {pooled_secs:.2f}s ({args.num_txns / pooled_secs:.2f} txns/sec)")
+    print(f"speedup: {serial_secs / pooled_secs:.2f}x")
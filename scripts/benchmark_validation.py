@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from cardano.wt.mint import Mint
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+DUMMY_POLICY = 'ab' * 28
+
+def synthetic_collection(nfts_dir, num_nfts):
+    os.makedirs(nfts_dir)
+    for serial in range(num_nfts):
+        asset_name = f"Synthetic {serial}"
+        nft = {
+            'name': asset_name,
+            'image': f"ipfs://Qm{serial:044d}",
+            'mediaType': 'image/png',
+            'attributes': [{'trait': 'background', 'value': f"Color {serial % 17}"}, {'trait': 'eyes', 'value': f"Style {serial % 23}"}],
+            'files': [{'src': [f"ipfs://Qm{serial:044d}"], 'mediaType': 'image/png', 'name': asset_name}]
+        }
+        with open(os.path.join(nfts_dir, f"{asset_name}.json"), 'w') as nft_file:
+            json.dump({'721': {DUMMY_POLICY: {asset_name: nft}}}, nft_file)
+
+def time_validation(work_dir, num_nfts, workers):
+    nfts_dir = os.path.join(work_dir, f"nfts_{num_nfts}")
+    synthetic_collection(nfts_dir, num_nfts)
+    script_file = os.path.join(work_dir, 'policy.script')
+    with open(script_file, 'w') as script:
+        json.dump({'type': 'all', 'scripts': []}, script)
+    mint = Mint(DUMMY_POLICY, 0, 0, nfts_dir, script_file, None, NoWhitelist(), validation_workers=workers)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.time()
+        mint.validate()
+        elapsed = time.time() - start
+    shutil.rmtree(nfts_dir)
+    return elapsed
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Time Mint.validate on synthetic collections of increasing size to check that it scales linearly')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000], help='Collection sizes to validate (default is 10000 100000 1000000)')
+    parser.add_argument('--workers', type=int, default=1, help='Validation processes (0 uses the core count, default is 1)')
+    parser.add_argument('--work-dir', type=str, help='Folder the synthetic collections are written to (default is a temporary folder)')
+    return parser
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    work_dir = tempfile.mkdtemp(prefix='benchmark-validation-', dir=args.work_dir)
+    baseline = None
+    for num_nfts in sorted(args.sizes):
+        elapsed = time_validation(work_dir, num_nfts, args.workers)
+        per_nft = elapsed / num_nfts
+        baseline = baseline if baseline else per_nft
+        print(f"{num_nfts} NFTs: {elapsed:.2f}s total, {per_nft * 1000000:.1f}us per NFT ({per_nft / baseline:.2f}x the smallest collection)")
+    shutil.rmtree(work_dir)
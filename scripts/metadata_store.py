@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+import argparse
+
+from cardano.wt.metadata_store import MetadataStore
+
+def get_parser():
+    parser = argparse.ArgumentParser(description='Convert between a metadata directory (one JSON file per NFT) and a packed metadata store')
+    parser.add_argument('--store', required=True, help='SQLite metadata store file (created if it does not exist)')
+    subcommands = parser.add_subparsers(title='subcommands', required=True, dest='command', description='valid subcommands')
+
+    import_parser = subcommands.add_parser('import', help='Import the files of a metadata directory not yet in the store')
+    import_parser.add_argument('--metadata-dir', required=True, help='Local folder of Cardano NFT metadata (e.g., 721s) to import')
+    import_parser.add_argument('--state', choices=MetadataStore.STATES, default=MetadataStore.AVAILABLE, help='State the imported NFTs start in (e.g., minted for an in_proc folder of a finished drop, default is available)')
+
+    export_parser = subcommands.add_parser('export', help='Write the NFTs of the store back out as one metadata file each')
+    export_parser.add_argument('--metadata-dir', required=True, help='Local folder the metadata files are written to')
+    export_parser.add_argument('--state', choices=MetadataStore.STATES, action='append', help='State of the NFTs to export, may be repeated (default is available)')
+
+    subcommands.add_parser('counts', help='Print the number of NFTs in each state')
+    return parser
+
+if __name__ == "__main__":
+    args = get_parser().parse_args()
+    store = MetadataStore(args.store)
+    if args.command == 'import':
+        print(f"Imported {store.import_dir(args.metadata_dir, state=args.state)} file(s) into {args.store}")
+    elif args.command == 'export':
+        print(f"Exported {store.export_dir(args.metadata_dir, states=args.state if args.state else [MetadataStore.AVAILABLE])} file(s) from {args.store}")
+    print(store.counts())
+    store.close()
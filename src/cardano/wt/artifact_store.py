@@ -0,0 +1,176 @@
+import glob
+import itertools
+import os
+import shutil
+import threading
+import time
+import zipfile
+
+from cardano.wt.cardano_cli import CardanoCli
+
+_ID_COUNTER = itertools.count()
+
+def next_artifact_id():
+    """
+    Generate an identifier for a vend's artifacts that is unique within the
+    process (and across restarts) even when many vends start in the same
+    second.
+
+    :return: String of the form ``<epoch_ms>_<pid>_<sequence>``
+    """
+    return f"{int(time.time() * 1000)}_{os.getpid()}_{next(_ID_COUNTER):06d}"
+
+"""
+Placement and lifecycle of the files each vend hands to cardano-cli (raw
+builds, signed transactions and merged metadata).  Hot files live under
+``hot_dir`` (which can be a tmpfs mount such as ``/dev/shm`` to keep them in
+RAM) and, once a vend completes, are compacted in the background into
+size-rotated zip archives under ``archive_dir``.  Signed transactions that
+recovery may have to resubmit are also copied (durably) under ``archive_dir``
+until their vend completes, so they survive a reboot that wipes ``hot_dir``.
+"""
+class ArtifactStore(object):
+
+    ARCHIVE_PREFIX = 'artifacts-'
+    DURABLE_DIR = 'signed'
+    METADATA_DIR = 'metadata'
+    RAM_DIR = '/dev/shm'
+
+    _COMPACT_INTERVAL_SEC = 60
+    _MAX_ARCHIVE_BYTES = 64 * 1024 * 1024
+
+    def in_memory(archive_dir, **kwargs):
+        """
+        Create a store whose hot files live on the RAM-backed ``/dev/shm``
+        tmpfs (falling back to the archive directory where it is unavailable).
+        """
+        ram_root = ArtifactStore.RAM_DIR if os.path.isdir(ArtifactStore.RAM_DIR) else archive_dir
+        hot_dir = os.path.join(ram_root, f"cardano-vm-{os.getpid()}")
+        return ArtifactStore(hot_dir, archive_dir, **kwargs)
+
+    def __init__(self, hot_dir, archive_dir, max_archive_bytes=_MAX_ARCHIVE_BYTES, max_archives=None, compact_interval=_COMPACT_INTERVAL_SEC):
+        self.hot_dir = hot_dir
+        self.archive_dir = archive_dir
+        self.max_archive_bytes = max_archive_bytes
+        self.max_archives = max_archives
+        self.compact_interval = compact_interval
+        self.txn_dir = os.path.join(hot_dir, CardanoCli.TXN_DIR)
+        self.metadata_dir = os.path.join(hot_dir, ArtifactStore.METADATA_DIR)
+        self.durable_dir = os.path.join(archive_dir, ArtifactStore.DURABLE_DIR)
+        os.makedirs(self.txn_dir, exist_ok=True)
+        os.makedirs(self.metadata_dir, exist_ok=True)
+        os.makedirs(self.archive_dir, exist_ok=True)
+
+        self.__completed = []
+        self.__lock = threading.Lock()
+        self.__stopped = threading.Event()
+        self.__compactor = None
+
+    def new_id(self):
+        return next_artifact_id()
+
+    def files_for(self, artifact_id):
+        """
+        :param artifact_id: The identifier returned by ``new_id``
+        :return: Every hot file currently belonging to the artifact
+        """
+        return sorted(
+            glob.glob(os.path.join(glob.escape(self.txn_dir), f"txn_{glob.escape(artifact_id)}.*")) +
+            glob.glob(os.path.join(glob.escape(self.metadata_dir), f"{glob.escape(artifact_id)}.*"))
+        )
+
+    def persist(self, hot_file):
+        """
+        Copy a hot file (e.g., a signed transaction) to ``durable_dir`` and
+        fsync it, the copy is removed once its artifact is compacted.
+
+        :return: Path of the durable copy
+        """
+        os.makedirs(self.durable_dir, exist_ok=True)
+        durable_file = os.path.join(self.durable_dir, os.path.basename(hot_file))
+        tmp_file = f"{durable_file}.tmp"
+        shutil.copyfile(hot_file, tmp_file)
+        with open(tmp_file, 'rb') as tmp_filehandle:
+            os.fsync(tmp_filehandle.fileno())
+        os.replace(tmp_file, durable_file)
+        dir_fd = os.open(self.durable_dir, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        return durable_file
+
+    def complete(self, artifact_id):
+        """
+        Mark a vend's artifacts as no longer needed by cardano-cli so that the
+        next compaction moves them into an archive.
+        """
+        with self.__lock:
+            self.__completed.append(artifact_id)
+
+    def pending(self):
+        with self.__lock:
+            return len(self.__completed)
+
+    def __archives(self):
+        return sorted(glob.glob(os.path.join(glob.escape(self.archive_dir), f"{ArtifactStore.ARCHIVE_PREFIX}*.zip")))
+
+    def __current_archive(self):
+        archives = self.__archives()
+        if archives and os.path.getsize(archives[-1]) < self.max_archive_bytes:
+            return archives[-1]
+        next_seq = int(os.path.basename(archives[-1])[len(ArtifactStore.ARCHIVE_PREFIX):-len('.zip')]) + 1 if archives else 0
+        return os.path.join(self.archive_dir, f"{ArtifactStore.ARCHIVE_PREFIX}{next_seq:06d}.zip")
+
+    def __enforce_retention(self):
+        if not self.max_archives:
+            return
+        archives = self.__archives()
+        for expired in archives[:max(0, len(archives) - self.max_archives)]:
+            os.remove(expired)
+
+    def compact(self):
+        """
+        Move all completed artifacts into the current archive (rotating to a
+        new archive once ``max_archive_bytes`` is exceeded).
+
+        :return: Number of artifacts archived
+        """
+        with self.__lock:
+            completed = self.__completed
+            self.__completed = []
+        if not completed:
+            return 0
+        for artifact_id in completed:
+            with zipfile.ZipFile(self.__current_archive(), 'a', compression=zipfile.ZIP_DEFLATED) as archive:
+                for artifact_file in self.files_for(artifact_id):
+                    archive.write(artifact_file, os.path.relpath(artifact_file, self.hot_dir))
+                    os.remove(artifact_file)
+            for durable_file in glob.glob(os.path.join(glob.escape(self.durable_dir), f"txn_{glob.escape(artifact_id)}.*")):
+                os.remove(durable_file)
+        self.__enforce_retention()
+        return len(completed)
+
+    def __compact_periodically(self):
+        while not self.__stopped.wait(self.compact_interval):
+            self.compact()
+
+    def start(self):
+        """
+        Begin background compaction every ``compact_interval`` seconds.
+        """
+        if self.__compactor:
+            return
+        self.__stopped.clear()
+        self.__compactor = threading.Thread(target=self.__compact_periodically, name='artifact-compactor', daemon=True)
+        self.__compactor.start()
+
+    def stop(self):
+        """
+        Stop background compaction and archive anything still outstanding.
+        """
+        if self.__compactor:
+            self.__stopped.set()
+            self.__compactor.join()
+            self.__compactor = None
+        self.compact()
@@ -1,5 +1,6 @@
 import json
 import requests
+import threading
 import time
 
 from http import HTTPStatus
@@ -21,12 +22,54 @@ class BlockfrostApi(object):
     _MAX_POST_RETRIES = 2
     _UTXO_LIST_LIMIT = 100
 
-    def __init__(self, project, mainnet=False, preview=False, max_get_retries=_MAX_GET_RETRIES, max_post_retries=_MAX_POST_RETRIES):
+    """
+    Token bucket spacing out API calls (from any number of threads) to at
+    most ``calls_per_sec`` per second, allowing bursts of up to ``burst``
+    calls after an idle period.
+    """
+    class RateLimiter(object):
+
+        def __init__(self, calls_per_sec, burst=None, clock=time.monotonic, sleep=time.sleep):
+            if calls_per_sec <= 0:
+                raise ValueError(f"Rate limit must be positive, found {calls_per_sec} calls/sec")
+            self.calls_per_sec = calls_per_sec
+            self.burst = burst if burst else calls_per_sec
+            self.waits = 0
+            self.__clock = clock
+            self.__sleep = sleep
+            self.__tokens = self.burst
+            self.__last = clock()
+            self.__lock = threading.Lock()
+
+        def acquire(self):
+            with self.__lock:
+                now = self.__clock()
+                self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.calls_per_sec)
+                self.__last = now
+                self.__tokens -= 1
+                wait = -self.__tokens / self.calls_per_sec if self.__tokens < 0 else 0
+                if wait:
+                    self.waits += 1
+            if wait:
+                self.__sleep(wait)
+
+    def __init__(self, project, mainnet=False, preview=False, max_get_retries=_MAX_GET_RETRIES, max_post_retries=_MAX_POST_RETRIES, rate_limiter=None, protocol_params_ttl=None):
+        """
+        :param rate_limiter: ``RateLimiter`` every call waits on, share one
+            instance between clients using the same project
+        :param protocol_params_ttl: Seconds the protocol parameters are
+            cached for (default is to fetch them on every call)
+        """
         self.project = project
         self.mainnet = mainnet
         self.preview = preview
         self.max_get_retries = max_get_retries
         self.max_post_retries = max_post_retries
+        self.rate_limiter = rate_limiter
+        self.protocol_params_ttl = protocol_params_ttl
+        self.__session = requests.Session()
+        self.__protocol_params = None
+        self.__protocol_params_at = None
 
     def __get_api_base(self):
         identifier = 'mainnet' if self.mainnet else 'preview' if self.preview else 'preprod'
@@ -36,6 +79,8 @@ class BlockfrostApi(object):
         retries = 0
         while True:
             try:
+                if self.rate_limiter:
+                    self.rate_limiter.acquire()
                 api_resp = call_func()
                 print(f"{api_resp.url}: ({api_resp.status_code})")
                 print(api_resp.text)
@@ -50,7 +95,7 @@ class BlockfrostApi(object):
 
     def __call_get_api(self, resource):
         return self.__call_with_retries(
-            lambda: requests.get(f"{self.__get_api_base()}/{resource}", headers={'project_id': self.project, 'Content-Type': BlockfrostApi._APPLICATION_JSON}),
+            lambda: self.__session.get(f"{self.__get_api_base()}/{resource}", headers={'project_id': self.project, 'Content-Type': BlockfrostApi._APPLICATION_JSON}),
             self.max_get_retries
         )
 
@@ -70,7 +115,7 @@ class BlockfrostApi(object):
 
     def __call_post_api(self, content_type, resource, data):
         return self.__call_with_retries(
-            lambda: requests.post(f"{self.__get_api_base()}/{resource}", headers={'project_id': self.project, 'Content-Type': content_type}, data=data),
+            lambda: self.__session.post(f"{self.__get_api_base()}/{resource}", headers={'project_id': self.project, 'Content-Type': content_type}, data=data),
             self.max_post_retries
         )
 
@@ -120,8 +165,15 @@ class BlockfrostApi(object):
                 available_utxos.append(utxo)
         return available_utxos
 
+    def get_latest_slot(self):
+        return self.__call_get_api('blocks/latest')['slot']
+
     def get_protocol_parameters(self):
-        return self.__call_get_api('epochs/latest/parameters')
+        now = time.monotonic()
+        if self.__protocol_params is None or self.protocol_params_ttl is None or now - self.__protocol_params_at >= self.protocol_params_ttl:
+            self.__protocol_params = self.__call_get_api('epochs/latest/parameters')
+            self.__protocol_params_at = now
+        return self.__protocol_params
 
     def submit_txn(self, signed_file):
         with open(signed_file, 'r') as signed_filehandle:
@@ -1,6 +1,12 @@
+import bisect
 import json
 import os
+import re
 import subprocess
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
 
 from deprecated import deprecated
 
@@ -11,39 +17,188 @@ cardano-cli *nix script representation in Python
 """
 class CardanoCli(object):
 
+    DEFAULT_CLI_PATH = 'cardano-cli'
     TXN_DIR = 'txn'
+    CBOR_METADATA_EXT = '.cbor'
+
+    """
+    Per-subcommand record of cardano-cli invocations (counts, failures,
+    latency histogram and output sizes) used to quantify CLI overhead.
+    """
+    class Profiler(object):
+
+        LATENCY_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+        __OUT_FILE_REGEX = re.compile(r'--out-file\s+(\S+)')
+
+        def subcommand_of(cardano_args):
+            tokens = cardano_args.split()
+            return tokens[1] if len(tokens) > 1 and tokens[0] == 'transaction' else ' '.join(tokens[:2])
+
+        def out_file_of(cardano_args):
+            match = CardanoCli.Profiler.__OUT_FILE_REGEX.search(cardano_args)
+            return match.group(1) if match else None
 
-    def __init__(self, protocol_params=None):
+        def __init__(self):
+            self.__lock = threading.Lock()
+            self.__stats = {}
+
+        def __new_stats(self):
+            return {
+                'count': 0,
+                'failures': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'output_bytes': 0,
+                'latency_histogram_ms': [0] * (len(CardanoCli.Profiler.LATENCY_BUCKETS_MS) + 1)
+            }
+
+        def record(self, subcommand, latency_sec, output_bytes, failed):
+            latency_ms = latency_sec * 1000
+            bucket = bisect.bisect_left(CardanoCli.Profiler.LATENCY_BUCKETS_MS, latency_ms)
+            with self.__lock:
+                stats = self.__stats.setdefault(subcommand, self.__new_stats())
+                stats['count'] += 1
+                stats['failures'] += 1 if failed else 0
+                stats['total_ms'] += latency_ms
+                stats['max_ms'] = max(stats['max_ms'], latency_ms)
+                stats['output_bytes'] += output_bytes
+                stats['latency_histogram_ms'][bucket] += 1
+
+        def snapshot(self):
+            """
+            :return: Dictionary keyed by subcommand (e.g., ``build-raw``) with
+                invocation/failure counts, total/mean/max latency in ms, total
+                output bytes and a histogram whose ``le`` bounds are
+                ``LATENCY_BUCKETS_MS`` (the last bucket is unbounded)
+            """
+            with self.__lock:
+                snapshot = {}
+                for subcommand, stats in self.__stats.items():
+                    bounds = [str(bound) for bound in CardanoCli.Profiler.LATENCY_BUCKETS_MS] + ['inf']
+                    snapshot[subcommand] = {
+                        'count': stats['count'],
+                        'failures': stats['failures'],
+                        'total_ms': round(stats['total_ms'], 3),
+                        'mean_ms': round(stats['total_ms'] / stats['count'], 3),
+                        'max_ms': round(stats['max_ms'], 3),
+                        'output_bytes': stats['output_bytes'],
+                        'latency_histogram_ms': dict(zip(bounds, stats['latency_histogram_ms']))
+                    }
+                return snapshot
+
+        def reset(self):
+            with self.__lock:
+                self.__stats = {}
+
+    def __init__(self, protocol_params=None, max_workers=1, cli_path=DEFAULT_CLI_PATH):
         self.protocol_params = protocol_params
+        self.cli_path = cli_path
+        self.max_workers = max_workers if max_workers else os.cpu_count()
+        self.__executor = None
+        self.__executor_lock = threading.Lock()
+        self.profiler = CardanoCli.Profiler()
 
-    def __run_script(self, cardano_args):
-        cmd = f'cardano-cli {cardano_args}'
+    def _execute(self, cardano_args):
+        """
+        Run a single cardano-cli invocation (overridden by in-process CLIs).
+
+        :return: ``(stdout, returncode)`` of the invocation
+        """
+        cmd = f'{self.cli_path} {cardano_args}'
         print(cmd)
         cli_cmd = subprocess.Popen(cmd,  shell=True, text=True, stdout=subprocess.PIPE)
         (out, err) = cli_cmd.communicate()
         print(f'[STDOUT] {out}')
         print(f'[STDERR] {err}')
+        return (out, cli_cmd.returncode)
+
+    def __run_script(self, cardano_args):
+        start = time.perf_counter()
+        (out, returncode) = self._execute(cardano_args)
+        latency = time.perf_counter() - start
+        self.__profile(cardano_args, latency, out, returncode)
         return out
 
+    def __profile(self, cardano_args, latency, out, returncode):
+        out_file = CardanoCli.Profiler.out_file_of(cardano_args)
+        output_bytes = len(out) if out else 0
+        if out_file and os.path.exists(out_file):
+            output_bytes += os.path.getsize(out_file)
+        self.profiler.record(CardanoCli.Profiler.subcommand_of(cardano_args), latency, output_bytes, returncode != 0)
+
+    def __get_executor(self):
+        with self.__executor_lock:
+            if not self.__executor:
+                self.__executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='cardano-cli')
+            return self.__executor
+
+    def submit(self, func, *args):
+        """
+        Run a unit of CLI work (e.g., build, fee and sign for one mint request)
+        on the bounded worker pool.  Each worker drives its own cardano-cli
+        subprocesses so up to ``max_workers`` requests proceed concurrently.
+
+        :param func: Callable performing the cardano-cli invocations
+        :param args: Positional arguments passed through to ``func``
+        :return: A ``concurrent.futures.Future`` holding the result of ``func``
+        """
+        return self.__get_executor().submit(func, *args)
+
+    def submit_batch(self, jobs):
+        """
+        Submit several independent units of CLI work at once.
+
+        :param jobs: Iterable of zero-argument callables
+        :return: List of futures in the same order as ``jobs``
+        """
+        return [self.submit(job) for job in jobs]
+
+    def shutdown(self, wait=True):
+        """
+        Stop the worker pool (if one was started), optionally waiting for any
+        in-flight CLI work to finish.
+        """
+        with self.__executor_lock:
+            if self.__executor:
+                self.__executor.shutdown(wait=wait)
+                self.__executor = None
+
     def named_asset_str(nft_policy, nft_names):
         return '+'.join(['.'.join([f"1 {nft_policy}", nft_name]) for nft_name in nft_names])
 
+    def metadata_file_opt(metadata_file):
+        """
+        :return: ``--metadata-cbor-file`` for raw CBOR (``.cbor``) metadata,
+            ``--metadata-json-file`` otherwise
+        """
+        return '--metadata-cbor-file' if metadata_file.endswith(CardanoCli.CBOR_METADATA_EXT) else '--metadata-json-file'
+
+    def tx_body_size(build_file):
+        """
+        :return: Size in bytes of the transaction body in a ``build-raw``
+            output file
+        """
+        with open(build_file, 'r') as build_filehandle:
+            return len(json.load(build_filehandle)['cborHex']) // 2
+
     def build_raw_txn(self, output_dir, txn_id, tx_in_args, tx_out_args, fee, metadata_json_file, addl_args, era='--alonzo-era'):
         raw_build_file = os.path.join(output_dir, CardanoCli.TXN_DIR, f"txn_{txn_id}.raw.build")
-        metadata_file_args = f"--metadata-json-file {metadata_json_file}" if metadata_json_file else ''
+        metadata_file_args = f"{CardanoCli.metadata_file_opt(metadata_json_file)} {metadata_json_file}" if metadata_json_file else ''
         self.__run_script(
             f'transaction build-raw --fee {fee} {era} {" ".join(tx_out_args)} {" ".join(tx_in_args)} \
                 {metadata_file_args} --out-file {raw_build_file} {" ".join(addl_args)}'
         )
         return raw_build_file
 
-    def build_raw_mint_txn(self, output_dir, txn_id, tx_in_args, tx_out_args, fee, metadata_json_file, mint, nft_names):
+    def build_raw_mint_txn(self, output_dir, txn_id, tx_in_args, tx_out_args, fee, metadata_json_file, mint, nft_names, invalid_hereafter=None):
         named_asset_str = CardanoCli.named_asset_str(mint.policy, nft_names)
         mint_args = [f"--mint='{named_asset_str}'", f"--minting-script-file {mint.script}"] if nft_names else []
         if mint.initial_slot:
             mint_args.append(f"--invalid-before {mint.initial_slot}")
-        if mint.expiration_slot:
-            mint_args.append(f"--invalid-hereafter {mint.expiration_slot}")
+        invalid_hereafter = invalid_hereafter if invalid_hereafter else mint.expiration_slot
+        if invalid_hereafter:
+            mint_args.append(f"--invalid-hereafter {invalid_hereafter}")
         return self.build_raw_txn(output_dir, txn_id, tx_in_args, tx_out_args, fee, metadata_json_file, mint_args)
 
     def calculate_min_fee(self, raw_build_file, tx_in_count, tx_out_count, witness_count):
@@ -0,0 +1,147 @@
+import struct
+
+"""
+Minimal CBOR (RFC 8949) encoder for the value types that appear in Cardano
+transaction metadata, following the "no schema" JSON conversion used by
+``cardano-cli --metadata-json-file``: integers, text strings (``0x``-prefixed
+strings become byte strings), lists and maps.
+"""
+
+_MAJOR_UINT = 0
+_MAJOR_NEGINT = 1
+_MAJOR_BYTES = 2
+_MAJOR_TEXT = 3
+_MAJOR_ARRAY = 4
+_MAJOR_MAP = 5
+
+HEX_PREFIX = '0x'
+
+MAX_STRING_BYTES = 64
+
+def head(major, length):
+    """
+    :return: The CBOR initial byte(s) for a data item of the given major type
+        and length/value argument
+    """
+    if length < 24:
+        return bytes([(major << 5) | length])
+    if length < 0x100:
+        return bytes([(major << 5) | 24, length])
+    if length < 0x10000:
+        return bytes([(major << 5) | 25]) + struct.pack('>H', length)
+    if length < 0x100000000:
+        return bytes([(major << 5) | 26]) + struct.pack('>I', length)
+    return bytes([(major << 5) | 27]) + struct.pack('>Q', length)
+
+def bytes_head(length):
+    return head(_MAJOR_BYTES, length)
+
+def array_head(num_items):
+    return head(_MAJOR_ARRAY, num_items)
+
+def map_head(num_entries):
+    return head(_MAJOR_MAP, num_entries)
+
+def encode(value):
+    """
+    :param value: ``int``, ``bytes``, ``str``, ``list``/``tuple`` or ``dict``
+        (booleans are not valid metadata and are rejected)
+    :return: The CBOR encoding of ``value`` as ``bytes``
+    """
+    if isinstance(value, bool):
+        raise ValueError(f"Cannot CBOR-encode metadata value of type {type(value)}: '{value}'")
+    if isinstance(value, int):
+        if value < 0:
+            return head(_MAJOR_NEGINT, -1 - value)
+        return head(_MAJOR_UINT, value)
+    if isinstance(value, (bytes, bytearray)):
+        return bytes_head(len(value)) + bytes(value)
+    if isinstance(value, str):
+        encoded = value.encode('UTF-8')
+        return head(_MAJOR_TEXT, len(encoded)) + encoded
+    if isinstance(value, (list, tuple)):
+        return array_head(len(value)) + b''.join([encode(item) for item in value])
+    if isinstance(value, dict):
+        return map_head(len(value)) + b''.join([encode(key) + encode(val) for key, val in value.items()])
+    raise ValueError(f"Cannot CBOR-encode metadata value of type {type(value)}: '{value}'")
+
+def from_metadata_json(value, label=False):
+    """
+    Convert JSON metadata into the Python values cardano-cli would encode in
+    its "no schema" mode (numeric top-level labels become integers and
+    ``0x``-prefixed strings become bytes).
+
+    :param value: A JSON-decoded metadata value
+    :param label: Whether ``value`` is a top-level metadata label
+    """
+    if isinstance(value, dict):
+        return {from_metadata_json(key, label=label): from_metadata_json(val) for key, val in value.items()}
+    if isinstance(value, list):
+        return [from_metadata_json(item) for item in value]
+    if isinstance(value, str):
+        if label and value.isdigit():
+            return int(value)
+        if value.startswith(HEX_PREFIX):
+            try:
+                return bytes.fromhex(value[len(HEX_PREFIX):])
+            except ValueError:
+                return value
+    return value
+
+def _text_chunks(value):
+    chunks = []
+    chunk = ''
+    chunk_len = 0
+    for char in value:
+        char_len = len(char.encode('UTF-8'))
+        if chunk_len + char_len > MAX_STRING_BYTES:
+            chunks.append(chunk)
+            chunk = ''
+            chunk_len = 0
+        chunk += char
+        chunk_len += char_len
+    return chunks + [chunk]
+
+def chunk_strings(value):
+    """
+    Split every text or byte string longer than ``MAX_STRING_BYTES`` (the
+    ledger's limit on metadata strings) into a list of chunks, text being
+    split on character boundaries.  Map keys are left as they are.
+
+    :param value: Output of ``from_metadata_json``
+    """
+    if isinstance(value, dict):
+        return {key: chunk_strings(val) for key, val in value.items()}
+    if isinstance(value, list):
+        return [chunk_strings(item) for item in value]
+    if isinstance(value, str) and len(value.encode('UTF-8')) > MAX_STRING_BYTES:
+        return _text_chunks(value)
+    if isinstance(value, (bytes, bytearray)) and len(value) > MAX_STRING_BYTES:
+        return [bytes(value[start:start + MAX_STRING_BYTES]) for start in range(0, len(value), MAX_STRING_BYTES)]
+    return value
+
+def encode_metadata_json(metadata_json):
+    """
+    :param metadata_json: Top-level JSON metadata (e.g., ``{'721': {...}}``)
+    :return: CBOR bytes of the transaction metadata map
+    """
+    converted = {from_metadata_json(label, label=True): from_metadata_json(val) for label, val in metadata_json.items()}
+    return encode(converted)
+
+def encode_nft_fragment(asset_name, nft_metadata):
+    """
+    :param nft_metadata: JSON metadata of one CIP-25 asset
+    :return: CBOR bytes of the asset's ``name: metadata`` entry in its policy
+        map, long strings chunked (see ``chunk_strings``)
+    """
+    return encode(asset_name) + encode(chunk_strings(from_metadata_json(nft_metadata)))
+
+def encode_cip25_fragments(policy, fragments):
+    """
+    Assemble the transaction metadata map ``{721: {policy: {...}}}`` around
+    precompiled NFT fragments without re-encoding them.
+
+    :param fragments: Outputs of ``encode_nft_fragment`` (distinct asset names)
+    :return: CBOR bytes of the transaction metadata map
+    """
+    return map_head(1) + encode(721) + map_head(1) + encode(from_metadata_json(policy)) + map_head(len(fragments)) + b''.join(fragments)
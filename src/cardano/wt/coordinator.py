@@ -0,0 +1,98 @@
+import threading
+import time
+
+"""
+Serves several payment addresses at once, one ``NftVendingMachine`` (with its
+own payment address, signing key and exclusions) per address.  Every machine
+must share the same ``Mint`` (and so a single inventory, whose draws are
+atomic, and a single whitelist) and the same ``WhitelistClaims``, so that no
+NFT or whitelist entry can be vended twice however buyers are spread across
+the addresses.  Machines may also share one ``VendJournal``, each recovering
+and confirming only the vends paid to its own address.
+"""
+class VendCoordinator(object):
+
+    _WAIT_SLICE = 1
+
+    def __init__(self, machines):
+        if not machines:
+            raise ValueError('Coordinator requires at least one vending machine')
+        payment_addrs = [machine.payment_addr for machine in machines]
+        if len(set(payment_addrs)) != len(payment_addrs):
+            raise ValueError(f"Payment addresses must be unique across vending machines: {payment_addrs}")
+        primary = machines[0]
+        for machine in machines[1:]:
+            if machine.mint is not primary.mint:
+                raise ValueError(f"Vending machine for {machine.payment_addr} does not share the coordinator's Mint")
+            if machine.whitelist_claims is not primary.whitelist_claims:
+                raise ValueError(f"Vending machine for {machine.payment_addr} does not share the coordinator's WhitelistClaims")
+        self.machines = machines
+
+    def validate(self):
+        for idx, machine in enumerate(self.machines):
+            machine.validate(validate_mint=(idx == 0))
+
+    def recover(self, exclusions):
+        """
+        :param exclusions: One exclusion set per machine (in order)
+        """
+        for machine, machine_exclusions in zip(self.machines, exclusions):
+            machine.recover(machine_exclusions)
+
+    def __in_parallel(self, target, exclusions, *args):
+        results = [0] * len(self.machines)
+        def run(idx, machine, machine_exclusions):
+            try:
+                results[idx] = target(idx, machine, machine_exclusions, *args)
+            except Exception as e:
+                print(f"WARNING: Vending machine for {machine.payment_addr} failed: {e}")
+        threads = [
+            threading.Thread(target=run, args=(idx, machine, machine_exclusions), name=f"vend-{idx}", daemon=True)
+            for idx, (machine, machine_exclusions) in enumerate(zip(self.machines, exclusions))
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def __vend_once(idx, machine, exclusions, output_dir, locked_subdir, metadata_subdir):
+        return machine.vend(output_dir, locked_subdir, metadata_subdir, exclusions)
+
+    def vend(self, output_dir, locked_subdir, metadata_subdir, exclusions):
+        """
+        Run one vend cycle on every machine in parallel.
+
+        :param exclusions: One exclusion set per machine (in order)
+        :return: Total number of mint requests picked up
+        """
+        return sum(self.__in_parallel(VendCoordinator.__vend_once, exclusions, output_dir, locked_subdir, metadata_subdir))
+
+    def has_backlog(self):
+        return any([machine.has_backlog() for machine in self.machines])
+
+    def __wait_while(is_running, seconds):
+        deadline = time.monotonic() + seconds
+        while is_running() and time.monotonic() < deadline:
+            time.sleep(max(0, min(VendCoordinator._WAIT_SLICE, deadline - time.monotonic())))
+
+    def __serve_one(idx, machine, exclusions, output_dir, locked_subdir, metadata_subdir, poll_schedulers, is_running):
+        processed = 0
+        while is_running():
+            try:
+                vended = machine.vend(output_dir, locked_subdir, metadata_subdir, exclusions)
+            except Exception as e:
+                print(f"WARNING: Vend cycle for {machine.payment_addr} failed, polling again later: {e}")
+                vended = 0
+            processed += vended
+            VendCoordinator.__wait_while(is_running, poll_schedulers[idx].next_wait(vended, machine.has_backlog()))
+        return processed
+
+    def serve(self, output_dir, locked_subdir, metadata_subdir, exclusions, poll_schedulers, is_running):
+        """
+        Poll every payment address on its own thread (each with its own
+        ``PollScheduler``) until ``is_running()`` turns False.
+
+        :return: Total number of mint requests picked up
+        """
+        return sum(self.__in_parallel(VendCoordinator.__serve_one, exclusions, output_dir, locked_subdir, metadata_subdir, poll_schedulers, is_running))
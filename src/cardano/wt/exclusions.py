@@ -0,0 +1,78 @@
+import json
+import os
+import threading
+
+"""
+Set of payment UTxOs that must not be processed again, stored as compact
+``(tx_hash_bytes, ix)`` keys rather than full ``Utxo`` objects.  Entries are
+pruned once the UTxO no longer appears in the payment address's UTxO set
+(i.e., it was spent on chain), so the tracker stays bounded by the number of
+UTxOs actually sitting at the address.  Supports the ``in``/``add``/
+``discard`` operations the vending machine and ``BlockfrostApi`` already use
+on a plain ``set``.
+"""
+class ExclusionTracker(object):
+
+    def key_of(utxo):
+        return (bytes.fromhex(utxo.hash), utxo.ix)
+
+    def __init__(self, state_file=None):
+        self.state_file = state_file
+        self.pruned = 0
+        self.__keys = set()
+        self.__lock = threading.Lock()
+
+    def __contains__(self, utxo):
+        return ExclusionTracker.key_of(utxo) in self.__keys
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def add(self, utxo):
+        with self.__lock:
+            self.__keys.add(ExclusionTracker.key_of(utxo))
+
+    def discard(self, utxo):
+        with self.__lock:
+            self.__keys.discard(ExclusionTracker.key_of(utxo))
+
+    def prune(self, unspent):
+        """
+        Drop every entry whose UTxO is missing from ``unspent``.
+
+        :param unspent: Complete list of UTxOs currently at the payment address
+        :return: Number of entries dropped
+        """
+        unspent_keys = set([ExclusionTracker.key_of(utxo) for utxo in unspent])
+        with self.__lock:
+            spent = self.__keys - unspent_keys
+            self.__keys -= spent
+            self.pruned += len(spent)
+            return len(spent)
+
+    def stats(self):
+        return {'entries': len(self.__keys), 'pruned': self.pruned}
+
+    def load(self):
+        """
+        :return: This tracker, populated from ``state_file`` if it exists
+        """
+        if self.state_file and os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as state_filehandle:
+                keys = json.load(state_filehandle)
+            with self.__lock:
+                self.__keys = set([(bytes.fromhex(tx_hash), ix) for tx_hash, ix in keys])
+        return self
+
+    def save(self):
+        """
+        Persist the tracker (atomically) so a restart keeps its exclusions.
+        """
+        if not self.state_file:
+            return
+        with self.__lock:
+            keys = [[tx_hash.hex(), ix] for tx_hash, ix in self.__keys]
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w') as state_filehandle:
+            json.dump(keys, state_filehandle)
+        os.replace(tmp_file, self.state_file)
@@ -0,0 +1,79 @@
+"""
+Orders the mint requests of a poll cycle so that no single sending address
+can monopolize it.  Requests are taken in arrival order (Blockfrost lists an
+address's UTxOs oldest first), or sorted by their on-chain position when one
+is known, and are scheduled according to a policy:
+
+* ``fifo``: strict arrival order
+* ``round_robin``: one request per sending address per round, addresses
+  taking turns in the order they first arrived
+* ``weighted``: like round robin but each address takes ``weight`` requests
+  per round (addresses without a weight get ``default_weight``)
+
+Independently of the policy, at most ``per_address_cap`` requests per sending
+address are scheduled each cycle; the rest are deferred to the next one.
+"""
+class FairScheduler(object):
+
+    FIFO = 'fifo'
+    ROUND_ROBIN = 'round_robin'
+    WEIGHTED = 'weighted'
+
+    POLICIES = [FIFO, ROUND_ROBIN, WEIGHTED]
+
+    def __init__(self, policy=FIFO, per_address_cap=None, weights=None, default_weight=1):
+        if not policy in FairScheduler.POLICIES:
+            raise ValueError(f"Unknown fairness policy '{policy}', expected one of {FairScheduler.POLICIES}")
+        if per_address_cap is not None and per_address_cap < 1:
+            raise ValueError(f"Per-address cap must be at least 1, found {per_address_cap}")
+        weights = weights if weights else {}
+        for address, weight in list(weights.items()) + [('default', default_weight)]:
+            if weight < 1:
+                raise ValueError(f"Weight for {address} must be at least 1, found {weight}")
+        self.policy = policy
+        self.per_address_cap = per_address_cap
+        self.weights = weights
+        self.default_weight = default_weight
+
+    def __weight_of(self, address):
+        if self.policy == FairScheduler.WEIGHTED:
+            return self.weights.get(address, self.default_weight)
+        return 1
+
+    def order(self, requests, sender_of, position_of=None):
+        """
+        :param requests: Mint requests in arrival order
+        :param sender_of: Function returning a request's sending address
+        :param position_of: Function returning a request's on-chain position
+            (e.g., ``(block_height, tx_index, output_index)``), requests are
+            then ordered by it rather than by arrival
+        :return: ``(scheduled, deferred)`` lists of requests
+        """
+        if position_of:
+            requests = sorted(requests, key=position_of)
+        by_sender = {}
+        deferred = []
+        for request in requests:
+            sender_requests = by_sender.setdefault(sender_of(request), [])
+            if self.per_address_cap and len(sender_requests) >= self.per_address_cap:
+                deferred.append(request)
+            else:
+                sender_requests.append(request)
+
+        if self.policy == FairScheduler.FIFO:
+            capped = set([id(request) for request in deferred])
+            return [request for request in requests if not id(request) in capped], deferred
+
+        scheduled = []
+        queues = [(sender, list(reversed(sender_requests))) for sender, sender_requests in by_sender.items()]
+        while queues:
+            remaining = []
+            for sender, queue in queues:
+                for i in range(self.__weight_of(sender)):
+                    if not queue:
+                        break
+                    scheduled.append(queue.pop())
+                if queue:
+                    remaining.append((sender, queue))
+            queues = remaining
+        return scheduled, deferred
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+"""
+Deterministic, pure-Python stand-in for the subset of ``cardano-cli`` used by
+``CardanoCli`` (``transaction build-raw``, ``calculate-min-fee`` and ``sign``).
+Outputs only depend on the arguments (and referenced file contents) so the
+orchestration overhead of the vending machine can be benchmarked on machines
+without any Cardano tooling.  Point ``CardanoCli`` at it with:
+
+    CardanoCli(protocol_params=..., cli_path=FakeCardanoCli.command(latency=0.05))
+
+Artificial latency is configured with global options placed before the
+subcommand, e.g. ``--latency 0.05`` for every call or ``--latency-sign 0.2``
+for a single subcommand.
+"""
+class FakeCardanoCli(object):
+
+    DEFAULT_FEE_A = 44
+    DEFAULT_FEE_B = 155381
+    SUBCOMMANDS = ['build-raw', 'calculate-min-fee', 'sign']
+
+    _BASE_BODY_BYTES = 64
+    _WITNESS_BYTES = 106
+
+    def command(latency=None, python=sys.executable, **subcommand_latencies):
+        """
+        :param latency: Seconds to sleep on every invocation
+        :param subcommand_latencies: Per-subcommand overrides, keyed with
+            underscores (e.g., ``calculate_min_fee=0.1``)
+        :return: The executable string to pass as ``CardanoCli(cli_path=...)``
+        """
+        cmd = [python, os.path.abspath(__file__)]
+        if latency:
+            cmd.append(f"--latency {latency}")
+        for subcommand, subcommand_latency in sorted(subcommand_latencies.items()):
+            cmd.append(f"--latency-{subcommand.replace('_', '-')} {subcommand_latency}")
+        return ' '.join(cmd)
+
+    def __parse_opts(argv):
+        opts = {}
+        idx = 0
+        while idx < len(argv):
+            token = argv[idx]
+            idx += 1
+            if not token.startswith('--'):
+                continue
+            if '=' in token:
+                (key, val) = token.split('=', 1)
+            elif idx < len(argv) and not argv[idx].startswith('--'):
+                (key, val) = (token, argv[idx])
+                idx += 1
+            else:
+                (key, val) = (token, None)
+            opts.setdefault(key[2:], []).append(val)
+        return opts
+
+    def __init__(self, latency=0.0, subcommand_latencies=None):
+        self.latency = latency
+        self.subcommand_latencies = subcommand_latencies or {}
+
+    def __deterministic_bytes(seed, length):
+        out = b''
+        counter = 0
+        while len(out) < length:
+            out += hashlib.sha256(seed + counter.to_bytes(4, 'big')).digest()
+            counter += 1
+        return out[:length]
+
+    def __read_bytes(filename):
+        if not filename or not os.path.exists(filename):
+            return b''
+        with open(filename, 'rb') as file:
+            return file.read()
+
+    def __write_envelope(filename, envelope_type, cbor):
+        with open(filename, 'w') as file:
+            json.dump({'type': envelope_type, 'description': '', 'cborHex': cbor.hex()}, file, indent=4)
+
+    def __body_cbor(filename):
+        with open(filename, 'r') as file:
+            return bytes.fromhex(json.load(file)['cborHex'])
+
+    def __protocol_fee_params(filename):
+        if not filename or not os.path.exists(filename):
+            return (FakeCardanoCli.DEFAULT_FEE_A, FakeCardanoCli.DEFAULT_FEE_B)
+        with open(filename, 'r') as file:
+            protocol = json.load(file)
+        return (protocol.get('txFeePerByte', FakeCardanoCli.DEFAULT_FEE_A), protocol.get('txFeeFixed', FakeCardanoCli.DEFAULT_FEE_B))
+
+    def build_raw(self, opts):
+        out_file = opts['out-file'][0]
+        metadata = b''.join([FakeCardanoCli.__read_bytes(filename) for filename in opts.get('metadata-json-file', []) + opts.get('metadata-cbor-file', [])])
+        signature = json.dumps({key: vals for key, vals in opts.items() if key != 'out-file'}, sort_keys=True).encode('UTF-8')
+        body_len = FakeCardanoCli._BASE_BODY_BYTES + len(signature) + len(metadata)
+        body = FakeCardanoCli.__deterministic_bytes(signature + metadata, body_len)
+        FakeCardanoCli.__write_envelope(out_file, 'TxBodyAlonzo', body)
+        return ''
+
+    def calculate_min_fee(self, opts):
+        body = FakeCardanoCli.__body_cbor(opts['tx-body-file'][0])
+        witness_count = int(opts.get('witness-count', ['0'])[0])
+        (fee_a, fee_b) = FakeCardanoCli.__protocol_fee_params(opts.get('protocol-params-file', [None])[0])
+        tx_size = len(body) + (witness_count * FakeCardanoCli._WITNESS_BYTES)
+        return f"{(fee_a * tx_size) + fee_b} Lovelace\n"
+
+    def sign(self, opts):
+        body = FakeCardanoCli.__body_cbor(opts['tx-body-file'][0])
+        witnesses = b''
+        for signing_key in opts.get('signing-key-file', []):
+            key_seed = FakeCardanoCli.__read_bytes(signing_key) or signing_key.encode('UTF-8')
+            witnesses += FakeCardanoCli.__deterministic_bytes(key_seed + body, FakeCardanoCli._WITNESS_BYTES)
+        FakeCardanoCli.__write_envelope(opts['out-file'][0], 'Tx AlonzoEra', body + witnesses)
+        return ''
+
+    def run(self, argv):
+        """
+        :param argv: Arguments after the executable (global options first)
+        :return: Text that the real ``cardano-cli`` would print to stdout
+        """
+        if len(argv) < 2 or argv[0] != 'transaction' or argv[1] not in FakeCardanoCli.SUBCOMMANDS:
+            raise ValueError(f"Unsupported fake cardano-cli invocation: {' '.join(argv)}")
+        subcommand = argv[1]
+        time.sleep(self.subcommand_latencies.get(subcommand, self.latency))
+        opts = FakeCardanoCli.__parse_opts(argv[2:])
+        return getattr(self, subcommand.replace('-', '_'))(opts)
+
+    def from_argv(argv):
+        latency = 0.0
+        subcommand_latencies = {}
+        while argv and argv[0].startswith('--latency'):
+            option = argv[0][len('--latency'):]
+            if option:
+                subcommand_latencies[option[1:]] = float(argv[1])
+            else:
+                latency = float(argv[1])
+            argv = argv[2:]
+        return (FakeCardanoCli(latency, subcommand_latencies), argv)
+
+if __name__ == "__main__":
+    (_fake_cli, _argv) = FakeCardanoCli.from_argv(sys.argv[1:])
+    try:
+        sys.stdout.write(_fake_cli.run(_argv))
+    except (KeyError, ValueError) as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
@@ -0,0 +1,149 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+"""
+Memoizes ``calculate-min-fee`` results by transaction shape: ``(tx_in_count,
+tx_out_count, witness_count, size bucket, protocol parameters digest)``.  The
+size is that of the transaction body actually built by ``build-raw``, bucketed
+every ``bucket_bytes`` bytes, and cached fees are padded by ``txFeePerByte *
+bucket_bytes`` so that any transaction landing in the same bucket is covered.  Every ``verify_every``-th hit is reported as a miss so the
+caller recomputes the fee for real, and the entry is refreshed (with a warning
+if the cached fee had fallen short).  Changing the protocol parameters file
+invalidates every entry.  Rather than on every lookup, that file is checked
+(after running ``refresh_params``, if any, to rewrite it whenever the network's
+parameters change) at most every ``params_check_every`` seconds, and again
+right after a cached fee is evicted.
+"""
+class FeeCache(object):
+
+    _BUCKET_BYTES = 256
+    _VERIFY_EVERY = 100
+    _PARAMS_CHECK_SEC = 60
+
+    __FEE_PER_BYTE_KEY = 'txFeePerByte'
+
+    def __init__(self, protocol_params, bucket_bytes=_BUCKET_BYTES, verify_every=_VERIFY_EVERY, refresh_params=None, params_check_every=_PARAMS_CHECK_SEC, clock=time.monotonic):
+        """
+        :param refresh_params: Callable rewriting ``protocol_params`` if the
+            network's parameters changed (e.g., once a cached copy expires)
+        :param params_check_every: Seconds between checks of ``protocol_params``
+        """
+        if bucket_bytes < 1:
+            raise ValueError(f"Fee cache bucket must be at least 1 byte, found {bucket_bytes}")
+        self.protocol_params = protocol_params
+        self.bucket_bytes = bucket_bytes
+        self.verify_every = verify_every
+        self.refresh_params = refresh_params
+        self.params_check_every = params_check_every
+        self.hits = 0
+        self.misses = 0
+        self.verifications = 0
+        self.shortfalls = 0
+        self.invalidations = 0
+        self.evictions = 0
+        self.__fees = {}
+        self.__params_mtime = None
+        self.__params_digest = None
+        self.__padding = 0
+        self.__params_checked_at = None
+        self.__clock = clock
+        self.__lock = threading.Lock()
+
+    def __params_due(self):
+        with self.__lock:
+            now = self.__clock()
+            if self.__params_checked_at is not None and now - self.__params_checked_at < self.params_check_every:
+                return False
+            self.__params_checked_at = now
+            return True
+
+    def __refresh_params(self):
+        params_mtime = os.path.getmtime(self.protocol_params)
+        if params_mtime == self.__params_mtime:
+            return
+        with open(self.protocol_params, 'rb') as params_filehandle:
+            params_bytes = params_filehandle.read()
+        params_digest = hashlib.sha256(params_bytes).hexdigest()
+        if self.__params_digest and params_digest != self.__params_digest:
+            print(f"Protocol parameters in {self.protocol_params} changed, invalidating {len(self.__fees)} cached fee(s)")
+            self.__fees = {}
+            self.invalidations += 1
+        self.__params_mtime = params_mtime
+        self.__params_digest = params_digest
+        self.__padding = json.loads(params_bytes)[FeeCache.__FEE_PER_BYTE_KEY] * self.bucket_bytes
+
+    def key_for(self, tx_in_count, tx_out_count, witness_count, tx_size):
+        """
+        :param tx_size: Size in bytes of the transaction body built by
+            ``build-raw``
+        :return: Cache key for a transaction of this shape
+        """
+        if self.__params_due():
+            if self.refresh_params:
+                self.refresh_params()
+            with self.__lock:
+                self.__refresh_params()
+        with self.__lock:
+            return (tx_in_count, tx_out_count, witness_count, tx_size // self.bucket_bytes, self.__params_digest)
+
+    def get(self, key):
+        """
+        :return: The cached (padded) fee, or None on a miss or when this hit
+            is due for verification against the real calculation
+        """
+        with self.__lock:
+            fee = self.__fees.get(key)
+            if fee is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            if self.verify_every and not self.hits % self.verify_every:
+                self.verifications += 1
+                return None
+            return fee
+
+    def put(self, key, fee):
+        """
+        :param fee: Fee computed by ``calculate-min-fee`` for a transaction
+            of shape ``key``
+        """
+        with self.__lock:
+            if key[-1] != self.__params_digest:
+                return
+            cached = self.__fees.get(key)
+            if cached is not None and fee > cached:
+                print(f"WARNING: Cached fee {cached} fell short of {fee} for shape {key[:-1]}, refreshing")
+                self.shortfalls += 1
+            self.__fees[key] = fee + self.__padding
+
+    def evict(self, key):
+        """
+        Drop the fee cached for ``key`` (e.g., after it was rejected as too
+        small) so the next transaction of that shape is calculated for real,
+        and check the protocol parameters on the next lookup in case the
+        rejection came from a parameter change.
+        """
+        with self.__lock:
+            self.__params_checked_at = None
+            if self.__fees.pop(key, None) is not None:
+                self.evictions += 1
+
+    def invalidate(self):
+        with self.__lock:
+            self.__fees = {}
+            self.invalidations += 1
+
+    def stats(self):
+        with self.__lock:
+            return {
+                'entries': len(self.__fees),
+                'hits': self.hits,
+                'misses': self.misses,
+                'verifications': self.verifications,
+                'shortfalls': self.shortfalls,
+                'invalidations': self.invalidations,
+                'evictions': self.evictions
+            }
@@ -0,0 +1,202 @@
+import json
+import os
+import random
+import shutil
+import threading
+import time
+
+"""
+In-memory index of the NFT metadata files still available to vend.  Files are
+kept in a flat array with a position map so that a uniform random draw
+without replacement is a swap-remove (O(1) per NFT) rather than a directory
+scan plus a full shuffle on every mint request.
+
+The index notices restocks through the metadata directory's mtime: files the
+vending machine moves out itself are acknowledged, any other change triggers
+a single rescan on the next ``sync``.  A restock landing within the same mtime
+tick as one of those moves would go unnoticed, so ``sync`` also rescans every
+``rescan_every`` seconds and whenever the index is empty.  Files drawn but not yet moved out are
+still listed in the directory, so they are tracked apart and skipped by
+rescans (otherwise another vending machine sharing the inventory could draw
+them again).  ``save`` persists the index alongside the mtime it reflects so a
+restart can skip the rescan if nothing changed.
+"""
+class Inventory(object):
+
+    _RESCAN_EVERY_SEC = 300
+
+    def __init__(self, nfts_dir, state_file=None, rescan_every=_RESCAN_EVERY_SEC):
+        self.nfts_dir = nfts_dir
+        self.state_file = state_file
+        self.rescan_every = rescan_every
+        self.__items = []
+        self.__positions = {}
+        self.__drawn = set()
+        self.__dir_mtime = None
+        self.__scanned_at = time.monotonic()
+        self.__lock = threading.RLock()
+
+    def __dir_mtime_now(self):
+        return os.stat(self.nfts_dir).st_mtime_ns
+
+    def __reset(self, filenames, dir_mtime):
+        self.__items = list(filenames)
+        self.__positions = {filename: idx for idx, filename in enumerate(self.__items)}
+        self.__dir_mtime = dir_mtime
+        self.__scanned_at = time.monotonic()
+
+    def __add(self, filename):
+        if filename in self.__positions:
+            return
+        self.__positions[filename] = len(self.__items)
+        self.__items.append(filename)
+
+    def __remove_at(self, idx):
+        last = self.__items.pop()
+        removed = last
+        if idx < len(self.__items):
+            removed = self.__items[idx]
+            self.__items[idx] = last
+            self.__positions[last] = idx
+        del self.__positions[removed]
+        return removed
+
+    def load(self, filenames=None):
+        """
+        Build the index, preferring persisted state when it matches the
+        current directory mtime.
+
+        :param filenames: Directory listing the caller already has in hand
+            (e.g., from validation) to avoid listing the directory again
+        """
+        with self.__lock:
+            dir_mtime = self.__dir_mtime_now()
+            if self.state_file and os.path.exists(self.state_file):
+                with open(self.state_file, 'r') as state_filehandle:
+                    state = json.load(state_filehandle)
+                if state['dir_mtime'] == dir_mtime:
+                    self.__reset(state['items'], dir_mtime)
+                    return self
+            self.__reset(filenames if filenames is not None else os.listdir(self.nfts_dir), dir_mtime)
+            return self
+
+    def sync(self):
+        """
+        Pick up restocks (or removals) made outside the vending machine.
+
+        :return: True if the directory had to be rescanned
+        """
+        with self.__lock:
+            dir_mtime = self.__dir_mtime_now()
+            if dir_mtime == self.__dir_mtime and self.__items and time.monotonic() - self.__scanned_at < self.rescan_every:
+                return False
+            listed = os.listdir(self.nfts_dir)
+            listed_set = set(listed)
+            for idx in reversed(range(len(self.__items))):
+                if not self.__items[idx] in listed_set:
+                    self.__remove_at(idx)
+            for filename in listed:
+                if not filename in self.__drawn:
+                    self.__add(filename)
+            self.__dir_mtime = dir_mtime
+            self.__scanned_at = time.monotonic()
+            return True
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__items)
+
+    def __contains__(self, filename):
+        with self.__lock:
+            return filename in self.__positions
+
+    def draw(self, randomly):
+        """
+        Remove and return one available file, either uniformly at random or
+        from the end of the index.
+
+        :return: A metadata filename or None when the inventory is empty
+        """
+        with self.__lock:
+            if not self.__items:
+                return None
+            idx = random.randrange(len(self.__items)) if randomly else len(self.__items) - 1
+            filename = self.__remove_at(idx)
+            self.__drawn.add(filename)
+            return filename
+
+    def sample(self, k, randomly):
+        """
+        :return: Up to ``k`` filenames removed from the index in O(k)
+        """
+        with self.__lock:
+            return [self.draw(randomly) for i in range(min(k, len(self.__items)))]
+
+    def put_back(self, filenames):
+        """
+        Return drawn filenames (whose files are still in ``nfts_dir``) to the
+        index.
+        """
+        with self.__lock:
+            for filename in filenames:
+                self.__drawn.discard(filename)
+                self.__add(filename)
+
+    def move_out(self, filename, destination):
+        """
+        Move a drawn file out of ``nfts_dir`` without the move being mistaken
+        for an external restock on the next ``sync``.
+        """
+        with self.__lock:
+            unchanged = self.__dir_mtime_now() == self.__dir_mtime
+            shutil.move(os.path.join(self.nfts_dir, filename), destination)
+            self.__drawn.discard(filename)
+            if unchanged:
+                self.__dir_mtime = self.__dir_mtime_now()
+
+    def read(self, filename):
+        """
+        :return: Parsed metadata of ``filename`` (still in ``nfts_dir``)
+        """
+        with open(os.path.join(self.nfts_dir, filename), 'r') as metadata_filehandle:
+            return json.load(metadata_filehandle)
+
+    def move_in(self, filename, source):
+        """
+        Move a previously locked file back into ``nfts_dir`` and the index (a
+        drawn file that was never moved out is only indexed again).
+
+        :return: Whether the file is back in ``nfts_dir``
+        """
+        with self.__lock:
+            self.__drawn.discard(filename)
+            if not os.path.exists(source):
+                if not os.path.exists(os.path.join(self.nfts_dir, filename)):
+                    return False
+                self.__add(filename)
+                return True
+            unchanged = self.__dir_mtime_now() == self.__dir_mtime
+            shutil.move(source, os.path.join(self.nfts_dir, filename))
+            if unchanged:
+                self.__dir_mtime = self.__dir_mtime_now()
+            self.__add(filename)
+            return True
+
+    def commit(self, filenames):
+        """
+        Nothing to record for minted files, they stay where they were locked.
+        """
+        pass
+
+    def save(self):
+        """
+        Persist the index (atomically) so a restart can skip the rescan.
+        """
+        if not self.state_file:
+            return
+        with self.__lock:
+            state = {'dir_mtime': self.__dir_mtime, 'items': self.__items}
+            tmp_file = f"{self.state_file}.tmp"
+            with open(tmp_file, 'w') as state_filehandle:
+                json.dump(state, state_filehandle)
+            os.replace(tmp_file, self.state_file)
@@ -0,0 +1,166 @@
+import json
+import os
+import threading
+
+from cardano.wt.utxo import Utxo
+
+"""
+Append-only write-ahead journal of each vend's state transitions, keyed by
+the payment UTxO (``hash#ix``):
+
+    received -> reserved -> built -> submitted -> confirmed
+                        \\-> rolled_back / failed
+
+Every record carries a sequence number so that replaying a snapshot followed
+by the journal is idempotent.  Records are fsynced in batches, except for
+``durable`` ones (e.g., ``reserved`` before the NFT files are locked and
+``built`` before the whitelist is consumed and the txn submitted) which flush
+everything immediately.
+Settled vends (confirmed or rolled back) are dropped from the in-memory state
+and from the next snapshot; failed vends are kept so they stay excluded.
+"""
+class VendJournal(object):
+
+    RECEIVED = 'received'
+    RESERVED = 'reserved'
+    BUILT = 'built'
+    SUBMITTED = 'submitted'
+    CONFIRMED = 'confirmed'
+    ROLLED_BACK = 'rolled_back'
+    FAILED = 'failed'
+
+    _FSYNC_BATCH = 32
+    _SETTLED = [CONFIRMED, ROLLED_BACK]
+    _SNAPSHOT_EVERY = 10000
+
+    def key_of(utxo):
+        return f"{utxo.hash}#{utxo.ix}"
+
+    def utxo_of(key):
+        utxo_hash, utxo_ix = key.rsplit('#', 1)
+        return Utxo(utxo_hash, int(utxo_ix), [])
+
+    def __init__(self, journal_file, snapshot_file=None, fsync_batch=_FSYNC_BATCH, snapshot_every=_SNAPSHOT_EVERY):
+        self.journal_file = journal_file
+        self.snapshot_file = snapshot_file if snapshot_file else f"{journal_file}.snapshot"
+        self.fsync_batch = fsync_batch
+        self.snapshot_every = snapshot_every
+        self.vends = {}
+        self.__seq = 0
+        self.__unsynced = 0
+        self.__since_snapshot = 0
+        self.__handle = None
+        self.__lock = threading.RLock()
+
+    def __apply(self, record):
+        key = record['utxo']
+        if record['state'] in VendJournal._SETTLED:
+            self.vends.pop(key, None)
+            return
+        entry = self.vends.setdefault(key, {})
+        entry.update({name: val for name, val in record.items() if name not in ['utxo', 'seq']})
+
+    def replay(self):
+        """
+        Rebuild the state of every unsettled vend from the latest snapshot and
+        the journal written since (a torn final line from a crash is dropped).
+
+        :return: This journal, opened for appending
+        """
+        with self.__lock:
+            self.vends = {}
+            snapshot_seq = 0
+            if os.path.exists(self.snapshot_file):
+                with open(self.snapshot_file, 'r') as snapshot_filehandle:
+                    snapshot = json.load(snapshot_filehandle)
+                self.vends = snapshot['vends']
+                snapshot_seq = snapshot['seq']
+            self.__seq = snapshot_seq
+            if os.path.exists(self.journal_file):
+                with open(self.journal_file, 'rb+') as journal_filehandle:
+                    while True:
+                        offset = journal_filehandle.tell()
+                        line = journal_filehandle.readline()
+                        if not line:
+                            break
+                        try:
+                            record = json.loads(line)
+                        except ValueError:
+                            print(f"WARNING: Truncating torn journal record {line}")
+                            journal_filehandle.truncate(offset)
+                            break
+                        if record['seq'] <= snapshot_seq:
+                            continue
+                        self.__apply(record)
+                        self.__seq = record['seq']
+            self.__handle = open(self.journal_file, 'a')
+            return self
+
+    def record(self, utxo, state, durable=False, **data):
+        """
+        Append a state transition for the vend paid for by ``utxo``.
+
+        :param durable: Flush and fsync before returning (use ahead of any
+            step that cannot be undone)
+        :param data: Extra JSON-serializable fields merged into the vend's
+            state (e.g., ``locked_files`` or ``signed_file``)
+        """
+        with self.__lock:
+            if not self.__handle:
+                raise ValueError('Attempting to record to a journal that was not replayed')
+            self.__seq += 1
+            record = {'seq': self.__seq, 'utxo': VendJournal.key_of(utxo), 'state': state}
+            record.update(data)
+            self.__handle.write(f"{json.dumps(record)}\n")
+            self.__apply(record)
+            self.__unsynced += 1
+            self.__since_snapshot += 1
+            if durable or self.__unsynced >= self.fsync_batch:
+                self.sync()
+            if self.__since_snapshot >= self.snapshot_every:
+                self.snapshot()
+
+    def sync(self):
+        with self.__lock:
+            if not self.__handle or not self.__unsynced:
+                return
+            self.__handle.flush()
+            os.fsync(self.__handle.fileno())
+            self.__unsynced = 0
+
+    def snapshot(self):
+        """
+        Compact the journal: atomically persist the unsettled vends, then start
+        an empty journal.
+        """
+        with self.__lock:
+            self.sync()
+            tmp_file = f"{self.snapshot_file}.tmp"
+            with open(tmp_file, 'w') as snapshot_filehandle:
+                json.dump({'seq': self.__seq, 'vends': self.vends}, snapshot_filehandle)
+                snapshot_filehandle.flush()
+                os.fsync(snapshot_filehandle.fileno())
+            os.replace(tmp_file, self.snapshot_file)
+            if self.__handle:
+                self.__handle.close()
+            self.__handle = open(self.journal_file, 'w')
+            self.__since_snapshot = 0
+
+    def state_of(self, utxo):
+        with self.__lock:
+            entry = self.vends.get(VendJournal.key_of(utxo))
+            return entry['state'] if entry else None
+
+    def in_states(self, *states):
+        """
+        :return: List of ``(utxo, entry)`` for unsettled vends in ``states``
+        """
+        with self.__lock:
+            return [(VendJournal.utxo_of(key), dict(entry)) for key, entry in self.vends.items() if entry['state'] in states]
+
+    def close(self):
+        with self.__lock:
+            if self.__handle:
+                self.sync()
+                self.__handle.close()
+                self.__handle = None
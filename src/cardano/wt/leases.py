@@ -0,0 +1,124 @@
+import json
+import os
+import threading
+
+from cardano.wt.journal import VendJournal
+
+"""
+Time-boxed reservations of the NFT files locked for a vend.  A lease is taken
+out (keyed by the payment UTxO) once the mint transaction is signed with an
+``--invalid-hereafter`` of the lease's expiry slot, bound to the transaction
+hash on submission, then either committed when the payment UTxO is seen spent
+or, once the chain tip reaches the expiry slot (after which the transaction
+can never land) with the payment still unspent, expired so the vending machine
+can put the files back into the inventory, return the whitelist assets the
+vend consumed and vend the payment again.  Every
+change is persisted (and fsynced) to ``state_file`` as it happens, so leases
+outlive a crash.
+"""
+class InventoryLeases(object):
+
+    _TTL_SLOTS = 600
+
+    def __init__(self, ttl_slots=_TTL_SLOTS, state_file=None):
+        if ttl_slots < 1:
+            raise ValueError(f"Leases must last at least 1 slot, found {ttl_slots}")
+        self.ttl_slots = ttl_slots
+        self.state_file = state_file
+        self.__leases = {}
+        self.__lock = threading.Lock()
+        self.__save_lock = threading.Lock()
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__leases)
+
+    def __contains__(self, utxo):
+        with self.__lock:
+            return VendJournal.key_of(utxo) in self.__leases
+
+    def expiry_for(self, tip_slot, expiration_slot=None):
+        """
+        :param expiration_slot: Slot the mint policy itself expires at, leases
+            never outlive it
+        :return: Expiry slot for a lease taken out at ``tip_slot``
+        """
+        expiry_slot = tip_slot + self.ttl_slots
+        return min(expiry_slot, expiration_slot) if expiration_slot else expiry_slot
+
+    def lease(self, utxo, locked_files, expiry_slot, utxo_outputs=[], num_mints=0):
+        """
+        :param utxo_outputs: Outputs the vend's whitelist consumption is
+            based on, with ``num_mints`` what the whitelist must get back if
+            the lease expires
+        """
+        with self.__lock:
+            self.__leases[VendJournal.key_of(utxo)] = {'locked_files': list(locked_files), 'expiry_slot': expiry_slot, 'tx_hash': None, 'utxo_outputs': utxo_outputs, 'num_mints': num_mints}
+        self.save()
+
+    def bind(self, utxo, tx_hash):
+        with self.__lock:
+            lease = self.__leases.get(VendJournal.key_of(utxo))
+            if lease:
+                lease['tx_hash'] = tx_hash
+        if lease:
+            self.save()
+
+    def release(self, utxo):
+        """
+        :return: The dropped lease (or None), whose files the caller returns
+        """
+        with self.__lock:
+            lease = self.__leases.pop(VendJournal.key_of(utxo), None)
+        if lease:
+            self.save()
+        return lease
+
+    def settle(self, unspent, tip_slot):
+        """
+        Commit leases whose payment UTxO was spent and drop the ones that
+        expired with the payment still unspent.
+
+        :param unspent: Payment UTxOs currently at the payment address,
+            listed after ``tip_slot`` was read
+        :return: ``(committed, expired)`` lists of ``(utxo, lease)``
+        """
+        unspent_keys = set([VendJournal.key_of(utxo) for utxo in unspent])
+        committed = []
+        expired = []
+        with self.__lock:
+            for key, lease in list(self.__leases.items()):
+                if not key in unspent_keys:
+                    committed.append((VendJournal.utxo_of(key), self.__leases.pop(key)))
+                elif tip_slot >= lease['expiry_slot']:
+                    expired.append((VendJournal.utxo_of(key), self.__leases.pop(key)))
+        if committed or expired:
+            self.save()
+        return committed, expired
+
+    def load(self):
+        """
+        :return: These leases, populated from ``state_file`` if it exists
+        """
+        if self.state_file and os.path.exists(self.state_file):
+            with open(self.state_file, 'r') as state_filehandle:
+                leases = json.load(state_filehandle)
+            with self.__lock:
+                self.__leases = leases
+        return self
+
+    def save(self):
+        """
+        Atomically (and durably) persist the leases to ``state_file``.
+        """
+        if not self.state_file:
+            return
+        with self.__save_lock:
+            with self.__lock:
+                leases = json.dumps(self.__leases)
+            tmp_file = f"{self.state_file}.tmp"
+            with open(tmp_file, 'w') as state_filehandle:
+                state_filehandle.write(leases)
+                state_filehandle.flush()
+                os.fsync(state_filehandle.fileno())
+            os.replace(tmp_file, self.state_file)
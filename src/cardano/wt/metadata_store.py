@@ -0,0 +1,270 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+"""
+Packed, indexed alternative to a directory of one metadata file per NFT: a
+single SQLite database holding each NFT's metadata file content (keyed by its
+original filename) and a state column (``available``, ``reserved`` or
+``minted``).  It offers the ``Inventory`` API so a ``Mint`` can vend from it
+directly.  Every state transition is a conditional single-row UPDATE inside a
+transaction, so several processes can vend from the same store without ever
+reserving an NFT twice.  Available filenames are also indexed in memory (like
+``Inventory``) so random draws stay O(1).  Triggers append every NFT that
+becomes available (imported or put back, by any process) to a change log, so
+the index only has to pick up the log entries past the last one it saw.  NFTs
+another process reserved are left in the index until a draw's conditional
+UPDATE skips them.  A draw is committed before the vend is journaled, so NFTs
+left reserved without a locked path (by a process that crashed in between)
+for longer than ``reclaim_after`` seconds are made available again on
+``load`` and ``sync``.
+"""
+class MetadataStore(object):
+
+    AVAILABLE = 'available'
+    RESERVED = 'reserved'
+    MINTED = 'minted'
+
+    STATES = [AVAILABLE, RESERVED, MINTED]
+
+    _BUSY_TIMEOUT_SEC = 30
+    _RECLAIM_AFTER_SEC = 600
+
+    def __init__(self, db_file, reclaim_after=_RECLAIM_AFTER_SEC):
+        self.db_file = db_file
+        self.reclaim_after = reclaim_after
+        self.__items = []
+        self.__positions = {}
+        self.__last_change = 0
+        self.__lock = threading.RLock()
+        self.__conn = sqlite3.connect(db_file, timeout=MetadataStore._BUSY_TIMEOUT_SEC, isolation_level=None, check_same_thread=False)
+        self.__conn.execute('PRAGMA journal_mode=WAL')
+        self.__conn.execute('CREATE TABLE IF NOT EXISTS nfts (filename TEXT PRIMARY KEY, content TEXT NOT NULL, state TEXT NOT NULL, locked_path TEXT)')
+        if not 'changed_at' in [column[1] for column in self.__conn.execute('PRAGMA table_info(nfts)')]:
+            self.__conn.execute('ALTER TABLE nfts ADD COLUMN changed_at REAL')
+        self.__conn.execute('CREATE INDEX IF NOT EXISTS nfts_by_state ON nfts (state)')
+        self.__conn.execute('CREATE TABLE IF NOT EXISTS available_changes (seq INTEGER PRIMARY KEY AUTOINCREMENT, filename TEXT NOT NULL)')
+        self.__conn.execute(f"CREATE TRIGGER IF NOT EXISTS nfts_imported AFTER INSERT ON nfts WHEN NEW.state = '{MetadataStore.AVAILABLE}' BEGIN INSERT INTO available_changes (filename) VALUES (NEW.filename); END")
+        self.__conn.execute(f"CREATE TRIGGER IF NOT EXISTS nfts_put_back AFTER UPDATE OF state ON nfts WHEN NEW.state = '{MetadataStore.AVAILABLE}' AND OLD.state != '{MetadataStore.AVAILABLE}' BEGIN INSERT INTO available_changes (filename) VALUES (NEW.filename); END")
+
+    def __in_transaction(self, func):
+        self.__conn.execute('BEGIN IMMEDIATE')
+        try:
+            result = func()
+        except Exception:
+            self.__conn.execute('ROLLBACK')
+            raise
+        self.__conn.execute('COMMIT')
+        return result
+
+    def __transition(self, filename, from_state, to_state, locked_path=None):
+        """
+        :return: Whether ``filename`` was in ``from_state`` (and is now in
+            ``to_state``)
+        """
+        cursor = self.__conn.execute('UPDATE nfts SET state = ?, locked_path = ?, changed_at = ? WHERE filename = ? AND state = ?', (to_state, locked_path, time.time(), filename, from_state))
+        return cursor.rowcount == 1
+
+    def __reclaim_abandoned(self):
+        """
+        Make NFTs drawn but never locked (for ``reclaim_after`` seconds)
+        available again.
+
+        :return: Number of NFTs reclaimed
+        """
+        cursor = self.__conn.execute('UPDATE nfts SET state = ?, changed_at = ? WHERE state = ? AND locked_path IS NULL AND (changed_at IS NULL OR changed_at < ?)', (MetadataStore.AVAILABLE, time.time(), MetadataStore.RESERVED, time.time() - self.reclaim_after))
+        if cursor.rowcount:
+            print(f"Reclaimed {cursor.rowcount} NFT(s) drawn but never locked from {self.db_file}")
+        return cursor.rowcount
+
+    def __reset(self):
+        """
+        Index every available NFT and the change log position it reflects (read
+        from the same snapshot).
+        """
+        self.__conn.execute('BEGIN')
+        try:
+            rows = self.__conn.execute('SELECT filename FROM nfts WHERE state = ? ORDER BY filename', (MetadataStore.AVAILABLE,)).fetchall()
+            last_change = self.__conn.execute('SELECT COALESCE(MAX(seq), 0) FROM available_changes').fetchone()[0]
+        finally:
+            self.__conn.execute('COMMIT')
+        self.__items = [row[0] for row in rows]
+        self.__positions = {filename: idx for idx, filename in enumerate(self.__items)}
+        self.__last_change = last_change
+
+    def __add(self, filename):
+        if filename in self.__positions:
+            return
+        self.__positions[filename] = len(self.__items)
+        self.__items.append(filename)
+
+    def __remove_at(self, idx):
+        last = self.__items.pop()
+        removed = last
+        if idx < len(self.__items):
+            removed = self.__items[idx]
+            self.__items[idx] = last
+            self.__positions[last] = idx
+        del self.__positions[removed]
+        return removed
+
+    def import_dir(self, metadata_dir, state=AVAILABLE):
+        """
+        Import every metadata file of ``metadata_dir`` not already in the
+        store (files already imported are left untouched, whatever their state).
+
+        :return: Number of files imported
+        """
+        if not state in MetadataStore.STATES:
+            raise ValueError(f"Unknown metadata store state '{state}', expected one of {MetadataStore.STATES}")
+        with self.__lock:
+            known = set([row[0] for row in self.__conn.execute('SELECT filename FROM nfts')])
+            rows = []
+            for filename in sorted(os.listdir(metadata_dir)):
+                if filename in known:
+                    continue
+                with open(os.path.join(metadata_dir, filename), 'r') as metadata_filehandle:
+                    rows.append((filename, metadata_filehandle.read(), state))
+            self.__in_transaction(lambda: self.__conn.executemany('INSERT OR IGNORE INTO nfts (filename, content, state) VALUES (?, ?, ?)', rows))
+            return len(rows)
+
+    def export_dir(self, metadata_dir, states=[AVAILABLE]):
+        """
+        Write the NFTs in any of ``states`` back out as one metadata file each.
+
+        :return: Number of files written
+        """
+        os.makedirs(metadata_dir, exist_ok=True)
+        exported = 0
+        with self.__lock:
+            for state in states:
+                for filename, content in self.__conn.execute('SELECT filename, content FROM nfts WHERE state = ?', (state,)):
+                    with open(os.path.join(metadata_dir, filename), 'w') as metadata_filehandle:
+                        metadata_filehandle.write(content)
+                    exported += 1
+        return exported
+
+    def contents(self, state=AVAILABLE):
+        """
+        :return: ``(filename, content)`` pairs of the NFTs in ``state``
+        """
+        with self.__lock:
+            return self.__conn.execute('SELECT filename, content FROM nfts WHERE state = ? ORDER BY filename', (state,)).fetchall()
+
+    def counts(self):
+        with self.__lock:
+            counts = {state: 0 for state in MetadataStore.STATES}
+            counts.update(dict(self.__conn.execute('SELECT state, COUNT(*) FROM nfts GROUP BY state').fetchall()))
+            return counts
+
+    def load(self, filenames=None):
+        """
+        Build the in-memory index of available NFTs (``filenames`` is
+        accepted for ``Inventory`` compatibility only).
+        """
+        with self.__lock:
+            self.__reclaim_abandoned()
+            self.__reset()
+            return self
+
+    def sync(self):
+        """
+        Pick up NFTs made available since the last sync (imported or put back
+        by any process), in time proportional to their number.
+
+        :return: True if any NFT was added to the index
+        """
+        with self.__lock:
+            self.__reclaim_abandoned()
+            changes = self.__conn.execute('SELECT seq, filename FROM available_changes WHERE seq > ? ORDER BY seq', (self.__last_change,)).fetchall()
+            if not changes:
+                return False
+            self.__last_change = changes[-1][0]
+            num_items = len(self.__items)
+            for seq, filename in changes:
+                self.__add(filename)
+            return len(self.__items) > num_items
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__items)
+
+    def __contains__(self, filename):
+        with self.__lock:
+            return filename in self.__positions
+
+    def draw(self, randomly):
+        """
+        Reserve and return one available NFT, skipping any another process
+        reserved in the meantime.
+
+        :return: A metadata filename or None when the store is empty
+        """
+        with self.__lock:
+            while self.__items:
+                idx = random.randrange(len(self.__items)) if randomly else len(self.__items) - 1
+                filename = self.__remove_at(idx)
+                if self.__transition(filename, MetadataStore.AVAILABLE, MetadataStore.RESERVED):
+                    return filename
+            return None
+
+    def sample(self, k, randomly):
+        with self.__lock:
+            drawn = [self.draw(randomly) for i in range(min(k, len(self.__items)))]
+            return [filename for filename in drawn if filename]
+
+    def read(self, filename):
+        """
+        :return: Parsed metadata of ``filename``
+        """
+        with self.__lock:
+            row = self.__conn.execute('SELECT content FROM nfts WHERE filename = ?', (filename,)).fetchone()
+        if not row:
+            raise ValueError(f"No NFT '{filename}' in metadata store {self.db_file}")
+        return json.loads(row[0])
+
+    def put_back(self, filenames):
+        with self.__lock:
+            for filename in filenames:
+                if self.__transition(filename, MetadataStore.RESERVED, MetadataStore.AVAILABLE):
+                    self.__add(filename)
+
+    def move_out(self, filename, destination):
+        """
+        Record where a drawn NFT is locked (no file is written, the path is
+        only an identifier for the journal and leases).
+        """
+        with self.__lock:
+            self.__conn.execute('UPDATE nfts SET locked_path = ? WHERE filename = ? AND state = ?', (destination, filename, MetadataStore.RESERVED))
+
+    def move_in(self, filename, source):
+        """
+        Return a reserved NFT to the available pool.
+
+        :return: Whether the NFT was reserved (and is now available)
+        """
+        with self.__lock:
+            if not self.__transition(filename, MetadataStore.RESERVED, MetadataStore.AVAILABLE):
+                return False
+            self.__add(filename)
+            return True
+
+    def commit(self, filenames):
+        """
+        Mark reserved NFTs whose mint confirmed as minted.
+        """
+        with self.__lock:
+            self.__in_transaction(lambda: [self.__transition(filename, MetadataStore.RESERVED, MetadataStore.MINTED) for filename in filenames])
+
+    def save(self):
+        """
+        Every transition is committed as it happens, nothing left to persist.
+        """
+        pass
+
+    def close(self):
+        with self.__lock:
+            self.__conn.close()
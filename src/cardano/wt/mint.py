@@ -2,17 +2,28 @@ import json
 import math
 import os
 
+from concurrent.futures import ProcessPoolExecutor
+
+from cardano.wt import cbor
+from cardano.wt.inventory import Inventory
+from cardano.wt.metadata_store import MetadataStore
 from cardano.wt.utxo import Utxo
+from cardano.wt.validation_manifest import ValidationManifest
 
 """
 Representation of the current minting process.
 """
 class Mint(object):
 
+    # Bump whenever a metadata check changes, manifests written under other
+    # rules are then ignored and every file is validated again
+    VALIDATION_RULES = 3
+
     _METADATA_KEY = '721'
     _METADATA_MAXLEN = 64
     _MIN_PRICE = 5000000
     _POLICY_LEN = 56
+    _VALIDATION_CHUNKS_PER_WORKER = 4
 
     class RebateCalculator(object):
         __COIN_SIZE = 0.0               # Will change in next era to slightly lower fees
@@ -41,7 +52,20 @@ class Mint(object):
                     return validator[key]
         return None
 
-    def __init__(self, policy, price, donation, nfts_dir, script, sign_key, whitelist):
+    def __init__(self, policy, price, donation, nfts_dir, script, sign_key, whitelist, inventory_file=None, validation_workers=1, manifest_file=None, full_revalidate=False, metadata_store_file=None, metadata_cbor=False):
+        """
+        :param validation_workers: Processes the metadata files are validated
+            across (0 uses the core count, default is 1 [in-process])
+        :param manifest_file: ``ValidationManifest`` file letting restarts
+            skip files that were already validated and did not change
+        :param full_revalidate: Validate every file even if the manifest
+            trusts it (the manifest is then rewritten)
+        :param metadata_store_file: ``MetadataStore`` database to vend from
+            instead of ``nfts_dir`` (whose new files are imported into it)
+        :param metadata_cbor: Precompile every NFT's CBOR fragment during
+            validation (including files the manifest trusts) and keep them in
+            memory for CBOR transaction metadata
+        """
         self.policy = policy
         self.price = price
         self.donation = donation
@@ -49,36 +73,198 @@ class Mint(object):
         self.script = script
         self.sign_key = sign_key
         self.whitelist = whitelist
+        self.inventory_file = inventory_file
+        self.validation_workers = validation_workers if validation_workers else os.cpu_count()
+        self.manifest_file = manifest_file
+        self.full_revalidate = full_revalidate
+        self.metadata_store_file = metadata_store_file
+        self.metadata_cbor = metadata_cbor
+        self.inventory = None
+        self.asset_index = {}
+        self.__fragments = {}
 
         self.initial_slot = Mint.__read_validator('after', 'slot', script)
         self.expiration_slot = Mint.__read_validator('before', 'slot', script)
 
+    def encode_asset_name(asset_name):
+        """
+        :return: ``(hex_name, name_len)`` of the asset name as it appears on
+            chain (UTF-8 bytes)
+        """
+        encoded = asset_name.encode('UTF-8')
+        return (encoded.hex(), len(encoded))
+
+    def indexed_asset(self, filename, asset_name):
+        """
+        :return: ``(hex_name, name_len)`` precomputed during validation, or
+            computed now for files restocked after validation
+        """
+        indexed = self.asset_index.get(filename)
+        if indexed and indexed[0] == asset_name:
+            return indexed[1:]
+        return Mint.encode_asset_name(asset_name)
+
+    def indexed_fragment(self, filename, asset_name, nft_metadata):
+        """
+        :return: CBOR fragment of the asset (see ``cbor.encode_nft_fragment``)
+            precompiled during validation if ``metadata_cbor`` is set,
+            otherwise (or for files restocked after validation) compiled now
+        """
+        indexed = self.__fragments.get(filename)
+        if indexed and indexed[0] == asset_name:
+            return indexed[1]
+        return cbor.encode_nft_fragment(asset_name, nft_metadata)
+
     def validate(self):
         if self.donation and self.donation < Utxo.MIN_UTXO_VALUE:
             raise ValueError(f"Thank you for offering to donate {self.donation} but the minUTxO on Cardano is {Utxo.MIN_UTXO_VALUE} lovelace")
         if self.price and self.price < Mint._MIN_PRICE:
             raise ValueError(f"Minimum mint price is {Mint._MIN_PRICE}, you entered {self.price}")
+        if self.metadata_store_file:
+            store = MetadataStore(self.metadata_store_file)
+            filenames, trusted, validated, fragments = self.__validated_store(store)
+            manifest = None
+        else:
+            filenames = os.listdir(self.nfts_dir)
+            manifest = ValidationManifest(self.manifest_file, self.policy, Mint.VALIDATION_RULES) if self.manifest_file else None
+            if manifest is not None and not self.full_revalidate:
+                manifest.load()
+            trusted = {}
+            if manifest is not None:
+                trusted = {filename: manifest.trusted_asset(self.nfts_dir, filename) for filename in filenames}
+            validated = {}
+            fragments = {}
+            for filename, asset_name, fingerprint, fragment in self.__fanned_out(Mint.validate_files, [filename for filename in filenames if trusted.get(filename) is None], self.metadata_cbor):
+                validated[filename] = asset_name
+                fragments[filename] = fragment
+                if manifest is not None:
+                    manifest.record(filename, asset_name, fingerprint)
+            if self.metadata_cbor:
+                for filename, asset_name, fragment in self.__fanned_out(Mint.compile_files, [filename for filename in filenames if trusted.get(filename) is not None]):
+                    fragments[filename] = fragment
         validated_names = []
-        for filename in os.listdir(self.nfts_dir):
-            with open(os.path.join(self.nfts_dir, filename), 'r') as file:
-                print(f"Validating '{filename}'")
-                validated_nft = self.__validated_nft(json.load(file), validated_names, filename)
-                validated_names.append(validated_nft)
+        asset_index = {}
+        files_by_name = {}
+        for filename in filenames:
+            asset_name = validated[filename] if trusted.get(filename) is None else trusted[filename]
+            if asset_name in files_by_name:
+                raise ValueError(f"Found duplicate asset name '{asset_name}' in file '{filename}' (already in file '{files_by_name[asset_name]}')")
+            files_by_name[asset_name] = filename
+            validated_names.append(asset_name)
+            asset_index[filename] = (asset_name,) + Mint.encode_asset_name(asset_name)
+        if manifest is not None:
+            print(f"Trusted {manifest.trusted_count} unchanged file(s) from {self.manifest_file}, validated {len(validated)}")
+            manifest.save(filenames)
         self.validated_names = validated_names
+        self.asset_index = asset_index
+        self.__fragments = {filename: (asset_index[filename][0], fragment) for filename, fragment in fragments.items() if fragment is not None}
+        if self.metadata_store_file:
+            self.inventory = store.load()
+        else:
+            self.inventory = Inventory(self.nfts_dir, state_file=self.inventory_file).load(filenames)
         print(f"Validating whitelist of type {self.whitelist.__class__}")
         self.whitelist.validate()
 
-    def __validate_str_lengths(self, metadata):
-        if type(metadata) is dict:
-            for key, value in metadata.items():
-                self.__validate_str_lengths(value)
-        if type(metadata) is list:
-            for value in metadata:
-                self.__validate_str_lengths(value)
-        if type(metadata) is str and len(metadata) > Mint._METADATA_MAXLEN:
-            raise ValueError(f"Encountered metadata value >{Mint._METADATA_MAXLEN} chars '{metadata}'")
-
-    def __validated_nft(self, nft, existing, filename):
+    def __validated_store(self, store):
+        """
+        Import new files from ``nfts_dir`` (if any) and validate every NFT the
+        store has available.
+
+        :return: ``(filenames, trusted, validated, fragments)`` as for a
+            directory
+        """
+        if self.nfts_dir:
+            print(f"Imported {store.import_dir(self.nfts_dir)} new file(s) from '{self.nfts_dir}' into {self.metadata_store_file}")
+        contents = store.contents(MetadataStore.AVAILABLE)
+        validated = {}
+        fragments = {}
+        for filename, content in contents:
+            nft = json.loads(content)
+            validated[filename] = Mint.__validated_nft(self.policy, nft, filename)
+            if self.metadata_cbor:
+                fragments[filename] = cbor.encode_nft_fragment(validated[filename], nft[Mint._METADATA_KEY][self.policy][validated[filename]])
+        return [filename for filename, content in contents], {}, validated, fragments
+
+    def __fanned_out(self, files_func, filenames, *args):
+        """
+        Apply ``files_func`` (``validate_files`` or ``compile_files``) to
+        ``filenames`` and ``args``, fanning chunks of them out across
+        ``validation_workers`` processes.
+
+        :return: Concatenated results of ``files_func`` in the order of
+            ``filenames``
+        """
+        if self.validation_workers < 2 or len(filenames) < 2:
+            return files_func(self.policy, self.nfts_dir, filenames, *args)
+        num_chunks = self.validation_workers * Mint._VALIDATION_CHUNKS_PER_WORKER
+        chunk_size = max(1, math.ceil(len(filenames) / num_chunks))
+        chunks = [filenames[start:start + chunk_size] for start in range(0, len(filenames), chunk_size)]
+        results = []
+        with ProcessPoolExecutor(max_workers=min(self.validation_workers, len(chunks))) as executor:
+            for chunk_results in executor.map(files_func, [self.policy] * len(chunks), [self.nfts_dir] * len(chunks), chunks, *[[arg] * len(chunks) for arg in args]):
+                results += chunk_results
+        return results
+
+    def compile_files(policy, nfts_dir, filenames):
+        """
+        Precompile the CBOR fragment of files that were already validated
+        (e.g., trusted by the manifest).
+
+        :return: ``(filename, asset_name, fragment)`` tuples in the order of
+            ``filenames``
+        """
+        compiled = []
+        for filename in filenames:
+            with open(os.path.join(nfts_dir, filename), 'rb') as file:
+                nfts = json.loads(file.read())[Mint._METADATA_KEY][policy]
+            asset_name = list(nfts.keys())[0]
+            compiled.append((filename, asset_name, cbor.encode_nft_fragment(asset_name, nfts[asset_name])))
+        return compiled
+
+    def validate_files(policy, nfts_dir, filenames, metadata_cbor=False):
+        """
+        Check every file under ``nfts_dir`` in ``filenames`` on its own (asset
+        names are only checked for duplicates once every file is validated)
+        and, if ``metadata_cbor`` is set, precompile its CBOR fragment.
+
+        :return: ``(filename, asset_name, fingerprint, fragment)`` tuples in
+            the order of ``filenames`` (see ``ValidationManifest.fingerprint``
+            and ``cbor.encode_nft_fragment``, the fragment is None unless
+            ``metadata_cbor`` is set)
+        """
+        validated = []
+        for filename in filenames:
+            path = os.path.join(nfts_dir, filename)
+            with open(path, 'rb') as file:
+                print(f"Validating '{filename}'")
+                content = file.read()
+            nft = json.loads(content)
+            asset_name = Mint.__validated_nft(policy, nft, filename)
+            fragment = cbor.encode_nft_fragment(asset_name, nft[Mint._METADATA_KEY][policy][asset_name]) if metadata_cbor else None
+            validated.append((filename, asset_name, ValidationManifest.fingerprint(path, content), fragment))
+        return validated
+
+    def __validate_values(metadata, path, filename):
+        """
+        Walk ``metadata`` iteratively (depth-first) so deeply nested values
+        neither recurse nor go unreported, rejecting strings longer than
+        Cardano's limit (in UTF-8 bytes, not characters) and any value Cardano metadata cannot hold (booleans, floats, nulls).
+
+        :param path: Location of ``metadata`` within the file, used in errors
+        """
+        pending = [(path, metadata)]
+        while pending:
+            path, value = pending.pop()
+            if type(value) is dict:
+                pending.extend([(f"{path}.{key}", nested) for key, nested in reversed(list(value.items()))])
+            elif type(value) is list:
+                pending.extend([(f"{path}[{idx}]", nested) for idx, nested in reversed(list(enumerate(value)))])
+            elif type(value) is str and len(value.encode('UTF-8')) > Mint._METADATA_MAXLEN:
+                raise ValueError(f"Encountered metadata value >{Mint._METADATA_MAXLEN} bytes '{value}' at {path} in file '{filename}'")
+            elif not type(value) in (str, int):
+                raise ValueError(f"Encountered metadata value of unsupported type {type(value).__name__} '{value}' at {path} in file '{filename}' (only integers, strings, lists and maps are allowed)")
+
+    def __validated_nft(expected_policy, nft, filename):
         if len(nft.keys()) != 1:
             raise ValueError(f"Incorrect # of keys ({len(nft.keys())}) found in file '{filename}'")
         if not Mint._METADATA_KEY in nft:
@@ -93,13 +279,11 @@ class Mint(object):
         policy = sorted(list(nft_policy_obj.keys()))[0]
         if len(policy) != Mint._POLICY_LEN:
             raise ValueError(f"Incorrect looking policy {policy} in file '{filename}'")
-        if policy != self.policy:
-            raise ValueError(f"Encountered asset with policy {policy} different from vending machine start value {self.policy}")
+        if policy != expected_policy:
+            raise ValueError(f"Encountered asset with policy {policy} different from vending machine start value {expected_policy}")
         asset_obj = nft_policy_obj[policy]
         if len(asset_obj.keys()) != 1:
             raise ValueError(f"Incorrect # of assets ({len(asset_obj.keys())}) found in file '{filename}'")
         asset_name = list(asset_obj.keys())[0]
-        if asset_name in existing:
-            raise ValueError(f"Found duplicate asset name '{asset_name}' in file '{filename}'")
-        self.__validate_str_lengths(asset_obj)
+        Mint.__validate_values(asset_obj[asset_name], asset_name, filename)
         return asset_name
@@ -0,0 +1,188 @@
+import json
+import threading
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.refunds import RefundEngine
+
+"""
+Hosts several collections in one process, each collection being its own
+``Mint`` served by its own ``VendCoordinator`` (with its own output directory,
+journal, retry queue, exclusions and poll schedule) while every collection
+shares the process-wide chain client (and its rate limiter and cached
+protocol parameters), cardano-cli worker pool and fee cache.  A collection
+that fails to validate, recover or serve is dropped (and recorded in
+``failed``) without affecting the others.
+"""
+class CollectionRunner(object):
+
+    __REQUIRED_KEYS = ['name', 'output_dir', 'payment_addr', 'payment_sign_key', 'profit_addr', 'mint_policy', 'mint_script_file', 'mint_sign_key', 'metadata_dir', 'single_vend_max']
+    __UNIQUE_KEYS = ['name', 'output_dir', 'payment_addr', 'metadata_dir']
+    __COLLECTION_DEFAULTS = {
+        'mint_price': None,
+        'free_mint': False,
+        'vend_randomly': False,
+        'donation': False,
+        'single_use_asset_whitelist': None,
+        'unlimited_asset_whitelist': None,
+        'metadata_store': None,
+        'artifact_hot_dir': None,
+        'batch_buyers_max': 1,
+        'lookup_workers': 1,
+        'submit_workers': 1,
+        'retry_max_attempts': 5,
+        'vends_per_cycle': None,
+        'fairness': None,
+        'per_address_cap': None,
+        'sender_weight': None,
+        'lease_slots': None,
+        'refunds': False,
+        'refund_fee_policy': RefundEngine.FEE_SPLIT,
+        'refund_batch_max': 20,
+        'refund_max_wait': 300
+    }
+    __SHARED_KEYS = ['blockfrost_project', 'output_dir', 'collections']
+    __SHARED_DEFAULTS = {
+        'mainnet': False,
+        'preview': False,
+        'api_calls_per_sec': 10,
+        'protocol_params_ttl': 3600,
+        'cardano_cli': CardanoCli.DEFAULT_CLI_PATH,
+        'cli_workers': 1,
+        'validation_workers': 1,
+        'full_revalidate': False,
+        'fee_cache': False,
+        'fee_cache_bucket_bytes': 256,
+        'fee_cache_verify_every': 100,
+        'metadata_cbor': False,
+        'poll_min_wait': 5,
+        'poll_max_wait': 120
+    }
+
+    """
+    One collection hosted by the runner: its coordinator plus the per-machine
+    exclusions and poll schedulers the coordinator is served with.
+    """
+    class Collection(object):
+
+        def __init__(self, name, coordinator, output_dir, exclusions, poll_schedulers):
+            self.name = name
+            self.coordinator = coordinator
+            self.output_dir = output_dir
+            self.exclusions = exclusions
+            self.poll_schedulers = poll_schedulers
+
+    def read_config(config_file):
+        """
+        Read a JSON runner config: shared settings at the top level (e.g.,
+        ``blockfrost_project``, ``mainnet``, ``api_calls_per_sec`` and the
+        ``output_dir`` for process-wide files such as the protocol
+        parameters) and a
+        ``collections`` list whose entries use the ``run`` flag names with
+        underscores (e.g., ``mint_price``, ``single_use_asset_whitelist``).
+        Settings a collection cannot honor (e.g., ``extra_payment``) are
+        rejected rather than ignored.
+
+        :return: Config dictionary with defaults filled in
+        """
+        with open(config_file, 'r') as config_filehandle:
+            config = json.load(config_filehandle)
+        for key in ['blockfrost_project', 'output_dir']:
+            if not config.get(key):
+                raise ValueError(f"Runner config {config_file} is missing '{key}'")
+        unsupported = [key for key in config if not (key in CollectionRunner.__SHARED_KEYS or key in CollectionRunner.__SHARED_DEFAULTS)]
+        if unsupported:
+            raise ValueError(f"Runner config {config_file} has unsupported shared setting(s) {unsupported}")
+        collections = config.get('collections')
+        if not collections or type(collections) is not list:
+            raise ValueError(f"Runner config {config_file} must list at least one collection under 'collections'")
+        for idx, collection in enumerate(collections):
+            name = collection.get('name', f"#{idx}")
+            missing = [key for key in CollectionRunner.__REQUIRED_KEYS if not key in collection]
+            if missing:
+                raise ValueError(f"Collection {name} in {config_file} is missing {missing}")
+            unsupported = [key for key in collection if not (key in CollectionRunner.__REQUIRED_KEYS or key in CollectionRunner.__COLLECTION_DEFAULTS)]
+            if unsupported:
+                raise ValueError(f"Collection {name} in {config_file} has unsupported setting(s) {unsupported} (shared settings go at the top level)")
+            if bool(collection.get('mint_price')) == bool(collection.get('free_mint')):
+                raise ValueError(f"Collection {name} in {config_file} needs exactly one of 'mint_price' or 'free_mint'")
+            if collection.get('single_use_asset_whitelist') and collection.get('unlimited_asset_whitelist'):
+                raise ValueError(f"Collection {name} in {config_file} cannot use both a single-use and an unlimited whitelist")
+            for key, default in CollectionRunner.__COLLECTION_DEFAULTS.items():
+                collection.setdefault(key, default)
+        for key in CollectionRunner.__UNIQUE_KEYS:
+            values = [collection[key] for collection in collections]
+            if len(set(values)) != len(values):
+                raise ValueError(f"Collections in {config_file} must not share a '{key}': {values}")
+        for key, default in CollectionRunner.__SHARED_DEFAULTS.items():
+            config.setdefault(key, default)
+        return config
+
+    def __init__(self, collections):
+        names = [collection.name for collection in collections]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Collection names must be unique: {names}")
+        self.collections = collections
+        self.failed = {}
+        self.__lock = threading.Lock()
+
+    def __drop(self, collection, stage, e):
+        print(f"WARNING: Collection {collection.name} failed to {stage}, no longer serving it: {e}")
+        with self.__lock:
+            self.failed[collection.name] = f"{stage}: {e}"
+            self.collections = [other for other in self.collections if other is not collection]
+
+    def __isolated(self, stage, func):
+        for collection in list(self.collections):
+            try:
+                func(collection)
+            except Exception as e:
+                self.__drop(collection, stage, e)
+        if not self.collections:
+            raise ValueError(f"No collection left to serve, failures: {self.failed}")
+
+    def validate(self):
+        """
+        Validate every collection, dropping those that fail.
+
+        :return: Names of the collections left to serve
+        """
+        self.__isolated('validate', lambda collection: collection.coordinator.validate())
+        return [collection.name for collection in self.collections]
+
+    def recover(self):
+        self.__isolated('recover', lambda collection: collection.coordinator.recover(collection.exclusions))
+
+    def __in_parallel(self, target):
+        results = {}
+        def run(collection):
+            try:
+                results[collection.name] = target(collection)
+            except Exception as e:
+                results[collection.name] = 0
+                self.__drop(collection, 'vend', e)
+        threads = [
+            threading.Thread(target=run, args=(collection,), name=f"collection-{collection.name}", daemon=True)
+            for collection in self.collections
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def vend(self, locked_subdir, metadata_subdir):
+        """
+        Run one vend cycle on every collection in parallel.
+
+        :return: Number of mint requests picked up per collection name
+        """
+        return self.__in_parallel(lambda collection: collection.coordinator.vend(collection.output_dir, locked_subdir, metadata_subdir, collection.exclusions))
+
+    def serve(self, locked_subdir, metadata_subdir, is_running):
+        """
+        Serve every collection on its own thread until ``is_running()`` turns
+        False.
+
+        :return: Number of mint requests picked up per collection name
+        """
+        return self.__in_parallel(lambda collection: collection.coordinator.serve(collection.output_dir, locked_subdir, metadata_subdir, collection.exclusions, collection.poll_schedulers, is_running))
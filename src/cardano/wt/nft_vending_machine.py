@@ -1,13 +1,19 @@
 import json
 import math
 import os
-import random
-import shutil
+import threading
 import time
 import traceback
 
+from cardano.wt import cbor
+from cardano.wt.artifact_store import next_artifact_id
 from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.exclusions import ExclusionTracker
+from cardano.wt.journal import VendJournal
 from cardano.wt.mint import Mint
+from cardano.wt.pipeline import Pipeline
+from cardano.wt.retry import RetryScheduler
+from cardano.wt.txn_size import TxnSizeEstimator
 from cardano.wt.utxo import Utxo
 
 class BadUtxoError(ValueError):
@@ -16,20 +22,133 @@ class BadUtxoError(ValueError):
         super().__init__(message)
         self.utxo = utxo
 
+"""
+State accumulated for a single mint request as it moves from payment checks
+through inventory reservation, the cardano-cli and finally submission.
+"""
+class VendRequest(object):
+
+    def __init__(self, utxo, lovelace, num_mints_requested):
+        self.utxo = utxo
+        self.lovelace = lovelace
+        self.num_mints_requested = num_mints_requested
+        self.input_addr = None
+        self.utxo_outputs = None
+        self.chain_position = None
+        self.num_mints = 0
+        self.txn_id = None
+        self.bundle = MetadataBundle()
+        self.nft_names = []
+        self.wl_units = set()
+        self.locked_files = []
+
+"""
+Whitelist units (non-lovelace assets in the payment's transaction outputs)
+held by in-flight vends.  A single instance is shared by every vending machine
+drawing on the same whitelist so that a unit only ever counts towards one
+request between its availability check and its consumption.
+"""
+class WhitelistClaims(object):
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.__units = set()
+        self.__units_lock = threading.Lock()
+
+    def claim(self, units):
+        """
+        :return: True if none of ``units`` were already claimed (in which case
+            they now are), False otherwise
+        """
+        with self.__units_lock:
+            if units & self.__units:
+                return False
+            self.__units |= units
+            return True
+
+    def release(self, units):
+        with self.__units_lock:
+            self.__units -= units
+
+"""
+NFT metadata drawn for a vend (or merged across a batch) held in memory along
+with the hex asset names, their UTF-8 lengths and each NFT's precompiled CBOR
+fragment, so nothing has to be re-read from the combined metadata file nor
+re-encoded to know its size.
+"""
+class MetadataBundle(object):
+
+    def __init__(self):
+        self.metadata = {}
+        self.asset_names = []
+        self.hex_names = []
+        self.name_lens = []
+        self.fragments = []
+        self.fragment_bytes = 0
+
+    def add(self, asset_name, hex_name, name_len, metadata, fragment):
+        self.metadata[asset_name] = metadata
+        self.asset_names.append(asset_name)
+        self.hex_names.append(hex_name)
+        self.name_lens.append(name_len)
+        self.fragments.append(fragment)
+        self.fragment_bytes += len(fragment)
+
+    def cbor(self, policy):
+        """
+        :return: CBOR transaction metadata concatenated from the fragments
+        """
+        return cbor.encode_cip25_fragments(policy, self.fragments)
+
+    def merged(bundles):
+        merged_bundle = MetadataBundle()
+        for bundle in bundles:
+            merged_bundle.metadata.update(bundle.metadata)
+            merged_bundle.asset_names += bundle.asset_names
+            merged_bundle.hex_names += bundle.hex_names
+            merged_bundle.name_lens += bundle.name_lens
+            merged_bundle.fragments += bundle.fragments
+            merged_bundle.fragment_bytes += bundle.fragment_bytes
+        return merged_bundle
+
+"""
+One or more reserved mint requests that share a single transaction: one
+``--tx-in`` and one NFT+change output per buyer, plus a single profit output
+and a single donation output for the whole batch.
+"""
+class VendBatch(object):
+
+    def __init__(self, vend_reqs, txn_id, metadata_file):
+        self.vend_reqs = vend_reqs
+        self.txn_id = txn_id
+        self.metadata_file = metadata_file
+        self.nft_names = [nft_name for vend_req in vend_reqs for nft_name in vend_req.nft_names]
+        self.num_mints = sum([vend_req.num_mints for vend_req in vend_reqs])
+        self.fee = None
+        self.fee_key = None
+        self.fee_cached = False
+        self.output_dir = None
+        self.signed_file = None
+
 class NftVendingMachine(object):
 
     __SINGLE_POLICY = 1
-    __ERROR_WAIT = 30
+    __FEE_TOO_SMALL = 'FeeTooSmall'
 
     def as_json(self):
-        return json.dumps(self, default=lambda o: o.__dict__, sort_keys=True, indent=4)
+        return json.dumps(self, default=NftVendingMachine.__public_attrs, sort_keys=True, indent=4)
+
+    def __public_attrs(obj):
+        if not hasattr(obj, '__dict__'):
+            return repr(obj)
+        return {key: val for key, val in obj.__dict__.items() if not key.startswith('_')}
 
     def _get_donation_addr(mainnet):
         if mainnet:
             return 'addr1qx2skanhkpgdhcyxnczydg3meqcv87z4vep7u2drrr6277v5entql0xseq6a4zs8j524wvwv6k46kpf8pt9ejjk6l9gs4g94mf'
         return 'addr_test1vrce7uwk8vcva5j4dmehrxprwy57x20yaz9cv9vqzjutnnsrgrfey'
 
-    def __init__(self, payment_addr, payment_sign_key, profit_addr, vend_randomly, single_vend_max, mint, blockfrost_api, cardano_cli, mainnet=False):
+    def __init__(self, payment_addr, payment_sign_key, profit_addr, vend_randomly, single_vend_max, mint, blockfrost_api, cardano_cli, mainnet=False, artifact_store=None, max_tx_size=None, batch_buyers_max=1, lookup_workers=1, submit_workers=1, retry_scheduler=None, vends_per_cycle=None, journal=None, whitelist_claims=None, fair_scheduler=None, fee_cache=None, refund_engine=None, leases=None, metadata_cbor=False):
         self.payment_addr = payment_addr
         self.payment_sign_key = payment_sign_key
         self.profit_addr = profit_addr
@@ -39,49 +158,142 @@ class NftVendingMachine(object):
         self.blockfrost_api = blockfrost_api
         self.cardano_cli = cardano_cli
         self.donation_addr = NftVendingMachine._get_donation_addr(mainnet)
+        self.artifact_store = artifact_store
+        self.max_tx_size = max_tx_size
+        self.batch_buyers_max = batch_buyers_max
+        self.lookup_workers = lookup_workers
+        self.submit_workers = submit_workers
+        self.retry_scheduler = retry_scheduler if retry_scheduler else RetryScheduler()
+        self.vends_per_cycle = vends_per_cycle
+        self.journal = journal
+        self.__backlog = False
+        self.txn_size_estimator = None
+        self.whitelist_claims = whitelist_claims if whitelist_claims else WhitelistClaims()
+        self.fair_scheduler = fair_scheduler
+        self.fee_cache = fee_cache
+        self.refund_engine = refund_engine
+        self.leases = leases
+        self.metadata_cbor = metadata_cbor
+        self.stage_profiler = CardanoCli.Profiler()
+        self.__tip_slot = None
+        self.__deferred = {}
         self.__is_validated = False
 
-    def __get_tx_out_args(self, input_addr, change, nft_names, total_profit, total_donation):
-        user_tokens = filter(None, [input_addr, str(change), CardanoCli.named_asset_str(self.mint.policy, nft_names)])
-        user_output = f"--tx-out '{'+'.join(user_tokens)}'"
+    def __get_tx_out_args(self, buyer_outputs, total_profit, total_donation):
+        user_outputs = []
+        for input_addr, change, nft_names in buyer_outputs:
+            user_tokens = filter(None, [input_addr, str(change), CardanoCli.named_asset_str(self.mint.policy, nft_names)])
+            user_outputs.append(f"--tx-out '{'+'.join(user_tokens)}'")
         profit_output = f"--tx-out '{self.profit_addr}+{total_profit}'" if total_profit else ''
         donation_output = f"--tx-out '{self.donation_addr}+{total_donation}'" if total_donation else ''
-        return [user_output, profit_output, donation_output]
+        return user_outputs + [profit_output, donation_output]
+
+    def __cli_dir(self, output_dir):
+        return self.artifact_store.hot_dir if self.artifact_store else output_dir
+
+    def __combined_metadata_dir(self, output_dir, metadata_subdir):
+        return self.artifact_store.metadata_dir if self.artifact_store else os.path.join(output_dir, metadata_subdir)
 
-    def __generate_nft_names_from(self, metadata_file):
-        with open(metadata_file, 'r') as metadata_filehandle:
-            policy_json = json.load(metadata_filehandle)['721'][self.mint.policy]
-            names = policy_json.keys()
-            return [name.encode('UTF-8').hex() for name in names]
+    def __metadata_bytes(self, num_nfts, fragment_bytes):
+        empty_bytes = len(cbor.encode_metadata_json({'721': {self.mint.policy: {}}}))
+        return empty_bytes - len(cbor.map_head(0)) + len(cbor.map_head(num_nfts)) + fragment_bytes
 
-    def __get_nft_names_from(self, metadata_file):
-        with open(metadata_file, 'r') as metadata_filehandle:
-            policy_json = json.load(metadata_filehandle)['721'][self.mint.policy]
-            return policy_json.keys()
+    def __txn_shape(self, buyers, fragment_bytes):
+        """
+        :param buyers: List of ``(input_addr, asset_name_lens)``, one per
+            ``--tx-in`` and buyer output of the transaction
+        :param fragment_bytes: CBOR size of every NFT's name and metadata
+        :return: Leading arguments of ``TxnSizeEstimator.estimate``
+        """
+        outputs = list(buyers)
+        if self.mint.price:
+            outputs.append((self.profit_addr, []))
+        if self.mint.donation:
+            outputs.append((self.donation_addr, []))
+        asset_name_lens = [name_len for (input_addr, name_lens) in buyers for name_len in name_lens]
+        metadata_bytes = self.__metadata_bytes(len(asset_name_lens), fragment_bytes)
+        return (len(buyers), outputs, asset_name_lens, metadata_bytes)
 
-    def __lock_and_merge(self, available_mints, num_mints, output_dir, locked_subdir, metadata_subdir, txn_id):
-        combined_nft_metadata = {}
+    def __fits_in_txn(self, buyers, fragment_bytes):
+        if not self.txn_size_estimator:
+            return True
+        return self.txn_size_estimator.fits(*self.__txn_shape(buyers, fragment_bytes), 2)
+
+    def __batch_buyers(vend_reqs):
+        return [(vend_req.input_addr, vend_req.bundle.name_lens) for vend_req in vend_reqs]
+
+    def __batch_fits(self, vend_reqs):
+        buyers = NftVendingMachine.__batch_buyers(vend_reqs)
+        return self.__fits_in_txn(buyers, sum([vend_req.bundle.fragment_bytes for vend_req in vend_reqs]))
+
+    def __lock_and_merge(self, num_mints, vend_req, output_dir, locked_subdir):
+        inventory = self.mint.inventory
+        bundle = MetadataBundle()
         for i in range(num_mints):
-            mint_metadata_filename = available_mints.pop()
-            mint_metadata_orig = os.path.join(self.mint.nfts_dir, mint_metadata_filename)
-            with open(mint_metadata_orig, 'r') as mint_metadata_handle:
-                mint_metadata = json.load(mint_metadata_handle)
-                for nft_name, nft_metadata in mint_metadata['721'][self.mint.policy].items():
-                    combined_nft_metadata[nft_name] = nft_metadata
-            mint_metadata_locked = os.path.join(output_dir, locked_subdir, mint_metadata_filename)
-            shutil.move(mint_metadata_orig, mint_metadata_locked)
-        combined_output_path = os.path.join(output_dir, metadata_subdir, f"{txn_id}.json")
+            mint_metadata_filename = inventory.draw(self.vend_randomly)
+            if mint_metadata_filename is None:
+                print(f"Inventory ran out while reserving (another machine drew concurrently), vending {i} of {num_mints} NFTs")
+                break
+            nfts = inventory.read(mint_metadata_filename)['721'][self.mint.policy]
+            nft_assets = [(nft_name,) + self.mint.indexed_asset(mint_metadata_filename, nft_name) for nft_name in nfts.keys()]
+            nft_fragments = [self.mint.indexed_fragment(mint_metadata_filename, nft_name, nft_metadata) for nft_name, nft_metadata in nfts.items()]
+            nft_name_lens = [name_len for (nft_name, hex_name, name_len) in nft_assets]
+            if not self.__fits_in_txn([(vend_req.input_addr, bundle.name_lens + nft_name_lens)], bundle.fragment_bytes + sum([len(fragment) for fragment in nft_fragments])):
+                print(f"Adding '{mint_metadata_filename}' would exceed max_tx_size {self.max_tx_size}, vending {i} of {num_mints} NFTs")
+                inventory.put_back([mint_metadata_filename])
+                break
+            for (nft_name, hex_name, name_len), fragment in zip(nft_assets, nft_fragments):
+                bundle.add(nft_name, hex_name, name_len, nfts[nft_name], fragment)
+            vend_req.locked_files.append(os.path.join(output_dir, locked_subdir, mint_metadata_filename))
+        return bundle
+
+    def __write_combined_metadata(self, bundle, output_dir, metadata_subdir, txn_id):
+        """
+        :return: Path of the combined metadata, raw CBOR assembled from the
+            precompiled fragments (``.cbor``) if ``metadata_cbor`` is set,
+            otherwise JSON for cardano-cli to encode (``.json``)
+        """
+        if self.metadata_cbor:
+            combined_output_path = os.path.join(self.__combined_metadata_dir(output_dir, metadata_subdir), f"{txn_id}{CardanoCli.CBOR_METADATA_EXT}")
+            with open(combined_output_path, 'wb') as combined_metadata_handle:
+                combined_metadata_handle.write(bundle.cbor(self.mint.policy))
+            return combined_output_path
+        combined_output_path = os.path.join(self.__combined_metadata_dir(output_dir, metadata_subdir), f"{txn_id}.json")
         with open(combined_output_path, 'w') as combined_metadata_handle:
-            json.dump({'721': { self.mint.policy : combined_nft_metadata }}, combined_metadata_handle)
+            json.dump({'721': { self.mint.policy : bundle.metadata }}, combined_metadata_handle)
         return combined_output_path
 
-    def __do_vend(self, mint_req, output_dir, locked_subdir, metadata_subdir):
-        available_mints = os.listdir(self.mint.nfts_dir)
-        if not available_mints:
-            print("WARNING: Metadata directory is empty, please restock the vending machine...")
-        elif self.vend_randomly:
-            random.shuffle(available_mints)
+    def __batch_of(self, vend_reqs, output_dir, metadata_subdir):
+        """
+        Write the combined metadata for a transaction (the only time it is
+        written, and only for cardano-cli's benefit).
+        """
+        if len(vend_reqs) == 1:
+            txn_id = vend_reqs[0].txn_id
+            bundle = vend_reqs[0].bundle
+        else:
+            txn_id = self.artifact_store.new_id() if self.artifact_store else next_artifact_id()
+            bundle = MetadataBundle.merged([vend_req.bundle for vend_req in vend_reqs])
+        metadata_file = self.__write_combined_metadata(bundle, output_dir, metadata_subdir, txn_id)
+        return VendBatch(vend_reqs, txn_id, metadata_file)
+
+    def __pack_batches(self, vend_reqs):
+        """
+        Greedily group reserved requests (in arrival order) into batches of at
+        most ``batch_buyers_max`` buyers that stay under ``max_tx_size``.
+        """
+        batches = []
+        current = []
+        for vend_req in vend_reqs:
+            if current and (len(current) >= self.batch_buyers_max or not self.__batch_fits(current + [vend_req])):
+                batches.append(current)
+                current = []
+            current.append(vend_req)
+        if current:
+            batches.append(current)
+        return batches
 
+    def __check_payment(self, mint_req):
         non_lovelace_bals = [balance for balance in mint_req.balances if balance.policy != Utxo.Balance.LOVELACE_POLICY]
         if non_lovelace_bals:
             raise BadUtxoError(mint_req, f"Cannot accept non-lovelace balances as payment")
@@ -94,81 +306,574 @@ class NftVendingMachine(object):
         num_mints_requested = math.floor(lovelace_bal.lovelace / self.mint.price) if self.mint.price else self.single_vend_max
         if not num_mints_requested:
             raise BadUtxoError(mint_req, f"User intentionally sent too little lovelace, avoiding txn processing to avoid DDoS")
+        self.__journal(mint_req, VendJournal.RECEIVED, payment_addr=self.payment_addr)
+        return VendRequest(mint_req, lovelace_bal.lovelace, num_mints_requested)
+
+    def __journal(self, utxo, state, durable=False, **data):
+        if self.journal:
+            self.journal.record(utxo, state, durable=durable, **data)
 
+    def __journaled(self, *states):
+        """
+        :return: ``VendJournal.in_states`` restricted to the vends paid to
+            this machine's address (machines may share one journal)
+        """
+        return [(utxo, entry) for utxo, entry in self.journal.in_states(*states) if entry.get('payment_addr', self.payment_addr) == self.payment_addr]
+
+    def __lookup_sender(self, vend_req):
+        mint_req = vend_req.utxo
         utxos = self.blockfrost_api.get_tx_utxos(mint_req.hash)
         utxo_inputs = utxos['inputs']
-        utxo_outputs = utxos['outputs']
         input_addrs = set([utxo_input['address'] for utxo_input in utxo_inputs if not utxo_input['reference']])
         if len(input_addrs) < 1:
-            raise BadUtxoError(mint_req, f"Txn hash {txn_hash} has no valid addresses ({utxo_inputs}), aborting...")
-        input_addr = input_addrs.pop()
+            raise BadUtxoError(mint_req, f"Txn hash {mint_req.hash} has no valid addresses ({utxo_inputs}), aborting...")
+        vend_req.input_addr = input_addrs.pop()
+        vend_req.utxo_outputs = utxos['outputs']
+
+    def __lookup_chain_position(self, vend_req):
+        """
+        Record where the payment landed on chain as ``(block_height,
+        tx_index, output_index)``, payments whose txn cannot be found sort last.
+        """
+        txn = self.blockfrost_api.get_txn(vend_req.utxo.hash)
+        block_position = (txn['block_height'], txn['index']) if txn else (math.inf, math.inf)
+        vend_req.chain_position = block_position + (vend_req.utxo.ix,)
 
-        wl_availability = self.mint.whitelist.available(utxo_outputs)
-        num_mints = min(self.single_vend_max, len(available_mints), num_mints_requested, wl_availability)
+    def __reserve(self, vend_req, output_dir, locked_subdir):
+        self.mint.inventory.sync()
+        num_available = len(self.mint.inventory)
+        if not num_available:
+            print("WARNING: Metadata directory is empty, please restock the vending machine...")
 
-        if not self.mint.price and self.max_rebate > lovelace_bal.lovelace:
-            print(f"Payment of {lovelace_bal.lovelace} might cause minUTxO error for {num_mints} NFTs, refunding instead...")
+        wl_availability = self.mint.whitelist.available(vend_req.utxo_outputs)
+        num_mints = min(self.single_vend_max, num_available, vend_req.num_mints_requested, wl_availability)
+
+        if not self.mint.price and self.max_rebate > vend_req.lovelace:
+            print(f"Payment of {vend_req.lovelace} might cause minUTxO error for {num_mints} NFTs, refunding instead...")
             num_mints = 0
 
-        gross_profit = num_mints * self.mint.price
-        change = lovelace_bal.lovelace - gross_profit
+        vend_req.txn_id = self.artifact_store.new_id() if self.artifact_store else next_artifact_id()
+        vend_req.bundle = self.__lock_and_merge(num_mints, vend_req, output_dir, locked_subdir)
+        vend_req.nft_names = vend_req.bundle.hex_names
 
-        print(f"Beginning to mint {num_mints} NFTs to send to address {input_addr}")
-        txn_id = int(time.time())
-        nft_metadata_file = self.__lock_and_merge(available_mints, num_mints, output_dir, locked_subdir, metadata_subdir, txn_id)
-        nft_names = self.__generate_nft_names_from(nft_metadata_file)
+        num_mints = len(vend_req.nft_names)
+        vend_req.num_mints = num_mints
+        vend_req.gross_profit = num_mints * self.mint.price
+        vend_req.change = vend_req.lovelace - vend_req.gross_profit
+        print(f"Beginning to mint {num_mints} NFTs to send to address {vend_req.input_addr}")
 
-        total_name_chars = sum([len(name) for name in self.__get_nft_names_from(nft_metadata_file)])
-        user_rebate = Mint.RebateCalculator.calculate_rebate_for(NftVendingMachine.__SINGLE_POLICY, num_mints, total_name_chars) if self.mint.price else 0
-        net_profit = gross_profit - self.mint.donation - user_rebate
-        print(f"Minimum rebate to user is {user_rebate}, net profit to vault is {net_profit}")
+        total_name_chars = sum([len(name) for name in vend_req.bundle.asset_names])
+        vend_req.user_rebate = Mint.RebateCalculator.calculate_rebate_for(NftVendingMachine.__SINGLE_POLICY, num_mints, total_name_chars) if self.mint.price else 0
+        vend_req.net_profit = vend_req.gross_profit - self.mint.donation - vend_req.user_rebate
+        print(f"Minimum rebate to user is {vend_req.user_rebate}, net profit to vault is {vend_req.net_profit}")
+        self.__journal(vend_req.utxo, VendJournal.RESERVED, durable=True, txn_id=vend_req.txn_id, locked_files=vend_req.locked_files)
+        for locked_file in vend_req.locked_files:
+            self.mint.inventory.move_out(os.path.basename(locked_file), locked_file)
 
-        tx_ins = [f"--tx-in {mint_req.hash}#{mint_req.ix}"]
-        tx_outs = self.__get_tx_out_args(input_addr, user_rebate + change, nft_names, net_profit, self.mint.donation)
-        mint_build_tmp = self.cardano_cli.build_raw_mint_txn(output_dir, txn_id, tx_ins, tx_outs, 0, nft_metadata_file, self.mint, nft_names)
+    def __build_and_sign(self, batch, output_dir):
+        batch.output_dir = output_dir
+        output_dir = self.__cli_dir(output_dir)
+        vend_reqs = batch.vend_reqs
+        txn_id = batch.txn_id
+        nft_names = batch.nft_names
+        changes = [vend_req.user_rebate + vend_req.change for vend_req in vend_reqs]
+        gross_profit = sum([vend_req.gross_profit for vend_req in vend_reqs])
+        user_rebates = sum([vend_req.user_rebate for vend_req in vend_reqs])
+        net_profit = gross_profit - self.mint.donation - user_rebates
 
+        tx_ins = [f"--tx-in {vend_req.utxo.hash}#{vend_req.utxo.ix}" for vend_req in vend_reqs]
+        tx_outs = self.__get_tx_out_args(self.__buyer_outputs(vend_reqs, changes), net_profit, self.mint.donation)
         tx_in_count = len(tx_ins)
         tx_out_count = len([tx_out for tx_out in tx_outs if tx_out])
         signers = [self.payment_sign_key]
-        if num_mints:
+        if batch.num_mints:
             signers.append(self.mint.sign_key)
-        fee = self.cardano_cli.calculate_min_fee(mint_build_tmp, tx_in_count, tx_out_count, len(signers))
+
+        expiry_slot = self.leases.expiry_for(self.__tip_slot, self.mint.expiration_slot) if self.leases is not None else None
+        mint_build_tmp = self.cardano_cli.build_raw_mint_txn(output_dir, txn_id, tx_ins, tx_outs, 0, batch.metadata_file, self.mint, nft_names, invalid_hereafter=expiry_slot)
+        fee_key = self.fee_cache.key_for(tx_in_count, tx_out_count, len(signers), CardanoCli.tx_body_size(mint_build_tmp)) if self.fee_cache else None
+        fee = self.fee_cache.get(fee_key) if fee_key else None
+        batch.fee_key = fee_key
+        batch.fee_cached = fee is not None
+        if fee is None:
+            fee = self.cardano_cli.calculate_min_fee(mint_build_tmp, tx_in_count, tx_out_count, len(signers))
+            if fee_key:
+                self.fee_cache.put(fee_key, fee)
 
         if net_profit:
             net_profit = net_profit - fee
         else:
-            change = change - fee
+            fee_share, fee_remainder = divmod(fee, len(vend_reqs))
+            changes = [change - fee_share for change in changes]
+            changes[0] -= fee_remainder
+
+        for vend_req, change in zip(vend_reqs, changes):
+            if change and change < Utxo.MIN_UTXO_VALUE:
+                raise BadUtxoError(vend_req.utxo, f"UTxO left change of {change}, causing a minUTxO error")
+        if net_profit and (net_profit < Utxo.MIN_UTXO_VALUE):
+            raise BadUtxoError(vend_reqs[0].utxo, f"Batch of {len(vend_reqs)} UTxOs left net_profit of {net_profit}, causing a minUTxO error")
+
+        tx_outs = self.__get_tx_out_args(self.__buyer_outputs(vend_reqs, changes), net_profit, self.mint.donation)
+        mint_build = self.cardano_cli.build_raw_mint_txn(output_dir, txn_id, tx_ins, tx_outs, fee, batch.metadata_file, self.mint, nft_names, invalid_hereafter=expiry_slot)
+        batch.fee = fee
+        batch.signed_file = self.cardano_cli.sign_txn(signers, mint_build)
+        if self.leases is not None:
+            for vend_req in vend_reqs:
+                self.leases.lease(vend_req.utxo, vend_req.locked_files, expiry_slot, vend_req.utxo_outputs, vend_req.num_mints)
+
+    def __buyer_outputs(self, vend_reqs, changes):
+        return [(vend_req.input_addr, change, vend_req.nft_names) for vend_req, change in zip(vend_reqs, changes)]
+
+    def __complete(self, batch):
+        """
+        Durably record the signed txn (with what its whitelist consumption
+        needs) before consuming the whitelist, and the consumption before the
+        irreversible submission, so that recovery can redo either step.  The
+        journal points at a durable copy of the signed txn when it was written
+        to a (possibly RAM-backed) artifact hot dir.
+        """
+        last_idx = len(batch.vend_reqs) - 1
+        signed_file = self.artifact_store.persist(batch.signed_file) if self.artifact_store else batch.signed_file
+        for idx, vend_req in enumerate(batch.vend_reqs):
+            self.__journal(vend_req.utxo, VendJournal.BUILT, durable=(idx == last_idx), signed_file=signed_file, utxo_outputs=vend_req.utxo_outputs, num_mints=vend_req.num_mints)
+        with self.whitelist_claims.lock:
+            for vend_req in batch.vend_reqs:
+                self.mint.whitelist.consume(vend_req.utxo_outputs, vend_req.num_mints)
+        for idx, vend_req in enumerate(batch.vend_reqs):
+            self.__journal(vend_req.utxo, VendJournal.BUILT, durable=(idx == last_idx), wl_consumed=True)
+        tx_hash = self.__submit_signed(batch)
+        for vend_req in batch.vend_reqs:
+            self.__journal(vend_req.utxo, VendJournal.SUBMITTED, tx_hash=tx_hash)
+            if self.leases is not None:
+                self.leases.bind(vend_req.utxo, tx_hash)
+
+    def __is_fee_too_small(e):
+        response = getattr(e, 'response', None)
+        return NftVendingMachine.__FEE_TOO_SMALL in f"{e} {response.text if response is not None else ''}"
+
+    def __submit_signed(self, batch):
+        """
+        Submit the signed txn, rebuilding it once with a freshly calculated fee
+        if the node rejected a cached fee as too small (the txn never landed,
+        so it is safe to replace).
+
+        :return: Hash of the submitted txn
+        """
+        try:
+            return self.blockfrost_api.submit_txn(batch.signed_file)
+        except Exception as e:
+            if not (batch.fee_cached and NftVendingMachine.__is_fee_too_small(e)):
+                raise
+        print(f"WARNING: Cached fee {batch.fee} was rejected as too small for {batch.txn_id}, rebuilding with a calculated fee")
+        self.fee_cache.evict(batch.fee_key)
+        self.__build_and_sign(batch, batch.output_dir)
+        return self.blockfrost_api.submit_txn(batch.signed_file)
+
+    def __release(self, vend_req):
+        if self.leases is not None:
+            self.leases.release(vend_req.utxo)
+        self.__release_files(vend_req.locked_files)
+        vend_req.locked_files = []
+
+    def __release_files(self, locked_files):
+        for locked_file in locked_files:
+            self.mint.inventory.move_in(os.path.basename(locked_file), locked_file)
+
+    def __retire_artifacts(self, vend_req):
+        if self.artifact_store and vend_req.txn_id:
+            self.artifact_store.complete(vend_req.txn_id)
+
+    def __retire_batch(self, batch):
+        for vend_req in batch.vend_reqs:
+            self.__retire_artifacts(vend_req)
+        if self.artifact_store and len(batch.vend_reqs) > 1:
+            self.artifact_store.complete(batch.txn_id)
+
+    def __do_vend(self, mint_req, output_dir, locked_subdir, metadata_subdir, exclusions, vend_req=None):
+        stage_start = time.perf_counter()
+        if not vend_req:
+            vend_req = self.__check_payment(mint_req)
+        try:
+            try:
+                if not vend_req.input_addr:
+                    self.__lookup_sender(vend_req)
+                stage_start = self.__stage_done('lookup', stage_start)
+                if not self.__claim(vend_req):
+                    exclusions.discard(mint_req)
+                    return
+                self.__reserve(vend_req, output_dir, locked_subdir)
+                batch = self.__batch_of([vend_req], output_dir, metadata_subdir)
+                stage_start = self.__stage_done('reserve', stage_start)
+                self.__build_and_sign(batch, output_dir)
+                stage_start = self.__stage_done('build', stage_start)
+            except Exception as e:
+                self.__fail(mint_req, e, exclusions, vend_req=vend_req)
+                return
+            self.__submit(batch, exclusions)
+            self.__stage_done('submit', stage_start)
+        finally:
+            self.__retire_artifacts(vend_req)
+
+    def __stage_done(self, stage, stage_start):
+        """
+        :return: When the stage finished, i.e., when the next one starts
+        """
+        stage_end = time.perf_counter()
+        self.stage_profiler.record(stage, stage_end - stage_start, 0, False)
+        return stage_end
+
+    def __submit(self, batch, exclusions):
+        try:
+            self.__complete(batch)
+        except Exception as e:
+            for vend_req in batch.vend_reqs:
+                self.__fail(vend_req.utxo, e, exclusions, submitted=True)
+            return
+        finally:
+            for vend_req in batch.vend_reqs:
+                self.__release_claims(vend_req)
+        for vend_req in batch.vend_reqs:
+            self.retry_scheduler.succeeded(vend_req.utxo)
+
+    def __claim(self, vend_req):
+        wl_units = NftVendingMachine.__whitelist_units(vend_req.utxo_outputs)
+        if not self.whitelist_claims.claim(wl_units):
+            print(f"Deferring {vend_req.utxo} to the next cycle, its assets overlap an in-flight request")
+            self.__backlog = True
+            return False
+        vend_req.wl_units = wl_units
+        return True
+
+    def __release_claims(self, vend_req):
+        self.whitelist_claims.release(vend_req.wl_units)
+        vend_req.wl_units = set()
+
+    def __fail(self, mint_req, e, exclusions, vend_req=None, submitted=False):
+        """
+        Failures before the whitelist is consumed put any reserved NFTs back
+        and, unless the UTxO itself is bad, schedule a retry with backoff.
+        Failures at submit time (the txn may already be on chain) and bad
+        UTxOs go to the dead-letter list for manual review instead, bad UTxOs
+        are also queued with the ``refund_engine`` (if any) and NFTs leased to
+        a submit-time failure return once the lease expires.
+        """
+        if vend_req and not submitted:
+            self.__release(vend_req)
+            self.__release_claims(vend_req)
+        retry_in = self.retry_scheduler.failed(mint_req, e, retryable=not (submitted or isinstance(e, BadUtxoError)))
+        if isinstance(e, BadUtxoError) and self.refund_engine and not submitted:
+            print(f"UNRECOVERABLE UTXO ERROR\n{e.utxo}\n^--- QUEUED FOR REFUND")
+            self.refund_engine.enqueue(mint_req, str(e), sender=vend_req.input_addr if vend_req else None)
+        elif isinstance(e, BadUtxoError):
+            print(f"UNRECOVERABLE UTXO ERROR\n{e.utxo}\n^--- REQUIRES INVESTIGATION")
+        elif retry_in is None:
+            print(f"WARNING: Uncaught exception for {mint_req}, moved to dead letters (RETRY WILL NOT BE ATTEMPTED)")
+        else:
+            exclusions.discard(mint_req)
+            print(f"WARNING: Uncaught exception for {mint_req}, retrying in {retry_in}s")
+        self.__journal(mint_req, VendJournal.FAILED if retry_in is None else VendJournal.ROLLED_BACK, error=repr(e))
+        print(traceback.format_exc())
+
+    def recover(self, exclusions):
+        """
+        Resume or roll back the vends left in flight by a previous run, based
+        on the replayed journal.  Vends that never reached ``built`` have their
+        NFTs put back into the inventory (their whitelist was not consumed
+        yet); ``built`` vends have their whitelist consumption redone unless
+        it was recorded and are resubmitted (a signed txn can only ever be
+        accepted once), or rolled back if their signed txn was lost (see
+        ``__recover_lost``); vends whose payment UTxO has been spent are
+        confirmed and anything else stays excluded.
+
+        :param exclusions: Set of UTxOs to populate with vends that must not
+            be processed again
+        """
+        if not self.journal:
+            return
+        unspent = set(self.blockfrost_api.get_utxos(self.payment_addr, set()))
+        for utxo, entry in self.__journaled(VendJournal.RECEIVED, VendJournal.RESERVED):
+            if self.leases is not None:
+                self.leases.release(utxo)
+            self.__release_files(entry.get('locked_files', []))
+            self.__journal(utxo, VendJournal.ROLLED_BACK)
+            print(f"Rolled back in-flight vend for {utxo}")
+        for utxo, entry in self.__journaled(VendJournal.FAILED):
+            exclusions.add(utxo)
+        self.__confirm_spent(unspent)
+        resubmitted = {}
+        for utxo, entry in self.__journaled(VendJournal.BUILT, VendJournal.SUBMITTED):
+            exclusions.add(utxo)
+            if entry['state'] == VendJournal.SUBMITTED:
+                continue
+            if not os.path.exists(entry['signed_file']):
+                self.__recover_lost(utxo, entry, exclusions)
+                continue
+            if 'utxo_outputs' in entry and not entry.get('wl_consumed'):
+                with self.whitelist_claims.lock:
+                    self.mint.whitelist.consume(entry['utxo_outputs'], entry['num_mints'])
+                self.__journal(utxo, VendJournal.BUILT, durable=True, wl_consumed=True)
+            signed_file = entry['signed_file']
+            if not signed_file in resubmitted:
+                try:
+                    resubmitted[signed_file] = self.blockfrost_api.submit_txn(signed_file)
+                except Exception as e:
+                    resubmitted[signed_file] = None
+                    print(f"WARNING: Could not resubmit {signed_file} for {utxo}, leaving it excluded (REQUIRES INVESTIGATION)")
+                    print(traceback.format_exc())
+            if resubmitted[signed_file]:
+                self.__journal(utxo, VendJournal.SUBMITTED, tx_hash=resubmitted[signed_file])
+        self.journal.sync()
+
+    def __recover_lost(self, utxo, entry, exclusions):
+        """
+        Handle a ``built`` vend whose payment is still unspent but whose signed
+        txn is gone (so it can neither be resubmitted nor shown unsubmitted).
+        A leased vend stays excluded until its lease expires (its txn can no
+        longer land by then), any other vend is rolled back and vended again.
+        """
+        print(f"WARNING: Signed txn {entry['signed_file']} for {utxo} is missing and its payment is unspent")
+        if self.leases is not None and utxo in self.leases:
+            print(f"Leaving {utxo} excluded until its lease expires")
+            return
+        self.__release_files(entry.get('locked_files', []))
+        if entry.get('wl_consumed'):
+            with self.whitelist_claims.lock:
+                self.mint.whitelist.restore(entry['utxo_outputs'], entry['num_mints'])
+        self.__journal(utxo, VendJournal.ROLLED_BACK, error='signed txn lost')
+        exclusions.discard(utxo)
+        print(f"Rolled back {utxo} to vend it again")
+
+    def __settle_leases(self, unspent, exclusions):
+        committed, expired = self.leases.settle(unspent, self.__tip_slot)
+        for utxo, lease in committed:
+            self.mint.inventory.commit([os.path.basename(locked_file) for locked_file in lease['locked_files']])
+        for utxo, lease in expired:
+            print(f"Lease on {len(lease['locked_files'])} NFT(s) for {utxo} expired unconfirmed at slot {lease['expiry_slot']}, returning them and vending the payment again")
+            self.__release_files(lease['locked_files'])
+            with self.whitelist_claims.lock:
+                self.mint.whitelist.restore(lease.get('utxo_outputs', []), lease.get('num_mints', 0))
+            self.__journal(utxo, VendJournal.ROLLED_BACK, error='lease expired')
+            exclusions.discard(utxo)
 
-        final_change = user_rebate + change
-        if (final_change and (final_change < Utxo.MIN_UTXO_VALUE)) or (net_profit and (net_profit < Utxo.MIN_UTXO_VALUE)):
-            raise BadUtxoError(mint_req, f"UTxO left change of {change}, and net_profit of {net_profit}, causing a minUTxO error")
+    def __confirm_spent(self, unspent):
+        for utxo, entry in self.__journaled(VendJournal.BUILT, VendJournal.SUBMITTED):
+            if not utxo in unspent:
+                self.__journal(utxo, VendJournal.CONFIRMED)
+                self.mint.inventory.commit([os.path.basename(locked_file) for locked_file in entry.get('locked_files', [])])
 
-        tx_outs = self.__get_tx_out_args(input_addr, final_change, nft_names, net_profit, self.mint.donation)
-        mint_build = self.cardano_cli.build_raw_mint_txn(output_dir, txn_id, tx_ins, tx_outs, fee, nft_metadata_file, self.mint, nft_names)
-        mint_signed = self.cardano_cli.sign_txn(signers, mint_build)
-        self.mint.whitelist.consume(utxo_outputs, num_mints)
-        self.blockfrost_api.submit_txn(mint_signed)
+    def __whitelist_units(utxo_outputs):
+        units = set()
+        for utxo_output in utxo_outputs:
+            for utxo_amount in utxo_output['amount']:
+                if utxo_amount['unit'] != Utxo.Balance.LOVELACE_POLICY:
+                    units.add(utxo_amount['unit'])
+        return units
+
+    def __pipeline_for(self, output_dir, locked_subdir, metadata_subdir, exclusions):
+        """
+        ingest -> chain lookup -> inventory reservation -> build/sign -> submit
+
+        Lookups and submits run on their own worker pools and builds on the
+        cardano-cli pool (shared by every machine using the same
+        ``CardanoCli``) while reservation stays on a single worker so nothing
+        is double-vended, and whitelist consumption is serialized under a lock
+        at submit time.
+        """
+        pending = []
+
+        def lookup(item, emit):
+            mint_req = item.utxo if isinstance(item, VendRequest) else item
+            try:
+                vend_req = item if isinstance(item, VendRequest) else self.__check_payment(mint_req)
+                if not vend_req.input_addr:
+                    self.__lookup_sender(vend_req)
+                emit(vend_req)
+            except Exception as e:
+                exclusions.add(mint_req)
+                self.__fail(mint_req, e, exclusions)
+
+        def reserve(vend_req, emit):
+            mint_req = vend_req.utxo
+            try:
+                if not self.__claim(vend_req):
+                    return
+                exclusions.add(mint_req)
+                self.__reserve(vend_req, output_dir, locked_subdir)
+            except Exception as e:
+                self.__fail(mint_req, e, exclusions, vend_req=vend_req)
+                self.__retire_artifacts(vend_req)
+                return
+            if pending and (len(pending) >= self.batch_buyers_max or not self.__batch_fits(pending + [vend_req])):
+                flush_batch(emit)
+            pending.append(vend_req)
+
+        def flush_batch(emit):
+            if pending:
+                emit(self.__batch_of(list(pending), output_dir, metadata_subdir))
+                pending.clear()
+
+        def build(batch, emit):
+            try:
+                self.__build_on_cli_pool(batch, output_dir)
+            except Exception as e:
+                self.__unbatch(batch, output_dir, metadata_subdir, exclusions, e)
+                self.__retire_batch(batch)
+                return
+            emit(batch)
+
+        def submit(batch, emit):
+            try:
+                self.__submit(batch, exclusions)
+            finally:
+                self.__retire_batch(batch)
+
+        return Pipeline([
+            Pipeline.Stage('lookup', lookup, workers=self.lookup_workers),
+            Pipeline.Stage('reserve', reserve, flush=flush_batch),
+            Pipeline.Stage('build', build, workers=self.cardano_cli.max_workers),
+            Pipeline.Stage('submit', submit, workers=self.submit_workers)
+        ], profiler=self.stage_profiler)
+
+    def __build_on_cli_pool(self, batch, output_dir):
+        """
+        Build and sign on the cardano-cli worker pool, which bounds the CLI
+        work in flight across machines to ``max_workers``.
+        """
+        return self.cardano_cli.submit(self.__build_and_sign, batch, output_dir).result()
+
+    def __unbatch(self, batch, output_dir, metadata_subdir, exclusions, e):
+        """
+        A batch that could not be built (e.g., one buyer's change falls below
+        minUTxO) is retried one buyer per transaction so the failure stays
+        with the offending UTxO.
+        """
+        if len(batch.vend_reqs) == 1:
+            self.__fail(batch.vend_reqs[0].utxo, e, exclusions, vend_req=batch.vend_reqs[0])
+            return
+        print(f"WARNING: Could not build batch of {len(batch.vend_reqs)} requests ({e}), vending each separately")
+        for vend_req in batch.vend_reqs:
+            try:
+                single = self.__batch_of([vend_req], output_dir, metadata_subdir)
+                self.__build_on_cli_pool(single, output_dir)
+            except Exception as e:
+                self.__fail(vend_req.utxo, e, exclusions, vend_req=vend_req)
+                continue
+            self.__submit(single, exclusions)
+
+    def __schedule_fairly(self, mint_reqs, exclusions):
+        """
+        Look up the sender and chain position of every listed mint request
+        (reusing lookups of requests deferred last cycle) and let the fair
+        scheduler pick this cycle's requests, each sender's in chain order.
+        Deferred requests are not excluded, so they are listed (and
+        scheduled) again next cycle.
+
+        :return: Scheduled ``VendRequest`` objects, in the order to vend them
+        """
+        vend_reqs = []
+        for mint_req in mint_reqs:
+            vend_req = self.__deferred.get(mint_req)
+            if not vend_req:
+                try:
+                    vend_req = self.__check_payment(mint_req)
+                    self.__lookup_sender(vend_req)
+                    self.__lookup_chain_position(vend_req)
+                except Exception as e:
+                    exclusions.add(mint_req)
+                    self.__fail(mint_req, e, exclusions)
+                    continue
+            vend_reqs.append(vend_req)
+        scheduled, deferred = self.fair_scheduler.order(vend_reqs, lambda vend_req: vend_req.input_addr, position_of=lambda vend_req: vend_req.chain_position)
+        if deferred:
+            print(f"Deferring {len(deferred)} request(s) to the next cycle, their senders reached the per-address cap")
+            self.__backlog = True
+        self.__deferred = {vend_req.utxo: vend_req for vend_req in deferred}
+        return scheduled
+
+    def __is_pipelined(self):
+        return max(self.cardano_cli.max_workers, self.batch_buyers_max, self.lookup_workers, self.submit_workers) > 1
+
+    def has_backlog(self):
+        """
+        :return: Whether the last ``vend`` left mint requests for the next
+            cycle (``vends_per_cycle`` was reached or requests were deferred)
+        """
+        return self.__backlog
 
     def vend(self, output_dir, locked_subdir, metadata_subdir, exclusions):
+        """
+        :return: Number of mint requests picked up during this cycle
+        """
         if not self.__is_validated:
             raise ValueError('Attempting to vend from non-validated vending machine')
-        mint_reqs = self.blockfrost_api.get_utxos(self.payment_addr, exclusions)
-        for mint_req in mint_reqs:
+        prunable = isinstance(exclusions, ExclusionTracker)
+        if self.leases is not None:
+            self.__tip_slot = self.blockfrost_api.get_latest_slot()
+        if self.journal or prunable or self.leases is not None:
+            unspent = self.blockfrost_api.get_utxos(self.payment_addr, set())
+            if self.journal:
+                self.__confirm_spent(set(unspent))
+            if self.leases is not None:
+                self.__settle_leases(unspent, exclusions)
+            if prunable and exclusions.prune(unspent):
+                print(f"Pruned spent UTxOs from exclusions: {exclusions.stats()}")
+            listed = [utxo for utxo in unspent if not utxo in exclusions]
+        else:
+            listed = self.blockfrost_api.get_utxos(self.payment_addr, exclusions)
+        mint_reqs = [mint_req for mint_req in listed if self.retry_scheduler.is_due(mint_req)]
+        self.__backlog = False
+        if self.fair_scheduler:
+            mint_reqs = self.__schedule_fairly(mint_reqs, exclusions)
+        if self.vends_per_cycle and len(mint_reqs) > self.vends_per_cycle:
+            self.__backlog = True
+            self.__deferred.update({item.utxo: item for item in mint_reqs[self.vends_per_cycle:] if isinstance(item, VendRequest)})
+            mint_reqs = mint_reqs[:self.vends_per_cycle]
+        if self.__is_pipelined():
+            self.__pipeline_for(output_dir, locked_subdir, metadata_subdir, exclusions).run(mint_reqs)
+        else:
+            self.__vend_serially(mint_reqs, output_dir, locked_subdir, metadata_subdir, exclusions)
+        if self.refund_engine:
+            try:
+                self.refund_engine.refund(output_dir)
+            except Exception as e:
+                print(f"WARNING: Refunds failed, retrying next cycle: {e}")
+        return len(mint_reqs)
+
+    def __vend_serially(self, mint_reqs, output_dir, locked_subdir, metadata_subdir, exclusions):
+        for item in mint_reqs:
+            vend_req = item if isinstance(item, VendRequest) else None
+            mint_req = vend_req.utxo if vend_req else item
             exclusions.add(mint_req)
             try:
-                self.__do_vend(mint_req, output_dir, locked_subdir, metadata_subdir)
-            except BadUtxoError as e:
-                print(f"UNRECOVERABLE UTXO ERROR\n{e.utxo}\n^--- REQUIRES INVESTIGATION")
-                print(traceback.format_exc())
+                self.__do_vend(mint_req, output_dir, locked_subdir, metadata_subdir, exclusions, vend_req=vend_req)
             except Exception as e:
-                print(f"WARNING: Uncaught exception for {mint_req}, added to exclusions (RETRY WILL NOT BE ATTEMPTED)")
-                print(traceback.format_exc())
-                time.sleep(NftVendingMachine.__ERROR_WAIT)
+                self.__fail(mint_req, e, exclusions)
+
+    def cli_stats(self):
+        """
+        :return: Per-subcommand cardano-cli profile (see
+            ``CardanoCli.Profiler.snapshot``) gathered since startup
+        """
+        return self.cardano_cli.profiler.snapshot()
+
+    def stage_stats(self):
+        """
+        :return: Per-stage (lookup, reserve, build, submit) vend latency, in
+            the ``CardanoCli.Profiler.snapshot`` format, gathered since startup
+        """
+        return self.stage_profiler.snapshot()
 
-    def validate(self):
+    def validate(self, validate_mint=True):
+        """
+        :param validate_mint: Whether to (re)validate the mint, machines
+            sharing an already-validated ``Mint`` pass False
+        """
         if self.payment_addr == self.profit_addr:
             raise ValueError(f"Payment address and profit address ({self.payment_addr}) cannot be the same!")
-        self.mint.validate()
+        if validate_mint:
+            self.mint.validate()
+        if self.max_tx_size:
+            self.txn_size_estimator = TxnSizeEstimator(self.max_tx_size, self.mint.script)
         self.max_rebate = self.__max_rebate_for(self.mint.validated_names)
         if self.mint.price and self.mint.price < (self.max_rebate + self.mint.donation + Utxo.MIN_UTXO_VALUE):
             raise ValueError(f"Price of {self.mint.price} with donation of {self.mint.donation} could lead to a minUTxO error due to rebates")
@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+import traceback
+
+"""
+A chain of stages joined by bounded queues, each stage served by its own pool
+of worker threads so that I/O-bound stages overlap.  A stage function is
+called as ``func(item, emit)`` and passes zero or more results downstream
+through ``emit`` (which blocks while the next queue is full).  A stage's
+optional ``flush(emit)`` is called once, after its last item, which lets a
+single-worker stage hold items back (e.g., to pack batches).
+
+Stage functions are expected to handle their own errors; anything that
+escapes is printed and recorded in ``errors`` without stopping the pipeline.
+Given a ``profiler`` (e.g., a ``CardanoCli.Profiler``), every stage call is
+timed under the stage's name, including any wait for room downstream.
+"""
+class Pipeline(object):
+
+    _DEFAULT_QUEUE_SIZE = 64
+    __DONE = object()
+
+    """
+    One step of the pipeline.
+    """
+    class Stage(object):
+
+        def __init__(self, name, func, workers=1, flush=None):
+            if workers < 1:
+                raise ValueError(f"Stage '{name}' needs at least one worker, found {workers}")
+            self.name = name
+            self.func = func
+            self.workers = workers
+            self.flush = flush
+
+    def __init__(self, stages, queue_size=_DEFAULT_QUEUE_SIZE, profiler=None):
+        if not stages:
+            raise ValueError('Pipeline requires at least one stage')
+        self.stages = stages
+        self.queue_size = queue_size
+        self.profiler = profiler
+        self.errors = []
+        self.__errors_lock = threading.Lock()
+
+    def __record(self, stage, e):
+        print(f"WARNING: Uncaught exception in pipeline stage '{stage.name}'")
+        print(traceback.format_exc())
+        with self.__errors_lock:
+            self.errors.append((stage.name, e))
+
+    def __emitter(self, downstream):
+        if downstream is None:
+            return lambda item: None
+        return downstream.put
+
+    def __work(self, stage, inbox, downstream, next_workers, remaining, remaining_lock):
+        emit = self.__emitter(downstream)
+        while True:
+            item = inbox.get()
+            if item is Pipeline.__DONE:
+                break
+            start = time.perf_counter()
+            failed = False
+            try:
+                stage.func(item, emit)
+            except Exception as e:
+                failed = True
+                self.__record(stage, e)
+            if self.profiler:
+                self.profiler.record(stage.name, time.perf_counter() - start, 0, failed)
+        with remaining_lock:
+            remaining[0] -= 1
+            is_last = not remaining[0]
+        if not is_last:
+            return
+        if stage.flush:
+            try:
+                stage.flush(emit)
+            except Exception as e:
+                self.__record(stage, e)
+        if downstream is not None:
+            for i in range(next_workers):
+                downstream.put(Pipeline.__DONE)
+
+    def run(self, items):
+        """
+        Feed ``items`` through every stage and block until all of them have
+        drained out of the last one.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for stage in self.stages]
+        threads = []
+        for idx, stage in enumerate(self.stages):
+            downstream = queues[idx + 1] if idx + 1 < len(self.stages) else None
+            next_workers = self.stages[idx + 1].workers if downstream is not None else 0
+            remaining = [stage.workers]
+            remaining_lock = threading.Lock()
+            for i in range(stage.workers):
+                thread = threading.Thread(
+                    target=self.__work,
+                    args=(stage, queues[idx], downstream, next_workers, remaining, remaining_lock),
+                    name=f"pipeline-{stage.name}-{i}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+        for item in items:
+            queues[0].put(item)
+        for i in range(self.stages[0].workers):
+            queues[0].put(Pipeline.__DONE)
+        for thread in threads:
+            thread.join()
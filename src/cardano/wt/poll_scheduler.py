@@ -0,0 +1,39 @@
+"""
+Picks how long the run loop waits before polling for payments again: no wait
+while the vending machine has a backlog, the minimum wait right after any
+payment was processed, and a gradually growing wait (up to a ceiling) while
+the payment address stays idle.
+"""
+class PollScheduler(object):
+
+    _BACKOFF_FACTOR = 1.5
+    _MAX_WAIT = 120
+    _MIN_WAIT = 5
+
+    def __init__(self, min_wait=_MIN_WAIT, max_wait=_MAX_WAIT, backoff_factor=_BACKOFF_FACTOR):
+        if min_wait <= 0:
+            raise ValueError(f"Minimum poll wait must be positive, found {min_wait}")
+        if max_wait < min_wait:
+            raise ValueError(f"Maximum poll wait {max_wait} is below the minimum of {min_wait}")
+        if backoff_factor < 1:
+            raise ValueError(f"Poll backoff factor must be at least 1, found {backoff_factor}")
+        self.min_wait = min_wait
+        self.max_wait = max_wait
+        self.backoff_factor = backoff_factor
+        self.__idle_wait = min_wait
+
+    def next_wait(self, processed, backlog):
+        """
+        :param processed: Number of mint requests the last cycle picked up
+        :param backlog: Whether the last cycle left requests unprocessed
+        :return: Seconds to wait before the next cycle
+        """
+        if backlog:
+            self.__idle_wait = self.min_wait
+            return 0
+        if processed:
+            self.__idle_wait = self.min_wait
+            return self.min_wait
+        wait = self.__idle_wait
+        self.__idle_wait = min(self.max_wait, self.__idle_wait * self.backoff_factor)
+        return wait
@@ -0,0 +1,201 @@
+import time
+
+from cardano.wt.artifact_store import next_artifact_id
+from cardano.wt.journal import VendJournal
+from cardano.wt.mint import Mint
+from cardano.wt.utxo import Utxo
+
+"""
+Returns rejected payments (those that raised ``BadUtxoError``) to their
+senders in batched multi-input, multi-output transactions instead of leaving
+them excluded at the payment address.  Each sender gets a single output per
+batch carrying back every lovelace and native token they sent, less their
+share of the fee:
+
+* ``split``: the fee is divided evenly across the senders in the batch
+* ``proportional``: each sender pays in proportion to the lovelace refunded
+
+Senders whose refund would fall under the minUTxO are abandoned (they stay
+excluded for manual review).  Progress is recorded in a ``VendJournal``
+(queued refunds use the ``received`` state) so refunds survive restarts and
+a UTxO is only ever refunded once.
+"""
+class RefundEngine(object):
+
+    FEE_SPLIT = 'split'
+    FEE_PROPORTIONAL = 'proportional'
+
+    FEE_POLICIES = [FEE_SPLIT, FEE_PROPORTIONAL]
+
+    _BATCH_MAX = 20
+    _MAX_WAIT = 300
+    _RESUBMIT_AFTER = 900
+
+    __PENDING = [VendJournal.RECEIVED, VendJournal.BUILT, VendJournal.SUBMITTED]
+
+    def __init__(self, payment_addr, payment_sign_key, blockfrost_api, cardano_cli, journal, fee_policy=FEE_SPLIT, batch_max=_BATCH_MAX, max_wait=_MAX_WAIT, resubmit_after=_RESUBMIT_AFTER, clock=time.time):
+        """
+        :param journal: A replayed ``VendJournal`` dedicated to refunds
+        :param batch_max: Most rejected UTxOs refunded in one transaction
+        :param max_wait: Seconds the oldest queued refund waits for the batch
+            to fill up before it is sent anyway
+        :param resubmit_after: Seconds after which a submitted refund whose
+            UTxOs are still unspent is sent again
+        """
+        if not fee_policy in RefundEngine.FEE_POLICIES:
+            raise ValueError(f"Unknown refund fee policy '{fee_policy}', expected one of {RefundEngine.FEE_POLICIES}")
+        if batch_max < 1:
+            raise ValueError(f"Refund batches need room for at least 1 UTxO, found {batch_max}")
+        self.payment_addr = payment_addr
+        self.payment_sign_key = payment_sign_key
+        self.blockfrost_api = blockfrost_api
+        self.cardano_cli = cardano_cli
+        self.journal = journal
+        self.fee_policy = fee_policy
+        self.batch_max = batch_max
+        self.max_wait = max_wait
+        self.resubmit_after = resubmit_after
+        self.__clock = clock
+
+    def enqueue(self, utxo, reason, sender=None):
+        """
+        Queue a rejected payment UTxO for refund (a no-op if it already was).
+
+        :param sender: Address that sent the payment, if already known
+        """
+        if self.journal.state_of(utxo):
+            return
+        self.journal.record(utxo, VendJournal.RECEIVED, durable=True, reason=reason, sender=sender, queued_at=self.__clock())
+
+    def pending(self):
+        return len(self.journal.in_states(*RefundEngine.__PENDING))
+
+    def __sender_of(self, utxo, entry):
+        if entry.get('sender'):
+            return entry['sender']
+        utxo_inputs = self.blockfrost_api.get_tx_utxos(utxo.hash)['inputs']
+        input_addrs = set([utxo_input['address'] for utxo_input in utxo_inputs if not utxo_input['reference']])
+        return input_addrs.pop() if len(input_addrs) == 1 else None
+
+    def __asset_arg(balance):
+        unit = balance.policy
+        asset = f"{unit[:Mint._POLICY_LEN]}.{unit[Mint._POLICY_LEN:]}" if len(unit) > Mint._POLICY_LEN else unit
+        return f"{balance.lovelace} {asset}"
+
+    def __min_refund(tokens):
+        if not tokens:
+            return Utxo.MIN_UTXO_VALUE
+        policies = set([balance.policy[:Mint._POLICY_LEN] for balance in tokens])
+        name_chars = sum([(len(balance.policy) - Mint._POLICY_LEN) // 2 for balance in tokens])
+        return max(Utxo.MIN_UTXO_VALUE, Mint.RebateCalculator.calculate_rebate_for(len(policies), len(tokens), name_chars))
+
+    def __refunds_for(self, utxos):
+        """
+        :return: ``{sender: (lovelace, tokens, utxos)}`` with each sender's
+            rejected UTxOs merged into one refund
+        """
+        refunds = {}
+        for utxo, sender in utxos:
+            lovelace, tokens, sender_utxos = refunds.get(sender, (0, [], []))
+            for balance in utxo.balances:
+                if balance.policy == Utxo.Balance.LOVELACE_POLICY:
+                    lovelace += balance.lovelace
+                else:
+                    tokens = tokens + [balance]
+            refunds[sender] = (lovelace, tokens, sender_utxos + [utxo])
+        return refunds
+
+    def __fee_shares(self, fee, refunds):
+        senders = list(refunds.keys())
+        if self.fee_policy == RefundEngine.FEE_PROPORTIONAL:
+            total = sum([refunds[sender][0] for sender in senders])
+            shares = [(fee * refunds[sender][0]) // total for sender in senders]
+        else:
+            shares = [fee // len(senders)] * len(senders)
+        shares[0] += fee - sum(shares)
+        return dict(zip(senders, shares))
+
+    def __tx_out_args(self, refunds, fee):
+        fee_shares = self.__fee_shares(fee, refunds) if fee else {sender: 0 for sender in refunds}
+        tx_outs = []
+        for sender, (lovelace, tokens, utxos) in refunds.items():
+            assets = ''.join([f"+{RefundEngine.__asset_arg(balance)}" for balance in tokens])
+            tx_outs.append(f"--tx-out '{sender}+{lovelace - fee_shares[sender]}{assets}'")
+        return tx_outs, fee_shares
+
+    def __refund_batch(self, output_dir, refunds):
+        """
+        Build, sign and submit one refund txn, dropping senders left under the
+        minUTxO (recomputing the fee each time).
+
+        :return: Number of UTxOs refunded
+        """
+        while refunds:
+            txn_id = f"refund_{next_artifact_id()}"
+            utxos = [utxo for (lovelace, tokens, sender_utxos) in refunds.values() for utxo in sender_utxos]
+            tx_ins = [f"--tx-in {utxo.hash}#{utxo.ix}" for utxo in utxos]
+            tx_outs, fee_shares = self.__tx_out_args(refunds, 0)
+            draft = self.cardano_cli.build_raw_txn(output_dir, txn_id, tx_ins, tx_outs, 0, None, [])
+            fee = self.cardano_cli.calculate_min_fee(draft, len(tx_ins), len(tx_outs), 1)
+            tx_outs, fee_shares = self.__tx_out_args(refunds, fee)
+            dust = [sender for sender, (lovelace, tokens, sender_utxos) in refunds.items() if lovelace - fee_shares[sender] < RefundEngine.__min_refund(tokens)]
+            if dust:
+                for sender in dust:
+                    for utxo in refunds.pop(sender)[2]:
+                        print(f"WARNING: Refund of {utxo} to {sender} would not cover its fee share and minUTxO, abandoning")
+                        self.journal.record(utxo, VendJournal.FAILED, reason='refund below minUTxO')
+                continue
+            build = self.cardano_cli.build_raw_txn(output_dir, txn_id, tx_ins, tx_outs, fee, None, [])
+            signed_file = self.cardano_cli.sign_txn([self.payment_sign_key], build)
+            for idx, utxo in enumerate(utxos):
+                self.journal.record(utxo, VendJournal.BUILT, durable=(idx == len(utxos) - 1), signed_file=signed_file, fee=fee)
+            tx_hash = self.blockfrost_api.submit_txn(signed_file)
+            for utxo in utxos:
+                self.journal.record(utxo, VendJournal.SUBMITTED, tx_hash=tx_hash, submitted_at=self.__clock())
+            print(f"Refunded {len(utxos)} rejected UTxO(s) to {len(refunds)} sender(s) in {tx_hash} for a fee of {fee}")
+            return len(utxos)
+        return 0
+
+    def refund(self, output_dir, force=False):
+        """
+        Settle refunds whose UTxOs were spent, then send queued refunds in
+        batches of up to ``batch_max`` once a batch is full, the oldest has
+        waited ``max_wait`` seconds or ``force`` is set.  Refunds submitted
+        ``resubmit_after`` seconds ago whose UTxOs are still unspent are sent again
+        (only one transaction spending them can ever land).
+
+        :param output_dir: Directory whose ``txn`` subdirectory receives the
+            refund transaction files
+        :return: Number of UTxOs refunded
+        """
+        pending = self.journal.in_states(*RefundEngine.__PENDING)
+        if not pending:
+            return 0
+        unspent = {utxo: utxo for utxo in self.blockfrost_api.get_utxos(self.payment_addr, set())}
+        queued = []
+        for utxo, entry in pending:
+            if not utxo in unspent:
+                self.journal.record(utxo, VendJournal.CONFIRMED)
+            elif entry['state'] != VendJournal.SUBMITTED or self.__clock() - entry['submitted_at'] >= self.resubmit_after:
+                queued.append((unspent[utxo], entry))
+        if not queued:
+            return 0
+        oldest = min([entry['queued_at'] for utxo, entry in queued])
+        if not (force or len(queued) >= self.batch_max or self.__clock() - oldest >= self.max_wait):
+            return 0
+
+        refunded = 0
+        for start in range(0, len(queued), self.batch_max):
+            batch = []
+            for utxo, entry in queued[start:start + self.batch_max]:
+                sender = self.__sender_of(utxo, entry)
+                if not sender:
+                    print(f"WARNING: Could not identify a single sender to refund {utxo}, abandoning")
+                    self.journal.record(utxo, VendJournal.FAILED, reason='no single sender')
+                    continue
+                batch.append((utxo, sender))
+            try:
+                refunded += self.__refund_batch(output_dir, self.__refunds_for(batch))
+            except Exception as e:
+                print(f"WARNING: Refund batch failed, retrying next time: {e}")
+        return refunded
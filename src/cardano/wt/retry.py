@@ -0,0 +1,82 @@
+import json
+import threading
+import time
+
+"""
+Per-UTxO retry bookkeeping for mint requests that failed for a transient
+reason (e.g., a flaky Blockfrost call).  Each failure pushes the UTxO's next
+attempt out with exponential backoff; once ``max_attempts`` is reached, or if
+the failure is not retryable, the UTxO is moved to a dead-letter list for
+manual review.  Healthy requests are never held up by a failing one.
+"""
+class RetryScheduler(object):
+
+    _BASE_DELAY = 15
+    _MAX_ATTEMPTS = 5
+    _MAX_DELAY = 600
+
+    def __init__(self, max_attempts=_MAX_ATTEMPTS, base_delay=_BASE_DELAY, max_delay=_MAX_DELAY, dead_letter_file=None, clock=time.monotonic):
+        if max_attempts < 1:
+            raise ValueError(f"Retry scheduler needs at least one attempt, found {max_attempts}")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.dead_letter_file = dead_letter_file
+        self.dead_letters = []
+        self.__clock = clock
+        self.__attempts = {}
+        self.__next_attempt_at = {}
+        self.__lock = threading.Lock()
+
+    def delay_for(self, attempts):
+        """
+        :param attempts: Number of failed attempts so far (at least 1)
+        :return: Seconds to wait before the next attempt
+        """
+        return min(self.max_delay, self.base_delay * (2 ** (attempts - 1)))
+
+    def is_due(self, utxo):
+        with self.__lock:
+            next_attempt_at = self.__next_attempt_at.get(utxo)
+            return next_attempt_at is None or self.__clock() >= next_attempt_at
+
+    def attempts(self, utxo):
+        with self.__lock:
+            return self.__attempts.get(utxo, 0)
+
+    def waiting(self):
+        """
+        :return: Number of UTxOs waiting for another attempt
+        """
+        with self.__lock:
+            return len(self.__next_attempt_at)
+
+    def succeeded(self, utxo):
+        with self.__lock:
+            self.__attempts.pop(utxo, None)
+            self.__next_attempt_at.pop(utxo, None)
+
+    def failed(self, utxo, error, retryable=True):
+        """
+        Record a failed attempt for ``utxo``.
+
+        :param error: The exception (or message) that caused the failure
+        :param retryable: Whether the request can safely be attempted again
+        :return: Seconds until the next attempt, or None if the UTxO was
+            dead-lettered
+        """
+        with self.__lock:
+            attempts = self.__attempts.get(utxo, 0) + 1
+            if retryable and attempts < self.max_attempts:
+                self.__attempts[utxo] = attempts
+                delay = self.delay_for(attempts)
+                self.__next_attempt_at[utxo] = self.__clock() + delay
+                return delay
+            self.__attempts.pop(utxo, None)
+            self.__next_attempt_at.pop(utxo, None)
+            dead_letter = {'utxo': repr(utxo), 'attempts': attempts, 'error': repr(error)}
+            self.dead_letters.append(dead_letter)
+            if self.dead_letter_file:
+                with open(self.dead_letter_file, 'a') as dead_letter_filehandle:
+                    dead_letter_filehandle.write(f"{json.dumps(dead_letter)}\n")
+            return None
@@ -0,0 +1,246 @@
+import hashlib
+import os
+import random
+import shlex
+import threading
+import time
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.fake_cardano_cli import FakeCardanoCli
+from cardano.wt.utxo import Utxo
+
+"""
+``CardanoCli`` running ``FakeCardanoCli`` in-process instead of spawning a
+subprocess per call, remembering the outputs of every signed transaction so a
+simulation can account for where the lovelace and NFTs went.
+"""
+class InMemoryCardanoCli(CardanoCli):
+
+    CLI_PATH = 'in-memory-cardano-cli'
+
+    def __init__(self, protocol_params=None, max_workers=1, latency=0.0, subcommand_latencies=None):
+        super().__init__(protocol_params=protocol_params, max_workers=max_workers, cli_path=InMemoryCardanoCli.CLI_PATH)
+        self.signed_outputs = {}
+        self.__fake_cli = FakeCardanoCli(latency, subcommand_latencies)
+        self.__built_outputs = {}
+        self.__lock = threading.Lock()
+
+    def __opt_values(argv, opt):
+        return [argv[idx + 1] for idx, token in enumerate(argv[:-1]) if token == opt]
+
+    def _execute(self, cardano_args):
+        argv = shlex.split(cardano_args)
+        try:
+            out = self.__fake_cli.run(argv)
+        except (KeyError, ValueError) as e:
+            print(f"[STDERR] {e}")
+            return ('', 1)
+        with self.__lock:
+            if argv[1] == 'build-raw':
+                out_file = InMemoryCardanoCli.__opt_values(argv, '--out-file')[0]
+                self.__built_outputs[out_file] = InMemoryCardanoCli.__opt_values(argv, '--tx-out')
+            elif argv[1] == 'sign':
+                body_file = InMemoryCardanoCli.__opt_values(argv, '--tx-body-file')[0]
+                signed_file = InMemoryCardanoCli.__opt_values(argv, '--out-file')[0]
+                self.signed_outputs[signed_file] = self.__built_outputs.pop(body_file, [])
+        return (out, 0)
+
+"""
+In-memory chain standing in for ``BlockfrostApi``: payments are added with
+``pay`` (listed oldest first, like Blockfrost) and submitted transactions are
+recorded instead of broadcast.  Every call is timed with a
+``CardanoCli.Profiler`` and can be slowed by an artificial ``latency``.
+"""
+class SimulatedChain(object):
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.utxos = []
+        self.utxo_addrs = {}
+        self.tx_utxos = {}
+        self.txns = {}
+        self.submitted = []
+        self.slot = 0
+        self.profiler = CardanoCli.Profiler()
+        self.__tx_count = 0
+        self.__lock = threading.Lock()
+
+    def __timed(self, name, func):
+        start = time.perf_counter()
+        time.sleep(self.latency)
+        try:
+            result = func()
+        except Exception:
+            self.profiler.record(name, time.perf_counter() - start, 0, True)
+            raise
+        self.profiler.record(name, time.perf_counter() - start, 0, False)
+        return result
+
+    def __next_hash(self):
+        self.__tx_count += 1
+        return hashlib.sha256(self.__tx_count.to_bytes(8, 'big')).hexdigest()
+
+    def pay(self, payment_addr, lovelace, sender, assets=[]):
+        """
+        :param assets: Units (e.g., whitelist assets) the sender holds in the
+            same transaction, returned to the sender in a second output
+        :return: The payment UTxO
+        """
+        with self.__lock:
+            tx_hash = self.__next_hash()
+            utxo = Utxo(tx_hash, 0, [Utxo.Balance(lovelace, Utxo.Balance.LOVELACE_POLICY)])
+            outputs = [{'address': payment_addr, 'amount': [{'unit': Utxo.Balance.LOVELACE_POLICY, 'quantity': str(lovelace)}]}]
+            if assets:
+                asset_amounts = [{'unit': asset, 'quantity': '1'} for asset in assets]
+                outputs.append({'address': sender, 'amount': [{'unit': Utxo.Balance.LOVELACE_POLICY, 'quantity': str(Utxo.MIN_UTXO_VALUE)}] + asset_amounts})
+            self.tx_utxos[tx_hash] = {
+                'inputs': [{'address': sender, 'reference': False, 'amount': [{'unit': Utxo.Balance.LOVELACE_POLICY, 'quantity': str(lovelace)}]}],
+                'outputs': outputs
+            }
+            self.txns[tx_hash] = {'hash': tx_hash, 'block_height': self.__tx_count, 'index': 0}
+            self.utxos.append(utxo)
+            self.utxo_addrs[utxo] = payment_addr
+            return utxo
+
+    def get_utxos(self, address, exclusions):
+        def listed():
+            with self.__lock:
+                return [utxo for utxo in self.utxos if self.utxo_addrs[utxo] == address and not utxo in exclusions]
+        return self.__timed('get_utxos', listed)
+
+    def get_latest_slot(self):
+        return self.__timed('get_latest_slot', lambda: self.slot)
+
+    def get_tx_utxos(self, txn_hash):
+        return self.__timed('get_tx_utxos', lambda: self.tx_utxos[txn_hash])
+
+    def get_txn(self, txn_hash):
+        return self.__timed('get_txn', lambda: self.txns.get(txn_hash))
+
+    def submit_txn(self, signed_file):
+        def submitted():
+            with self.__lock:
+                self.submitted.append(signed_file)
+                return self.__next_hash()
+        return self.__timed('submit_txn', submitted)
+
+"""
+Drives a real ``NftVendingMachine`` (pricing, rebates, whitelist, inventory
+and fees) against a synthetic stream of payments on a ``SimulatedChain`` with
+an ``InMemoryCardanoCli``, then reports throughput, the latency of each vend
+stage and of each cardano-cli and chain call, and the end state.  Used to capacity-plan a drop and to catch throughput regressions
+offline.  The machine consumes its metadata and whitelist directories like a
+real run would, so point it at copies.
+"""
+class Simulation(object):
+
+    FREE_MINT_PAYMENT = 10000000
+
+    __BECH32_CHARSET = 'qpzry9x8gf2tvdw0s3jn54khce6mua7l'
+    __BECH32_DATA_CHARS = 98
+
+    def synthetic_address(label, prefix='addr_test'):
+        """
+        :return: A deterministic, bech32-shaped (but not checksummed) address
+            of realistic length for ``label``
+        """
+        digest = b''
+        while len(digest) < Simulation.__BECH32_DATA_CHARS:
+            digest += hashlib.sha256(digest + label.encode('UTF-8')).digest()
+        charset = Simulation.__BECH32_CHARSET
+        return f"{prefix}1" + ''.join([charset[byte % len(charset)] for byte in digest[:Simulation.__BECH32_DATA_CHARS]])
+
+    def synthetic_payments(num_payments, price, max_nfts, num_senders=1, whitelist_assets=[], seed=None):
+        """
+        :param max_nfts: Each payment covers between 1 and ``max_nfts`` NFTs
+        :param whitelist_assets: Assets handed out (in order, one each) to the
+            payments so that asset-based whitelists have something to consume
+        :return: List of ``(lovelace, sender, assets)`` in arrival order
+        """
+        rng = random.Random(seed)
+        payments = []
+        for idx in range(num_payments):
+            lovelace = rng.randint(1, max_nfts) * price if price else Simulation.FREE_MINT_PAYMENT
+            sender = Simulation.synthetic_address(f"sender_{idx % num_senders}")
+            assets = [whitelist_assets[idx]] if idx < len(whitelist_assets) else []
+            payments.append((lovelace, sender, assets))
+        return payments
+
+    def __init__(self, nft_vending_machine, chain, payments, payments_per_cycle=None):
+        """
+        :param payments: ``(lovelace, sender, assets)`` tuples, see
+            ``synthetic_payments``
+        :param payments_per_cycle: Payments arriving before each vend cycle
+            (default is all of them before the first cycle)
+        """
+        self.nft_vending_machine = nft_vending_machine
+        self.chain = chain
+        self.payments = payments
+        self.payments_per_cycle = payments_per_cycle
+
+    def __outputs_by_role(self):
+        machine = self.nft_vending_machine
+        totals = {'profit_lovelace': 0, 'donation_lovelace': 0, 'buyer_lovelace': 0, 'vends': 0, 'nfts_minted': 0}
+        for signed_file in self.chain.submitted:
+            for tx_out in machine.cardano_cli.signed_outputs.get(signed_file, []):
+                tokens = tx_out.split('+')
+                lovelace = int(tokens[1]) if len(tokens) > 1 else 0
+                if tokens[0] == machine.profit_addr:
+                    totals['profit_lovelace'] += lovelace
+                elif tokens[0] == machine.donation_addr:
+                    totals['donation_lovelace'] += lovelace
+                else:
+                    totals['buyer_lovelace'] += lovelace
+                    totals['vends'] += 1
+                    totals['nfts_minted'] += len(tokens[2:])
+        return totals
+
+    def run(self, output_dir, locked_subdir, metadata_subdir, exclusions=None):
+        """
+        Vend until every payment has arrived and a cycle picks nothing up.
+
+        :return: Report dictionary (throughput, vend stage and call latency,
+            end state)
+        """
+        machine = self.nft_vending_machine
+        exclusions = exclusions if exclusions is not None else set()
+        cycle_profiler = CardanoCli.Profiler()
+        pending = list(self.payments)
+        requests = 0
+        cycles = 0
+        start = time.perf_counter()
+        while True:
+            arriving = pending[:self.payments_per_cycle] if self.payments_per_cycle else pending
+            pending = pending[len(arriving):]
+            for lovelace, sender, assets in arriving:
+                self.chain.pay(machine.payment_addr, lovelace, sender, assets)
+            cycle_start = time.perf_counter()
+            processed = machine.vend(output_dir, locked_subdir, metadata_subdir, exclusions)
+            cycle_profiler.record('vend_cycle', time.perf_counter() - cycle_start, 0, False)
+            requests += processed
+            cycles += 1
+            if not pending and not processed:
+                break
+        elapsed = time.perf_counter() - start
+
+        report = self.__outputs_by_role()
+        report.update({
+            'payments': len(self.payments),
+            'requests': requests,
+            'cycles': cycles,
+            'txns_submitted': len(self.chain.submitted),
+            'elapsed_sec': round(elapsed, 3),
+            'vends_per_sec': round(report['vends'] / elapsed, 3) if elapsed else 0.0,
+            'nfts_per_sec': round(report['nfts_minted'] / elapsed, 3) if elapsed else 0.0,
+            'inventory_remaining': len(machine.mint.inventory),
+            'locked_remaining': len(os.listdir(os.path.join(output_dir, locked_subdir))),
+            'retries_waiting': machine.retry_scheduler.waiting(),
+            'dead_letters': len(machine.retry_scheduler.dead_letters)
+        })
+        stages = cycle_profiler.snapshot()
+        stages.update(machine.stage_stats())
+        report['stages'] = stages
+        calls = self.chain.profiler.snapshot()
+        calls.update(machine.cli_stats())
+        report['calls'] = calls
+        return report
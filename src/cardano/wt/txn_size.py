@@ -0,0 +1,86 @@
+import json
+
+from cardano.wt import cbor
+
+"""
+Conservative estimate of the serialized size of a mint transaction, used to
+pick how many NFTs fit under the ``max_tx_size`` protocol parameter before
+anything is handed to cardano-cli.  Every integer is sized at its largest
+CBOR encoding so estimates err on the side of vending fewer NFTs.
+"""
+class TxnSizeEstimator(object):
+
+    _BECH32_CHECKSUM_CHARS = 6
+    _HASH_BYTES = 32
+    _MAX_UINT_BYTES = 9
+    _POLICY_BYTES = 28
+    _SAFETY_MARGIN_BYTES = 64
+    _VKEY_WITNESS_BYTES = 1 + (2 + 32) + (2 + 64)
+
+    def address_bytes(address):
+        """
+        :param address: A bech32-encoded Cardano address
+        :return: Length of the raw address bytes inside the transaction
+        """
+        data_part = address[address.rfind('1') + 1:]
+        return ((len(data_part) - TxnSizeEstimator._BECH32_CHECKSUM_CHARS) * 5) // 8
+
+    def __bytes_item(length):
+        return len(cbor.bytes_head(length)) + length
+
+    def __script_bytes(script_json):
+        script_type = script_json['type']
+        if script_type == 'sig':
+            return 1 + 1 + TxnSizeEstimator.__bytes_item(TxnSizeEstimator._POLICY_BYTES)
+        if script_type in ['before', 'after']:
+            return 1 + 1 + TxnSizeEstimator._MAX_UINT_BYTES
+        children = script_json.get('scripts', [])
+        required = TxnSizeEstimator._MAX_UINT_BYTES if script_type == 'atLeast' else 0
+        return 1 + 1 + required + len(cbor.array_head(len(children))) + sum([TxnSizeEstimator.__script_bytes(child) for child in children])
+
+    def __init__(self, max_tx_size, script_file):
+        self.max_tx_size = max_tx_size
+        with open(script_file, 'r') as script_filehandle:
+            self.script_bytes = TxnSizeEstimator.__script_bytes(json.load(script_filehandle))
+
+    def multiasset_bytes(self, asset_name_lens):
+        """
+        :param asset_name_lens: Byte length of each asset name under the policy
+        :return: Size of a single-policy multi-asset map (as used in both the
+            mint field and the buyer's output)
+        """
+        if not asset_name_lens:
+            return 0
+        assets = sum([TxnSizeEstimator.__bytes_item(name_len) + TxnSizeEstimator._MAX_UINT_BYTES for name_len in asset_name_lens])
+        return 1 + TxnSizeEstimator.__bytes_item(TxnSizeEstimator._POLICY_BYTES) + len(cbor.map_head(len(asset_name_lens))) + assets
+
+    def output_bytes(self, address, asset_name_lens=[]):
+        value = TxnSizeEstimator._MAX_UINT_BYTES
+        if asset_name_lens:
+            value = 1 + value + self.multiasset_bytes(asset_name_lens)
+        return 1 + TxnSizeEstimator.__bytes_item(TxnSizeEstimator.address_bytes(address)) + value
+
+    def estimate(self, tx_in_count, outputs, asset_name_lens, metadata_bytes, witness_count):
+        """
+        :param tx_in_count: Number of transaction inputs
+        :param outputs: List of ``(address, asset_name_lens)`` for each output
+        :param asset_name_lens: Byte lengths of all minted asset names
+        :param metadata_bytes: Size of the CBOR-encoded transaction metadata
+        :param witness_count: Number of vkey witnesses
+        :return: Estimated size in bytes of the signed transaction
+        """
+        inputs = 1 + (tx_in_count * (1 + TxnSizeEstimator.__bytes_item(TxnSizeEstimator._HASH_BYTES) + TxnSizeEstimator._MAX_UINT_BYTES))
+        tx_outputs = 1 + sum([self.output_bytes(address, output_names) for (address, output_names) in outputs])
+        scalars = 3 * (1 + TxnSizeEstimator._MAX_UINT_BYTES)
+        aux_hash = 1 + TxnSizeEstimator.__bytes_item(TxnSizeEstimator._HASH_BYTES) if metadata_bytes else 0
+        mint = 1 + self.multiasset_bytes(asset_name_lens) if asset_name_lens else 0
+        body = 1 + (1 + inputs) + (1 + tx_outputs) + scalars + aux_hash + mint
+
+        witnesses = 1 + 1 + 1 + (witness_count * TxnSizeEstimator._VKEY_WITNESS_BYTES)
+        if asset_name_lens:
+            witnesses += 1 + 1 + self.script_bytes
+
+        return 1 + body + witnesses + 1 + metadata_bytes + TxnSizeEstimator._SAFETY_MARGIN_BYTES
+
+    def fits(self, *args):
+        return (not self.max_tx_size) or self.estimate(*args) <= self.max_tx_size
@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+
+"""
+Record of the metadata files a ``Mint`` already validated, keyed by filename
+with each file's size, mtime, content hash and asset name.  On restart a file
+whose size and mtime are unchanged is trusted as is, one whose size or mtime
+changed is trusted only if its content hash still matches (its mtime is then
+refreshed), and every other file is validated again.  Entries are discarded
+wholesale (so every file is validated again) when the policy, the manifest
+version or the version of the validation rules the files were checked against
+changes.
+"""
+class ValidationManifest(object):
+
+    _VERSION = 1
+
+    def __init__(self, state_file, policy, rules):
+        """
+        :param rules: Version of the validation rules files are checked
+            against (see ``Mint.VALIDATION_RULES``)
+        """
+        self.state_file = state_file
+        self.policy = policy
+        self.rules = rules
+        self.trusted_count = 0
+        self.__entries = {}
+
+    def fingerprint(path, content):
+        """
+        :param content: Bytes read from ``path``
+        :return: Fingerprint of the file as recorded in the manifest
+        """
+        stat = os.stat(path)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': hashlib.sha256(content).hexdigest()}
+
+    def load(self):
+        """
+        :return: This manifest, populated from ``state_file`` if it exists and
+            was written for the same policy, manifest version and rules
+        """
+        if not os.path.exists(self.state_file):
+            return self
+        with open(self.state_file, 'r') as state_filehandle:
+            state = json.load(state_filehandle)
+        if state.get('version') != ValidationManifest._VERSION or state.get('policy') != self.policy or state.get('rules') != self.rules:
+            print(f"Ignoring validation manifest {self.state_file} written for another policy, version or validation rules")
+            return self
+        self.__entries = state['files']
+        return self
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def trusted_asset(self, nfts_dir, filename):
+        """
+        :return: Asset name recorded for an unchanged file, None if the file
+            has to be validated
+        """
+        entry = self.__entries.get(filename)
+        if not entry:
+            return None
+        path = os.path.join(nfts_dir, filename)
+        stat = os.stat(path)
+        if stat.st_size != entry['size']:
+            return None
+        if stat.st_mtime_ns != entry['mtime_ns']:
+            with open(path, 'rb') as file:
+                if hashlib.sha256(file.read()).hexdigest() != entry['sha256']:
+                    return None
+            entry['mtime_ns'] = stat.st_mtime_ns
+        self.trusted_count += 1
+        return entry['asset_name']
+
+    def record(self, filename, asset_name, fingerprint):
+        self.__entries[filename] = dict(fingerprint, asset_name=asset_name)
+
+    def save(self, filenames):
+        """
+        :param filenames: Files currently in the metadata directory, entries
+            for any other file are dropped
+        """
+        entries = {filename: self.__entries[filename] for filename in filenames if filename in self.__entries}
+        self.__entries = entries
+        tmp_file = f"{self.state_file}.tmp"
+        with open(tmp_file, 'w') as state_filehandle:
+            json.dump({'version': ValidationManifest._VERSION, 'policy': self.policy, 'rules': self.rules, 'files': entries}, state_filehandle)
+        os.replace(tmp_file, self.state_file)
@@ -19,6 +19,12 @@ class AssetWhitelist(object):
         consumed_location = os.path.join(self.consumed_dir, asset_id)
         shutil.move(self.__fs_location(asset_id), consumed_location)
 
+    def _restore_to_whitelist(self, asset_id):
+        shutil.move(os.path.join(self.consumed_dir, asset_id), self.__fs_location(asset_id))
+
+    def is_consumed(self, asset_id):
+        return os.path.exists(os.path.join(self.consumed_dir, asset_id))
+
     def is_whitelisted(self, asset_id):
         return os.path.exists(self.__fs_location(asset_id))
 
@@ -80,6 +86,28 @@ class SingleUseWhitelist(AssetWhitelist):
         if remaining_to_remove != 0:
             raise ValueError(f"[MANUALLY DEBUG] THERE WAS AN OVERMINT FOR A WHITELIST ({remaining_to_remove}), THE MINT WAS ALREADY PROCESSED, INVESTIGATE {utxo_outputs}")
 
+    def restore(self, utxo_outputs, num_mints):
+        """
+        This implementation undoes ``consume`` for a mint that never landed,
+        moving up to ``num_mints`` of the input's consumed assets back from the
+        staging area into the whitelist.
+
+        :param utxo_outputs: The UTXOs spent in the mint request's input txn
+            NOTE: Explicitly skips reference inputs
+        :param num_mints: How many mints were rolled back
+        """
+        remaining_to_restore = num_mints
+        for utxo_output in utxo_outputs:
+            utxo_amounts = utxo_output['amount']
+            for utxo_amount in utxo_amounts:
+                if not remaining_to_restore:
+                    return
+                asset_id = utxo_amount['unit']
+                if not self.is_consumed(asset_id):
+                    continue
+                self._restore_to_whitelist(asset_id)
+                remaining_to_restore -= 1
+
 
 """
 A whitelist implementation that allows unlimited mints per whitelisted asset for the
@@ -115,3 +143,12 @@ class UnlimitedWhitelist(AssetWhitelist):
         :param num_mints: How many mints were successfully processed
         """
         pass
+
+    def restore(self, utxo_outputs, num_mints):
+        """
+        Nothing was consumed, so nothing has to be restored.
+
+        :param utxo_outputs: The UTXOs in the mint request's input transaction
+        :param num_mints: How many mints were rolled back
+        """
+        pass
@@ -35,6 +35,15 @@ class NoWhitelist(object):
         """
         pass
 
+    def restore(self, utxo_outputs, num_mints):
+        """
+        No-operation because there is no whitelist to be restored.
+
+        :param utxo_outputs: The UTXOs in the mint request's input transaction
+        :param num_mints: How many mints were rolled back
+        """
+        pass
+
     def validate(self):
         """
         No-operation because a nil whitelist is automatically valid.
@@ -0,0 +1,81 @@
+import os
+import tempfile
+import zipfile
+
+from cardano.wt.artifact_store import ArtifactStore, next_artifact_id
+from cardano.wt.cardano_cli import CardanoCli
+
+def write_artifacts(store, artifact_id, size=16):
+    paths = [
+        os.path.join(store.txn_dir, f"txn_{artifact_id}.raw.build"),
+        os.path.join(store.txn_dir, f"txn_{artifact_id}.raw.build.signed"),
+        os.path.join(store.metadata_dir, f"{artifact_id}.json")
+    ]
+    for path in paths:
+        with open(path, 'w') as artifact_file:
+            artifact_file.write(os.urandom(size).hex())
+    return paths
+
+def test_ids_are_unique_within_same_second():
+    ids = [next_artifact_id() for i in range(10000)]
+    assert len(set(ids)) == len(ids), 'Generated duplicate artifact ids'
+
+def test_creates_cli_layout_in_hot_dir():
+    root = tempfile.mkdtemp()
+    store = ArtifactStore(os.path.join(root, 'hot'), os.path.join(root, 'archive'))
+    assert os.path.isdir(os.path.join(root, 'hot', CardanoCli.TXN_DIR))
+    assert os.path.isdir(os.path.join(root, 'hot', ArtifactStore.METADATA_DIR))
+    assert os.path.isdir(os.path.join(root, 'archive'))
+
+def test_compacts_only_completed_artifacts():
+    root = tempfile.mkdtemp()
+    store = ArtifactStore(os.path.join(root, 'hot'), os.path.join(root, 'archive'))
+    done_id, inflight_id = store.new_id(), store.new_id()
+    done_paths = write_artifacts(store, done_id)
+    inflight_paths = write_artifacts(store, inflight_id)
+
+    store.complete(done_id)
+    assert store.compact() == 1
+    assert not any([os.path.exists(path) for path in done_paths]), 'Completed artifacts left in hot dir'
+    assert all([os.path.exists(path) for path in inflight_paths]), 'In-flight artifacts were archived'
+
+    archives = os.listdir(os.path.join(root, 'archive'))
+    assert len(archives) == 1
+    with zipfile.ZipFile(os.path.join(root, 'archive', archives[0])) as archive:
+        assert sorted(archive.namelist()) == sorted([os.path.relpath(path, store.hot_dir) for path in done_paths])
+
+def test_rotates_and_retains_archives():
+    root = tempfile.mkdtemp()
+    store = ArtifactStore(os.path.join(root, 'hot'), os.path.join(root, 'archive'), max_archive_bytes=1024, max_archives=2)
+    for i in range(10):
+        artifact_id = store.new_id()
+        write_artifacts(store, artifact_id, size=1024)
+        store.complete(artifact_id)
+        store.compact()
+    archives = sorted(os.listdir(os.path.join(root, 'archive')))
+    assert len(archives) == 2, f"Expected retention of 2 archives, found {archives}"
+    assert archives[-1] == f"{ArtifactStore.ARCHIVE_PREFIX}{9:06d}.zip"
+
+def test_stop_flushes_outstanding_artifacts():
+    root = tempfile.mkdtemp()
+    store = ArtifactStore(os.path.join(root, 'hot'), os.path.join(root, 'archive'), compact_interval=3600)
+    store.start()
+    artifact_id = store.new_id()
+    paths = write_artifacts(store, artifact_id)
+    store.complete(artifact_id)
+    store.stop()
+    assert store.pending() == 0
+    assert not any([os.path.exists(path) for path in paths])
+
+def test_durable_copies_last_until_compaction():
+    root = tempfile.mkdtemp()
+    store = ArtifactStore(os.path.join(root, 'hot'), os.path.join(root, 'archive'))
+    artifact_id = store.new_id()
+    signed_file = write_artifacts(store, artifact_id)[1]
+    durable_file = store.persist(signed_file)
+    assert os.path.dirname(durable_file) == os.path.join(root, 'archive', ArtifactStore.DURABLE_DIR)
+    with open(signed_file, 'r') as hot, open(durable_file, 'r') as durable:
+        assert hot.read() == durable.read()
+    store.complete(artifact_id)
+    store.compact()
+    assert not os.path.exists(durable_file), 'Durable copy outlived its archived artifact'
@@ -0,0 +1,48 @@
+import os
+import threading
+import time
+
+from cardano.wt.cardano_cli import CardanoCli
+
+def test_defaults_to_serial_worker():
+    cardano_cli = CardanoCli()
+    assert cardano_cli.max_workers == 1
+
+def test_zero_workers_uses_core_count():
+    cardano_cli = CardanoCli(max_workers=0)
+    assert cardano_cli.max_workers == os.cpu_count()
+
+def test_batch_futures_preserve_order():
+    cardano_cli = CardanoCli(max_workers=4)
+    futures = cardano_cli.submit_batch([(lambda i=i: i * i) for i in range(10)])
+    assert [future.result() for future in futures] == [i * i for i in range(10)]
+    cardano_cli.shutdown()
+
+def test_batch_runs_concurrently_up_to_bound():
+    max_workers = 3
+    cardano_cli = CardanoCli(max_workers=max_workers)
+    lock = threading.Lock()
+    running = {'now': 0, 'peak': 0}
+    def job():
+        with lock:
+            running['now'] += 1
+            running['peak'] = max(running['peak'], running['now'])
+        time.sleep(0.05)
+        with lock:
+            running['now'] -= 1
+    for future in cardano_cli.submit_batch([job for i in range(9)]):
+        future.result()
+    cardano_cli.shutdown()
+    assert running['peak'] == max_workers, f"Expected {max_workers} concurrent jobs, saw {running['peak']}"
+
+def test_batch_surfaces_job_errors():
+    cardano_cli = CardanoCli(max_workers=2)
+    def failing_job():
+        raise ValueError('cardano-cli exploded')
+    future = cardano_cli.submit(failing_job)
+    try:
+        future.result()
+        assert False, 'Future did not surface the CLI job error'
+    except ValueError as e:
+        assert 'cardano-cli exploded' in str(e)
+    cardano_cli.shutdown()
@@ -0,0 +1,51 @@
+import os
+
+from test_utils.fs import protocol_file_path
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.fake_cardano_cli import FakeCardanoCli
+
+ADDRESS = 'addr_test1vrce7uwk8vcva5j4dmehrxprwy57x20yaz9cv9vqzjutnnsrgrfey'
+TX_IN = '--tx-in 0000000000000000000000000000000000000000000000000000000000000000#0'
+
+def test_parses_subcommands():
+    assert CardanoCli.Profiler.subcommand_of('transaction build-raw --fee 0') == 'build-raw'
+    assert CardanoCli.Profiler.subcommand_of('transaction calculate-min-fee --tx-body-file f') == 'calculate-min-fee'
+    assert CardanoCli.Profiler.subcommand_of('address build --testnet-magic 1') == 'address build'
+
+def test_histogram_buckets_latency():
+    profiler = CardanoCli.Profiler()
+    profiler.record('sign', 0.001, 10, False)
+    profiler.record('sign', 0.04, 10, False)
+    profiler.record('sign', 60.0, 0, True)
+    sign_stats = profiler.snapshot()['sign']
+    assert sign_stats['count'] == 3
+    assert sign_stats['failures'] == 1
+    assert sign_stats['output_bytes'] == 20
+    assert sign_stats['max_ms'] == 60000.0
+    histogram = sign_stats['latency_histogram_ms']
+    assert histogram['5'] == 1 and histogram['50'] == 1 and histogram['inf'] == 1
+    assert sum(histogram.values()) == 3
+
+def test_records_each_cli_subcommand(request, vm_test_config):
+    cardano_cli = CardanoCli(protocol_params=protocol_file_path(request, 'preprod.json'), cli_path=FakeCardanoCli.command())
+    build = cardano_cli.build_raw_txn(vm_test_config.root_dir, 'profile', [TX_IN], [f"--tx-out '{ADDRESS}+5000000'"], 0, None, [])
+    cardano_cli.calculate_min_fee(build, 1, 1, 1)
+    build = cardano_cli.build_raw_txn(vm_test_config.root_dir, 'profile', [TX_IN], [f"--tx-out '{ADDRESS}+4800000'"], 200000, None, [])
+    signed = cardano_cli.sign_txn(['/path/to/payment.skey'], build)
+
+    stats = cardano_cli.profiler.snapshot()
+    assert sorted(stats.keys()) == ['build-raw', 'calculate-min-fee', 'sign']
+    assert stats['build-raw']['count'] == 2
+    assert stats['calculate-min-fee']['count'] == 1
+    assert stats['sign']['output_bytes'] == os.path.getsize(signed)
+    assert not any([subcommand_stats['failures'] for subcommand_stats in stats.values()])
+
+def test_records_failures(request, vm_test_config):
+    cardano_cli = CardanoCli(cli_path=FakeCardanoCli.command())
+    try:
+        cardano_cli.calculate_min_fee('/this/file/does/not/exist', 1, 1, 1)
+    except ValueError:
+        pass
+    assert cardano_cli.profiler.snapshot()['calculate-min-fee']['failures'] == 1
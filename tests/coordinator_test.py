@@ -0,0 +1,129 @@
+import json
+import os
+
+from test_utils.offline import OfflineBlockfrostApi, PAYMENT_ADDR, PROFIT_ADDR, TANGZ_POLICY, offline_cardano_cli, offline_mint, stock_metadata
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.coordinator import VendCoordinator
+from cardano.wt.journal import VendJournal
+from cardano.wt.nft_vending_machine import NftVendingMachine, WhitelistClaims
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+EXTRA_PAYMENT_ADDRS = [
+    'addr_test1vqxsvz7lsnwr7jfqusnmcwxguk6qq4v6ze83vz7sz9z5cgqd7v6zu',
+    'addr_test1vp8zqsdmvd6uhf7xurqyetw8xfrs2ae66zkx7ljwxw3dk0sxkrzvx'
+]
+MINT_PRICE = 15000000
+SINGLE_VEND_MAX = 5
+
+def coordinator_for(request, vm_test_config, blockfrost_api, payment_addrs, mint=None, whitelist_claims=None, journal=None):
+    mint = mint if mint else offline_mint(request, vm_test_config.metadata_dir, MINT_PRICE, NoWhitelist())
+    whitelist_claims = whitelist_claims if whitelist_claims else WhitelistClaims()
+    machines = [
+        NftVendingMachine(payment_addr, f"/path/to/payment{idx}.skey", PROFIT_ADDR, True, SINGLE_VEND_MAX, mint, blockfrost_api, offline_cardano_cli(request), whitelist_claims=whitelist_claims, journal=journal)
+        for idx, payment_addr in enumerate(payment_addrs)
+    ]
+    return VendCoordinator(machines)
+
+def vended_names(vm_test_config):
+    names = []
+    for combined_file in os.listdir(vm_test_config.txn_metadata_dir):
+        with open(os.path.join(vm_test_config.txn_metadata_dir, combined_file), 'r') as combined_filehandle:
+            names += list(json.load(combined_filehandle)['721'][TANGZ_POLICY].keys())
+    return names
+
+def test_addresses_share_one_inventory(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 11))
+    payment_addrs = [PAYMENT_ADDR] + EXTRA_PAYMENT_ADDRS
+    blockfrost_api = OfflineBlockfrostApi()
+    for idx, payment_addr in enumerate(payment_addrs):
+        for buyer in range(3):
+            blockfrost_api.pay(f"{idx + 1:02x}{buyer + 1:02x}" * 16, 2 * MINT_PRICE, payment_addr=payment_addr)
+    coordinator = coordinator_for(request, vm_test_config, blockfrost_api, payment_addrs)
+    coordinator.validate()
+    exclusions = [set() for payment_addr in payment_addrs]
+    assert coordinator.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 9
+    names = vended_names(vm_test_config)
+    assert len(names) == len(set(names)) == 10
+    assert len(os.listdir(vm_test_config.locked_dir)) == 10
+    assert [len(machine_exclusions) for machine_exclusions in exclusions] == [3, 3, 3]
+
+def test_shared_journal_confirms_own_vends_only(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 5))
+    payment_addrs = [PAYMENT_ADDR, EXTRA_PAYMENT_ADDRS[0]]
+    blockfrost_api = OfflineBlockfrostApi()
+    extra_payment = blockfrost_api.pay('bb' * 32, 2 * MINT_PRICE, payment_addr=EXTRA_PAYMENT_ADDRS[0])
+    journal = VendJournal(os.path.join(vm_test_config.root_dir, 'vend_journal.jsonl')).replay()
+    coordinator = coordinator_for(request, vm_test_config, blockfrost_api, payment_addrs, journal=journal)
+    coordinator.validate()
+    (first, extra) = coordinator.machines
+    extra.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, set())
+    assert journal.state_of(extra_payment) == VendJournal.SUBMITTED
+    blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    first.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, set())
+    first.recover(set())
+    assert journal.state_of(extra_payment) == VendJournal.SUBMITTED
+    assert len(blockfrost_api.submitted) == 2
+
+def test_trims_vend_when_inventory_runs_out_mid_reservation(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    coordinator = coordinator_for(request, vm_test_config, blockfrost_api, [PAYMENT_ADDR])
+    coordinator.validate()
+    machine = coordinator.machines[0]
+    inventory = machine.mint.inventory
+    draw = inventory.draw
+    def racing_draw(randomly):
+        drawn = draw(randomly)
+        inventory.sample(len(inventory), randomly)
+        return drawn
+    monkeypatch.setattr(inventory, 'draw', racing_draw)
+    machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, set())
+    assert len(blockfrost_api.submitted) == 1
+    assert len(vended_names(vm_test_config)) == 1
+    assert not machine.retry_scheduler.dead_letters and not machine.retry_scheduler.waiting()
+
+def test_rescan_does_not_redraw_nfts_another_machine_drew(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 2))
+    payment_addrs = [PAYMENT_ADDR, EXTRA_PAYMENT_ADDRS[0]]
+    blockfrost_api = OfflineBlockfrostApi()
+    blockfrost_api.pay('aa' * 32, MINT_PRICE)
+    blockfrost_api.pay('bb' * 32, 2 * MINT_PRICE, payment_addr=EXTRA_PAYMENT_ADDRS[0])
+    coordinator = coordinator_for(request, vm_test_config, blockfrost_api, payment_addrs)
+    coordinator.validate()
+    (first, extra) = coordinator.machines
+    inventory = first.mint.inventory
+    read = inventory.read
+    def restock_and_vend_concurrently(filename):
+        monkeypatch.setattr(inventory, 'read', read)
+        stock_metadata(request, vm_test_config.metadata_dir, range(2, 3))
+        os.utime(vm_test_config.metadata_dir, ns=(0, 0))
+        extra.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, set())
+        return read(filename)
+    monkeypatch.setattr(inventory, 'read', restock_and_vend_concurrently)
+    first.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, set())
+    assert len(blockfrost_api.submitted) == 2
+    names = vended_names(vm_test_config)
+    assert sorted(names) == ['WildTangz 1', 'WildTangz 2']
+    assert sorted(os.listdir(vm_test_config.locked_dir)) == ['WildTangz 1.json', 'WildTangz 2.json']
+
+def test_rejects_machines_without_shared_state(request, vm_test_config):
+    blockfrost_api = OfflineBlockfrostApi()
+    first = coordinator_for(request, vm_test_config, blockfrost_api, [PAYMENT_ADDR]).machines[0]
+    unshared_mint = coordinator_for(request, vm_test_config, blockfrost_api, EXTRA_PAYMENT_ADDRS[:1], whitelist_claims=first.whitelist_claims).machines[0]
+    unshared_claims = coordinator_for(request, vm_test_config, blockfrost_api, EXTRA_PAYMENT_ADDRS[:1], mint=first.mint).machines[0]
+    for second, message in [(unshared_mint, 'Mint'), (unshared_claims, 'WhitelistClaims')]:
+        try:
+            VendCoordinator([first, second])
+            assert False, f"Expected machines not sharing their {message} to be rejected"
+        except ValueError as e:
+            assert message in str(e)
+
+def test_rejects_duplicate_payment_addresses(request, vm_test_config):
+    machines = coordinator_for(request, vm_test_config, OfflineBlockfrostApi(), [PAYMENT_ADDR]).machines
+    try:
+        VendCoordinator(machines + machines)
+        assert False, 'Expected duplicate payment addresses to be rejected'
+    except ValueError as e:
+        assert 'must be unique' in str(e)
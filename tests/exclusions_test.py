@@ -0,0 +1,35 @@
+import os
+
+from cardano.wt.exclusions import ExclusionTracker
+from cardano.wt.utxo import Utxo
+
+def utxo(num, ix=0):
+    return Utxo(f"{num:02x}" * 32, ix, [Utxo.Balance(5000000, None)])
+
+def test_behaves_like_a_set_of_utxos():
+    exclusions = ExclusionTracker()
+    exclusions.add(utxo(1))
+    exclusions.add(Utxo(utxo(1).hash, 0, []))
+    assert utxo(1) in exclusions and not utxo(1, ix=1) in exclusions
+    assert len(exclusions) == 1
+    exclusions.discard(utxo(1))
+    exclusions.discard(utxo(2))
+    assert not len(exclusions)
+
+def test_prunes_spent_utxos():
+    exclusions = ExclusionTracker()
+    for num in range(1, 5):
+        exclusions.add(utxo(num))
+    assert exclusions.prune([utxo(2), utxo(4), utxo(5)]) == 2
+    assert [num for num in range(1, 6) if utxo(num) in exclusions] == [2, 4]
+    assert exclusions.stats() == {'entries': 2, 'pruned': 2}
+
+def test_persists_across_restarts(tmp_path):
+    state_file = os.path.join(tmp_path, 'exclusions.json')
+    exclusions = ExclusionTracker(state_file=state_file)
+    exclusions.add(utxo(1))
+    exclusions.add(utxo(2, ix=3))
+    exclusions.save()
+    restored = ExclusionTracker(state_file=state_file).load()
+    assert len(restored) == 2 and utxo(1) in restored and utxo(2, ix=3) in restored
+    assert not len(ExclusionTracker(state_file=os.path.join(tmp_path, 'missing.json')).load())
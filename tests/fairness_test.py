@@ -0,0 +1,47 @@
+from cardano.wt.fairness import FairScheduler
+
+WHALE = 'addr_whale'
+MINNOW = 'addr_minnow'
+SHRIMP = 'addr_shrimp'
+
+ARRIVALS = [(WHALE, 1), (WHALE, 2), (WHALE, 3), (MINNOW, 4), (WHALE, 5), (SHRIMP, 6)]
+
+def order(fair_scheduler, arrivals=ARRIVALS):
+    return fair_scheduler.order(arrivals, lambda arrival: arrival[0])
+
+def slots(requests):
+    return [slot for sender, slot in requests]
+
+def test_fifo_keeps_arrival_order():
+    scheduled, deferred = order(FairScheduler())
+    assert slots(scheduled) == [1, 2, 3, 4, 5, 6]
+    assert not deferred
+
+def test_fifo_defers_beyond_per_address_cap():
+    scheduled, deferred = order(FairScheduler(per_address_cap=2))
+    assert slots(scheduled) == [1, 2, 4, 6]
+    assert slots(deferred) == [3, 5]
+
+def test_round_robin_alternates_senders():
+    scheduled, deferred = order(FairScheduler(FairScheduler.ROUND_ROBIN))
+    assert slots(scheduled) == [1, 4, 6, 2, 3, 5]
+    assert not deferred
+
+def test_weighted_takes_weight_per_round():
+    scheduled, deferred = order(FairScheduler(FairScheduler.WEIGHTED, per_address_cap=3, weights={WHALE: 2}))
+    assert slots(scheduled) == [1, 2, 4, 6, 3]
+    assert slots(deferred) == [5]
+
+def test_orders_by_chain_position_when_known():
+    positions = {1: (9, 0), 2: (3, 1), 3: (3, 0), 4: (1, 0), 5: (2, 0), 6: (4, 0)}
+    scheduled, deferred = FairScheduler(FairScheduler.ROUND_ROBIN, per_address_cap=2).order(ARRIVALS, lambda arrival: arrival[0], position_of=lambda arrival: positions[arrival[1]])
+    assert slots(scheduled) == [4, 5, 6, 3]
+    assert slots(deferred) == [2, 1]
+
+def test_rejects_bad_configuration():
+    for kwargs, message in [({'policy': 'lifo'}, 'Unknown fairness policy'), ({'per_address_cap': 0}, 'cap must be at least 1'), ({'policy': FairScheduler.WEIGHTED, 'weights': {WHALE: 0}}, f"Weight for {WHALE}")]:
+        try:
+            FairScheduler(**kwargs)
+            assert False, f"Expected {kwargs} to be rejected"
+        except ValueError as e:
+            assert message in str(e)
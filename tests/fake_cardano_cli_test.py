@@ -0,0 +1,61 @@
+import json
+import os
+
+from test_utils.fs import protocol_file_path
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.fake_cardano_cli import FakeCardanoCli
+
+ADDRESS = 'addr_test1vrce7uwk8vcva5j4dmehrxprwy57x20yaz9cv9vqzjutnnsrgrfey'
+TX_IN = '--tx-in 0000000000000000000000000000000000000000000000000000000000000000#0'
+
+def fake_cli(request, **kwargs):
+    return CardanoCli(protocol_params=protocol_file_path(request, 'preprod.json'), cli_path=FakeCardanoCli.command(**kwargs))
+
+def cbor_hex_of(filename):
+    with open(filename, 'r') as file:
+        return json.load(file)['cborHex']
+
+def test_build_fee_sign_round_trip(request, vm_test_config):
+    cardano_cli = fake_cli(request)
+    build = cardano_cli.build_raw_txn(vm_test_config.root_dir, 'fake', [TX_IN], [f"--tx-out '{ADDRESS}+5000000'"], 0, None, [])
+    fee = cardano_cli.calculate_min_fee(build, 1, 1, 1)
+    body_len = len(cbor_hex_of(build)) // 2
+    assert fee == (44 * (body_len + 106)) + 155381, f"Fee {fee} does not follow preprod protocol for a {body_len} byte body"
+
+    signed = cardano_cli.sign_txn(['/path/to/payment.skey'], build)
+    assert signed == f"{build}.signed"
+    assert cbor_hex_of(signed).startswith(cbor_hex_of(build))
+
+def test_outputs_are_deterministic(request, vm_test_config):
+    cardano_cli = fake_cli(request)
+    tx_outs = [f"--tx-out '{ADDRESS}+5000000'"]
+    first = cbor_hex_of(cardano_cli.build_raw_txn(vm_test_config.root_dir, 'first', [TX_IN], tx_outs, 0, None, []))
+    second = cbor_hex_of(cardano_cli.build_raw_txn(vm_test_config.root_dir, 'second', [TX_IN], tx_outs, 0, None, []))
+    other = cbor_hex_of(cardano_cli.build_raw_txn(vm_test_config.root_dir, 'other', [TX_IN], tx_outs, 1000, None, []))
+    assert first == second, 'Same build arguments produced different transactions'
+    assert first != other, 'Different fees produced the same transaction'
+
+def test_metadata_grows_transaction(request, vm_test_config):
+    cardano_cli = fake_cli(request)
+    metadata_file = os.path.join(vm_test_config.root_dir, 'metadata.json')
+    with open(metadata_file, 'w') as metadata:
+        json.dump({'721': {'policy': {'name': 'x' * 64}}}, metadata)
+    tx_outs = [f"--tx-out '{ADDRESS}+5000000'"]
+    without = cardano_cli.build_raw_txn(vm_test_config.root_dir, 'without', [TX_IN], tx_outs, 0, None, [])
+    with_metadata = cardano_cli.build_raw_txn(vm_test_config.root_dir, 'with', [TX_IN], tx_outs, 0, metadata_file, [])
+    assert cardano_cli.calculate_min_fee(with_metadata, 1, 1, 1) > cardano_cli.calculate_min_fee(without, 1, 1, 1)
+
+def test_applies_subcommand_latency():
+    (fake, argv) = FakeCardanoCli.from_argv(['--latency', '0', '--latency-sign', '0.2', 'transaction', 'sign'])
+    assert argv == ['transaction', 'sign']
+    assert fake.latency == 0.0
+    assert fake.subcommand_latencies == {'sign': 0.2}
+
+def test_rejects_unsupported_subcommands():
+    try:
+        FakeCardanoCli().run(['address', 'build'])
+        assert False, 'Fake cardano-cli accepted an unsupported subcommand'
+    except ValueError as e:
+        assert 'address build' in str(e)
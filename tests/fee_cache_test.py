@@ -0,0 +1,87 @@
+import json
+import os
+import tempfile
+
+from cardano.wt.fee_cache import FeeCache
+
+FEE_PER_BYTE = 44
+
+def protocol_params(fee_per_byte=FEE_PER_BYTE, filename=None):
+    filename = filename if filename else os.path.join(tempfile.mkdtemp(), 'protocol.json')
+    with open(filename, 'w') as protocol_file:
+        json.dump({'txFeePerByte': fee_per_byte, 'txFeeFixed': 155381}, protocol_file)
+    return filename
+
+def test_hits_within_bucket_with_padding():
+    fee_cache = FeeCache(protocol_params(), bucket_bytes=256, verify_every=0)
+    key = fee_cache.key_for(1, 3, 2, 1000)
+    assert fee_cache.get(key) is None
+    fee_cache.put(key, 200000)
+    assert fee_cache.get(fee_cache.key_for(1, 3, 2, 1020)) == 200000 + (FEE_PER_BYTE * 256)
+    assert fee_cache.get(fee_cache.key_for(1, 3, 2, 1024)) is None
+    assert fee_cache.get(fee_cache.key_for(2, 3, 2, 1000)) is None
+    assert fee_cache.stats()['hits'] == 1
+
+def test_verifies_periodically_and_flags_shortfalls():
+    fee_cache = FeeCache(protocol_params(), bucket_bytes=1, verify_every=3)
+    key = fee_cache.key_for(1, 3, 2, 1000)
+    fee_cache.put(key, 200000)
+    assert [fee_cache.get(key) is None for i in range(3)] == [False, False, True]
+    fee_cache.put(key, 300000)
+    assert fee_cache.get(key) == 300000 + FEE_PER_BYTE
+    assert fee_cache.stats()['shortfalls'] == 1 and fee_cache.stats()['verifications'] == 1
+
+def test_invalidates_when_protocol_params_change():
+    params_file = protocol_params()
+    now = [0]
+    fee_cache = FeeCache(params_file, verify_every=0, params_check_every=60, clock=lambda: now[0])
+    key = fee_cache.key_for(1, 3, 2, 1000)
+    fee_cache.put(key, 200000)
+    protocol_params(fee_per_byte=50, filename=params_file)
+    os.utime(params_file, (0, 0))
+    assert fee_cache.key_for(1, 3, 2, 1000) == key
+    now[0] = 60
+    new_key = fee_cache.key_for(1, 3, 2, 1000)
+    assert new_key != key and fee_cache.get(new_key) is None
+    fee_cache.put(key, 200000)
+    assert fee_cache.stats()['entries'] == 0 and fee_cache.stats()['invalidations'] == 1
+
+def test_refreshes_params_only_when_due():
+    params_file = protocol_params()
+    network = {'fee_per_byte': FEE_PER_BYTE, 'refreshes': 0}
+    def refresh_params():
+        network['refreshes'] += 1
+        protocol_params(fee_per_byte=network['fee_per_byte'], filename=params_file)
+        os.utime(params_file, ns=(0, network['fee_per_byte']))
+    now = [0]
+    fee_cache = FeeCache(params_file, verify_every=0, refresh_params=refresh_params, params_check_every=60, clock=lambda: now[0])
+    key = fee_cache.key_for(1, 3, 2, 1000)
+    fee_cache.put(key, 200000)
+    network['fee_per_byte'] = 50
+    for lookup in range(3):
+        assert fee_cache.get(fee_cache.key_for(1, 3, 2, 1000)) is not None
+    assert network['refreshes'] == 1
+    now[0] = 60
+    assert fee_cache.get(fee_cache.key_for(1, 3, 2, 1000)) is None
+    assert network['refreshes'] == 2 and fee_cache.stats()['invalidations'] == 1
+
+def test_evicts_rejected_fee_and_rechecks_params():
+    params_file = protocol_params()
+    fee_cache = FeeCache(params_file, verify_every=0, clock=lambda: 0)
+    key = fee_cache.key_for(1, 3, 2, 1000)
+    fee_cache.put(key, 200000)
+    fee_cache.put(fee_cache.key_for(1, 3, 3, 1000), 200000)
+    fee_cache.evict(key)
+    assert fee_cache.get(key) is None
+    assert fee_cache.stats()['evictions'] == 1
+    protocol_params(fee_per_byte=50, filename=params_file)
+    os.utime(params_file, (0, 0))
+    assert fee_cache.key_for(1, 3, 3, 1000) != key
+    assert fee_cache.stats()['entries'] == 0 and fee_cache.stats()['invalidations'] == 1
+
+def test_rejects_empty_bucket():
+    try:
+        FeeCache(protocol_params(), bucket_bytes=0)
+        assert False, 'Expected an empty bucket to be rejected'
+    except ValueError as e:
+        assert 'at least 1 byte' in str(e)
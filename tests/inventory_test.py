@@ -0,0 +1,109 @@
+import collections
+import os
+import random
+import tempfile
+
+from cardano.wt.inventory import Inventory
+
+def stocked_dir(num_files):
+    nfts_dir = tempfile.mkdtemp()
+    for i in range(num_files):
+        open(os.path.join(nfts_dir, f"nft_{i}.json"), 'w').close()
+    return nfts_dir
+
+def test_draws_without_replacement():
+    inventory = Inventory(stocked_dir(100)).load()
+    drawn = inventory.sample(100, True)
+    assert len(set(drawn)) == 100
+    assert len(inventory) == 0
+    assert inventory.draw(True) is None
+
+def test_sequential_draws_come_from_end():
+    inventory = Inventory(stocked_dir(0)).load(['a', 'b', 'c'])
+    assert inventory.sample(2, False) == ['c', 'b']
+
+def test_random_draws_are_uniform():
+    random.seed(321)
+    counts = collections.Counter()
+    for trial in range(2000):
+        inventory = Inventory(stocked_dir(0)).load(['a', 'b', 'c', 'd'])
+        counts[inventory.draw(True)] += 1
+    assert all([400 < counts[name] < 600 for name in 'abcd']), f"Draws look skewed: {counts}"
+
+def test_put_back_restores_availability():
+    inventory = Inventory(stocked_dir(3)).load()
+    drawn = inventory.sample(2, True)
+    inventory.put_back(drawn)
+    assert len(inventory) == 3
+    assert all([name in inventory for name in drawn])
+
+def test_own_moves_do_not_trigger_rescan():
+    nfts_dir = stocked_dir(10)
+    locked_dir = tempfile.mkdtemp()
+    inventory = Inventory(nfts_dir).load()
+    drawn = inventory.draw(True)
+    inventory.move_out(drawn, os.path.join(locked_dir, drawn))
+    assert not inventory.sync(), 'Moving a drawn file out caused a rescan'
+    assert len(inventory) == 9
+
+def test_sync_picks_up_restock():
+    nfts_dir = stocked_dir(2)
+    inventory = Inventory(nfts_dir).load()
+    os.utime(nfts_dir, ns=(0, 0))
+    open(os.path.join(nfts_dir, 'restocked.json'), 'w').close()
+    assert inventory.sync(), 'Restock did not trigger a rescan'
+    assert 'restocked.json' in inventory
+    assert len(inventory) == 3
+
+def restock_within_same_tick(nfts_dir, filename):
+    dir_mtime = os.stat(nfts_dir).st_mtime_ns
+    open(os.path.join(nfts_dir, filename), 'w').close()
+    os.utime(nfts_dir, ns=(dir_mtime, dir_mtime))
+
+def test_periodic_rescan_picks_up_restock_within_same_tick():
+    nfts_dir = stocked_dir(2)
+    inventory = Inventory(nfts_dir).load()
+    restock_within_same_tick(nfts_dir, 'restocked.json')
+    assert not inventory.sync() and not 'restocked.json' in inventory
+    rescanning = Inventory(nfts_dir, rescan_every=0).load(['nft_0.json'])
+    restock_within_same_tick(nfts_dir, 'restocked_again.json')
+    assert rescanning.sync(), 'Periodic rescan did not happen'
+    assert len(rescanning) == 4
+
+def test_empty_index_always_rescans():
+    nfts_dir = stocked_dir(1)
+    inventory = Inventory(nfts_dir).load()
+    locked_dir = tempfile.mkdtemp()
+    drawn = inventory.draw(True)
+    inventory.move_out(drawn, os.path.join(locked_dir, drawn))
+    restock_within_same_tick(nfts_dir, 'restocked.json')
+    assert inventory.sync() and 'restocked.json' in inventory
+
+def test_rescan_skips_drawn_files_not_yet_moved_out():
+    nfts_dir = stocked_dir(2)
+    inventory = Inventory(nfts_dir).load()
+    drawn = inventory.draw(True)
+    os.utime(nfts_dir, ns=(0, 0))
+    assert inventory.sync()
+    assert not drawn in inventory and len(inventory) == 1, 'Rescan made a drawn file available again'
+    inventory.put_back([drawn])
+    os.utime(nfts_dir, ns=(1, 1))
+    assert inventory.sync() and drawn in inventory and len(inventory) == 2
+
+def test_restores_persisted_state_without_rescan():
+    nfts_dir = stocked_dir(5)
+    state_file = os.path.join(tempfile.mkdtemp(), 'inventory.json')
+    inventory = Inventory(nfts_dir, state_file=state_file).load()
+    inventory.draw(False)
+    inventory.save()
+
+    restored = Inventory(nfts_dir, state_file=state_file).load(['ignored.json'])
+    assert len(restored) == 4, 'Restart did not trust the persisted index'
+
+def test_ignores_stale_persisted_state():
+    nfts_dir = stocked_dir(5)
+    state_file = os.path.join(tempfile.mkdtemp(), 'inventory.json')
+    Inventory(nfts_dir, state_file=state_file).load().save()
+    os.utime(nfts_dir, ns=(0, 0))
+    restored = Inventory(nfts_dir, state_file=state_file).load()
+    assert len(restored) == 5
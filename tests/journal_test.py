@@ -0,0 +1,64 @@
+import os
+
+from cardano.wt.journal import VendJournal
+from cardano.wt.utxo import Utxo
+
+def utxo(num):
+    return Utxo(f"{num:02x}" * 32, 0, [])
+
+def journal_in(tmp_path, **kwargs):
+    return VendJournal(os.path.join(tmp_path, 'vend_journal.jsonl'), **kwargs).replay()
+
+def test_replays_unsettled_vends(tmp_path):
+    journal = journal_in(tmp_path)
+    journal.record(utxo(1), VendJournal.RECEIVED)
+    journal.record(utxo(1), VendJournal.RESERVED, locked_files=['/in_proc/1.json'])
+    journal.record(utxo(2), VendJournal.RECEIVED)
+    journal.record(utxo(2), VendJournal.ROLLED_BACK)
+    journal.record(utxo(3), VendJournal.BUILT, signed_file='txn_3.signed')
+    journal.record(utxo(3), VendJournal.SUBMITTED, tx_hash='ab')
+    journal.record(utxo(3), VendJournal.CONFIRMED)
+    journal.record(utxo(4), VendJournal.FAILED, error='bad')
+    journal.close()
+
+    replayed = journal_in(tmp_path)
+    assert replayed.state_of(utxo(1)) == VendJournal.RESERVED
+    assert replayed.state_of(utxo(2)) is None and replayed.state_of(utxo(3)) is None
+    assert replayed.in_states(VendJournal.RESERVED) == [(utxo(1), {'state': VendJournal.RESERVED, 'locked_files': ['/in_proc/1.json']})]
+    assert [failed for failed, entry in replayed.in_states(VendJournal.FAILED)] == [utxo(4)]
+
+def test_snapshot_compacts_and_replays_idempotently(tmp_path):
+    journal = journal_in(tmp_path, snapshot_every=3)
+    journal.record(utxo(1), VendJournal.RECEIVED)
+    journal.record(utxo(1), VendJournal.RESERVED)
+    journal.record(utxo(1), VendJournal.BUILT, signed_file='txn_1.signed')
+    assert os.path.getsize(journal.journal_file) == 0
+    journal.record(utxo(1), VendJournal.SUBMITTED, tx_hash='ab')
+    journal.close()
+    with open(journal.journal_file, 'r') as journal_filehandle:
+        compacted = journal_filehandle.read()
+
+    stale = '{"seq": 2, "utxo": "%s#0", "state": "reserved"}\n' % ('01' * 32)
+    with open(journal.journal_file, 'w') as journal_filehandle:
+        journal_filehandle.write(stale + compacted)
+    assert journal_in(tmp_path).state_of(utxo(1)) == VendJournal.SUBMITTED
+
+def test_truncates_torn_record(tmp_path):
+    journal = journal_in(tmp_path)
+    journal.record(utxo(1), VendJournal.RECEIVED)
+    journal.close()
+    with open(journal.journal_file, 'a') as journal_filehandle:
+        journal_filehandle.write('{"seq": 2, "utxo": "01')
+
+    replayed = journal_in(tmp_path)
+    assert replayed.state_of(utxo(1)) == VendJournal.RECEIVED
+    replayed.record(utxo(1), VendJournal.RESERVED)
+    replayed.close()
+    assert journal_in(tmp_path).state_of(utxo(1)) == VendJournal.RESERVED
+
+def test_requires_replay_before_recording(tmp_path):
+    try:
+        VendJournal(os.path.join(tmp_path, 'vend_journal.jsonl')).record(utxo(1), VendJournal.RECEIVED)
+        assert False, 'Expected recording to an unreplayed journal to fail'
+    except ValueError as e:
+        assert 'not replayed' in str(e)
@@ -0,0 +1,45 @@
+import os
+
+from cardano.wt.leases import InventoryLeases
+from cardano.wt.utxo import Utxo
+
+def utxo(num):
+    return Utxo(f"{num:02x}" * 32, 0, [])
+
+def test_expiry_never_outlives_policy():
+    leases = InventoryLeases(ttl_slots=100)
+    assert leases.expiry_for(1000) == 1100
+    assert leases.expiry_for(1000, expiration_slot=1050) == 1050
+
+def test_settles_committed_and_expired_leases():
+    leases = InventoryLeases(ttl_slots=100)
+    leases.lease(utxo(1), ['/in_proc/1.json'], 1100)
+    leases.lease(utxo(2), ['/in_proc/2.json'], 1100)
+    leases.lease(utxo(3), ['/in_proc/3.json'], 1200)
+    leases.bind(utxo(1), 'ab' * 32)
+    committed, expired = leases.settle([utxo(2), utxo(3)], 1100)
+    assert committed == [(utxo(1), {'locked_files': ['/in_proc/1.json'], 'expiry_slot': 1100, 'tx_hash': 'ab' * 32, 'utxo_outputs': [], 'num_mints': 0})]
+    assert [(expired_utxo, lease['locked_files']) for expired_utxo, lease in expired] == [(utxo(2), ['/in_proc/2.json'])]
+    assert len(leases) == 1 and leases.release(utxo(3))['expiry_slot'] == 1200
+    assert leases.release(utxo(3)) is None
+
+def test_persists_across_restarts(tmp_path):
+    state_file = os.path.join(tmp_path, 'leases.json')
+    leases = InventoryLeases(state_file=state_file)
+    leases.lease(utxo(1), ['/in_proc/1.json'], 1100)
+    leases.save()
+    restored = InventoryLeases(state_file=state_file).load()
+    assert len(restored) == 1
+    assert restored.settle([utxo(1)], 1100)[1][0][0] == utxo(1)
+
+def test_persists_every_change_without_explicit_save(tmp_path):
+    state_file = os.path.join(tmp_path, 'leases.json')
+    leases = InventoryLeases(state_file=state_file)
+    leases.lease(utxo(1), ['/in_proc/1.json'], 1100)
+    leases.lease(utxo(2), ['/in_proc/2.json'], 1100)
+    leases.bind(utxo(1), 'ab' * 32)
+    assert InventoryLeases(state_file=state_file).load().settle([], 0)[0][0][1]['tx_hash'] == 'ab' * 32
+    leases.release(utxo(2))
+    assert len(InventoryLeases(state_file=state_file).load()) == 1
+    leases.settle([], 0)
+    assert len(InventoryLeases(state_file=state_file).load()) == 0
@@ -0,0 +1,123 @@
+import json
+import os
+import sqlite3
+
+from test_utils.fs import data_file_path
+from test_utils.offline import OfflineBlockfrostApi, PAYMENT_ADDR, PROFIT_ADDR, TANGZ_POLICY, offline_cardano_cli, stock_metadata
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.journal import VendJournal
+from cardano.wt.metadata_store import MetadataStore
+from cardano.wt.mint import Mint
+from cardano.wt.nft_vending_machine import NftVendingMachine
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+MINT_PRICE = 15000000
+
+def store_for(vm_test_config):
+    return MetadataStore(os.path.join(vm_test_config.root_dir, 'metadata.db'))
+
+def test_import_export_roundtrip(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 6))
+    store = store_for(vm_test_config)
+    assert store.import_dir(vm_test_config.metadata_dir) == 5
+    assert store.import_dir(vm_test_config.metadata_dir) == 0
+    export_dir = os.path.join(vm_test_config.root_dir, 'exported')
+    assert store.export_dir(export_dir) == 5
+    for filename in os.listdir(vm_test_config.metadata_dir):
+        with open(os.path.join(vm_test_config.metadata_dir, filename), 'r') as original, open(os.path.join(export_dir, filename), 'r') as exported:
+            assert json.load(original) == json.load(exported)
+
+def test_state_transitions(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 4))
+    store = store_for(vm_test_config)
+    store.import_dir(vm_test_config.metadata_dir)
+    store.load()
+    drawn = store.sample(3, True)
+    assert len(store) == 0 and store.counts()[MetadataStore.RESERVED] == 3
+    assert list(store.read(drawn[0])['721'][TANGZ_POLICY].keys()) == [drawn[0][:-len('.json')]]
+    store.put_back(drawn[:1])
+    assert store.move_in(drawn[1], f"/locked/{drawn[1]}")
+    assert not store.move_in(drawn[1], f"/locked/{drawn[1]}")
+    store.commit(drawn)
+    assert store.counts() == {MetadataStore.AVAILABLE: 2, MetadataStore.RESERVED: 0, MetadataStore.MINTED: 1}
+
+def test_draws_are_exclusive_across_connections(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 5))
+    first = store_for(vm_test_config)
+    first.import_dir(vm_test_config.metadata_dir)
+    first.load()
+    second = store_for(vm_test_config).load()
+    assert len(second.sample(2, True)) == 2
+    drawn = [first.draw(True) for i in range(4)]
+    assert len([filename for filename in drawn if filename]) == 2
+    second.put_back(second.sample(2, True))
+    assert not first.sync() and len(first) == 0
+
+def test_sync_picks_up_changes_from_other_connections(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    first = store_for(vm_test_config)
+    first.import_dir(vm_test_config.metadata_dir)
+    first.load()
+    second = store_for(vm_test_config).load()
+    drawn = second.sample(2, True)
+    stock_metadata(request, vm_test_config.metadata_dir, range(3, 5))
+    assert second.import_dir(vm_test_config.metadata_dir) == 2
+    second.put_back(drawn[:1])
+    assert first.sync() and len(first) == 4 and not first.sync()
+    assert sorted([first.draw(True) for i in range(4)], key=str) == sorted([drawn[0], 'WildTangz 3.json', 'WildTangz 4.json', None], key=str)
+
+def test_vends_from_store(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 6))
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    store_file = os.path.join(vm_test_config.root_dir, 'metadata.db')
+    mint = Mint(TANGZ_POLICY, MINT_PRICE, 0, vm_test_config.metadata_dir, simple_script, '/path/to/policy.skey', NoWhitelist(), metadata_store_file=store_file)
+    blockfrost_api = OfflineBlockfrostApi()
+    utxo = blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    journal = VendJournal(os.path.join(vm_test_config.root_dir, 'journal.jsonl')).replay()
+    nft_vending_machine = NftVendingMachine(PAYMENT_ADDR, '/path/to/payment.skey', PROFIT_ADDR, True, 5, mint, blockfrost_api, offline_cardano_cli(request), journal=journal)
+    nft_vending_machine.validate()
+    exclusions = set()
+    nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions)
+    assert len(blockfrost_api.submitted) == 1
+    assert os.listdir(vm_test_config.locked_dir) == []
+    assert mint.inventory.counts()[MetadataStore.RESERVED] == 2
+    blockfrost_api.utxos.remove(utxo)
+    nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions)
+    assert mint.inventory.counts() == {MetadataStore.AVAILABLE: 3, MetadataStore.RESERVED: 0, MetadataStore.MINTED: 2}
+
+def test_reclaims_nfts_drawn_before_a_crash(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    store_file = os.path.join(vm_test_config.root_dir, 'metadata.db')
+    blockfrost_api = OfflineBlockfrostApi()
+    payment = blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    def vending_machine():
+        mint = Mint(TANGZ_POLICY, MINT_PRICE, 0, vm_test_config.metadata_dir, simple_script, '/path/to/policy.skey', NoWhitelist(), metadata_store_file=store_file)
+        journal = VendJournal(os.path.join(vm_test_config.root_dir, 'journal.jsonl')).replay()
+        nft_vending_machine = NftVendingMachine(PAYMENT_ADDR, '/path/to/payment.skey', PROFIT_ADDR, True, 5, mint, blockfrost_api, offline_cardano_cli(request), journal=journal)
+        nft_vending_machine.validate()
+        return nft_vending_machine
+    crashed = vending_machine()
+    def crash(*args):
+        raise KeyboardInterrupt('Simulated crash')
+    monkeypatch.setattr(crashed.mint.inventory, 'read', crash)
+    try:
+        crashed.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, set())
+        assert False, 'Expected the simulated crash to escape vend'
+    except KeyboardInterrupt:
+        pass
+    crashed.journal.close()
+    assert crashed.mint.inventory.counts()[MetadataStore.RESERVED] == 1
+
+    restarted = vending_machine()
+    exclusions = set()
+    restarted.recover(exclusions)
+    assert restarted.mint.inventory.counts()[MetadataStore.RESERVED] == 1, 'Reclaimed a draw another process may still lock'
+    with sqlite3.connect(store_file) as conn:
+        conn.execute('UPDATE nfts SET changed_at = changed_at - 3600')
+    restarted.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions)
+    assert len(blockfrost_api.submitted) == 1
+    assert restarted.mint.inventory.counts() == {MetadataStore.AVAILABLE: 0, MetadataStore.RESERVED: 2, MetadataStore.MINTED: 0}
+    with sqlite3.connect(store_file) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM nfts WHERE locked_path IS NOT NULL').fetchone()[0] == 2, 'NFT drawn before the crash leaked from sale'
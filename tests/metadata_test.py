@@ -3,6 +3,7 @@ import os
 import shutil
 
 from test_utils.fs import data_file_path
+from test_utils.offline import stock_metadata
 from test_utils.vending_machine import vm_test_config, VendingMachineTestConfig
 
 from cardano.wt.mint import Mint
@@ -170,7 +171,7 @@ def test_rejects_lengthy_metadata(request, vm_test_config):
         mint.validate()
         assert False, 'Successfully validated mint with lengthy metadata'
     except ValueError as e:
-        assert "Encountered metadata value >64 chars 'This clothing explanation is way way way " in str(e)
+        assert "Encountered metadata value >64 bytes 'This clothing explanation is way way way " in str(e)
 
 def test_rejects_nested_lengthy_metadata(request, vm_test_config):
     simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
@@ -181,7 +182,7 @@ def test_rejects_nested_lengthy_metadata(request, vm_test_config):
         mint.validate()
         assert False, 'Successfully validated mint with nested lengthy metadata'
     except ValueError as e:
-        assert "Encountered metadata value >64 chars 'This is another really long explanation that should be detected" in str(e)
+        assert "Encountered metadata value >64 bytes 'This is another really long explanation that should be detected" in str(e)
 
 def test_rejects_array_lengthy_metadata(request, vm_test_config):
     simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
@@ -192,7 +193,29 @@ def test_rejects_array_lengthy_metadata(request, vm_test_config):
         mint.validate()
         assert False, 'Successfully validated mint with nested lengthy metadata'
     except ValueError as e:
-        assert "Encountered metadata value >64 chars 'This is an array really long explanation that should be detected" in str(e)
+        assert "Encountered metadata value >64 bytes 'This is an array really long explanation that should be detected" in str(e)
+
+def test_rejects_non_ascii_metadata_over_64_bytes(request, vm_test_config):
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    mint = Mint(TANGZ_POLICY, None, None, vm_test_config.metadata_dir, simple_script, None, NoWhitelist())
+    try:
+        bad_file = data_file_path(request, os.path.join('bad_format', 'non_ascii_lengthy_metadata.json'))
+        shutil.copy(bad_file, vm_test_config.metadata_dir)
+        mint.validate()
+        assert False, 'Successfully validated mint with 40 characters of non-ASCII metadata (76 bytes)'
+    except ValueError as e:
+        assert "Encountered metadata value >64 bytes 'Τίγρη με πορτοκαλί ρίγες και μαύρα μάτια' at WildTangz 456.clothing" in str(e)
+
+def test_rejects_boolean_metadata(request, vm_test_config):
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    mint = Mint(TANGZ_POLICY, None, None, vm_test_config.metadata_dir, simple_script, None, NoWhitelist())
+    try:
+        bad_file = data_file_path(request, os.path.join('bad_format', 'boolean_metadata.json'))
+        shutil.copy(bad_file, vm_test_config.metadata_dir)
+        mint.validate()
+        assert False, 'Successfully validated mint with boolean metadata'
+    except ValueError as e:
+        assert "Encountered metadata value of unsupported type bool 'True' at WildTangz 456.nested_metadata.animated" in str(e)
 
 def test_rejects_if_duplicate_names_in_dir(request, vm_test_config):
     simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
@@ -205,3 +228,54 @@ def test_rejects_if_duplicate_names_in_dir(request, vm_test_config):
         assert False, 'Successfully validated mint with overlapping asset names'
     except ValueError as e:
         assert "Found duplicate asset name 'WildTangz 1'" in str(e)
+
+def test_parallel_validation_matches_serial(request, vm_test_config):
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 21))
+    serial = Mint(TANGZ_POLICY, None, None, vm_test_config.metadata_dir, simple_script, None, NoWhitelist())
+    serial.validate()
+    parallel = Mint(TANGZ_POLICY, None, None, vm_test_config.metadata_dir, simple_script, None, NoWhitelist(), validation_workers=3)
+    parallel.validate()
+    assert parallel.validated_names == serial.validated_names
+    assert parallel.asset_index == serial.asset_index
+
+def test_parallel_validation_names_offending_file(request, vm_test_config):
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 21))
+    shutil.copy(data_file_path(request, os.path.join('bad_format', 'policy_extra.json')), vm_test_config.metadata_dir)
+    mint = Mint(TANGZ_POLICY, None, None, vm_test_config.metadata_dir, simple_script, None, NoWhitelist(), validation_workers=3)
+    try:
+        mint.validate()
+        assert False, 'Successfully validated mint with multiple policy ids across workers'
+    except ValueError as e:
+        assert "found in file 'policy_extra.json'" in str(e)
+    os.remove(os.path.join(vm_test_config.metadata_dir, 'policy_extra.json'))
+    shutil.copy(os.path.join(vm_test_config.metadata_dir, 'WildTangz 1.json'), os.path.join(vm_test_config.metadata_dir, 'dupe.json'))
+    try:
+        mint.validate()
+        assert False, 'Successfully validated mint with overlapping asset names across workers'
+    except ValueError as e:
+        assert "Found duplicate asset name 'WildTangz 1'" in str(e)
+
+def test_lengthy_metadata_error_names_path_and_file(request, vm_test_config):
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    mint = Mint(TANGZ_POLICY, None, None, vm_test_config.metadata_dir, simple_script, None, NoWhitelist())
+    shutil.copy(data_file_path(request, os.path.join('bad_format', 'array_lengthy_metadata.json')), vm_test_config.metadata_dir)
+    try:
+        mint.validate()
+        assert False, 'Successfully validated mint with nested lengthy metadata'
+    except ValueError as e:
+        assert "at WildTangz 456.nested_metadata.boo[0] in file 'array_lengthy_metadata.json'" in str(e)
+
+def test_duplicate_error_names_both_files(request, vm_test_config):
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    mint = Mint(TANGZ_POLICY, None, None, vm_test_config.metadata_dir, simple_script, None, NoWhitelist())
+    good_file = data_file_path(request, os.path.join('success', 'WildTangz 1.json'))
+    for filename in ['first.json', 'second.json']:
+        shutil.copy(good_file, os.path.join(vm_test_config.metadata_dir, filename))
+    try:
+        mint.validate()
+        assert False, 'Successfully validated mint with overlapping asset names'
+    except ValueError as e:
+        assert "Found duplicate asset name 'WildTangz 1' in file '" in str(e)
+        assert "first.json" in str(e) and "second.json" in str(e)
@@ -0,0 +1,122 @@
+import json
+import os
+
+from test_utils.offline import OfflineBlockfrostApi, PAYMENT_ADDR, PROFIT_ADDR, offline_cardano_cli, offline_mint, stock_metadata
+from test_utils.vending_machine import VendingMachineTestConfig, vm_test_config
+
+from cardano.wt.blockfrost import BlockfrostApi
+from cardano.wt.coordinator import VendCoordinator
+from cardano.wt.multi_collection import CollectionRunner
+from cardano.wt.nft_vending_machine import NftVendingMachine
+from cardano.wt.poll_scheduler import PollScheduler
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+EXTRA_PAYMENT_ADDR = 'addr_test1vqxsvz7lsnwr7jfqusnmcwxguk6qq4v6ze83vz7sz9z5cgqd7v6zu'
+MINT_PRICE = 15000000
+SINGLE_VEND_MAX = 5
+
+def collection_for(request, name, test_config, payment_addr, blockfrost_api, cardano_cli, profit_addr=PROFIT_ADDR):
+    stock_metadata(request, test_config.metadata_dir, range(1, 6))
+    mint = offline_mint(request, test_config.metadata_dir, MINT_PRICE, NoWhitelist())
+    machine = NftVendingMachine(payment_addr, '/path/to/payment.skey', profit_addr, True, SINGLE_VEND_MAX, mint, blockfrost_api, cardano_cli)
+    return CollectionRunner.Collection(name, VendCoordinator([machine]), test_config.root_dir, [set()], [PollScheduler()])
+
+def test_collections_vend_from_shared_client(request, vm_test_config):
+    blockfrost_api = OfflineBlockfrostApi()
+    cardano_cli = offline_cardano_cli(request)
+    other_config = VendingMachineTestConfig()
+    blockfrost_api.pay('01' * 32, 2 * MINT_PRICE)
+    blockfrost_api.pay('02' * 32, MINT_PRICE, payment_addr=EXTRA_PAYMENT_ADDR)
+    blockfrost_api.pay('03' * 32, MINT_PRICE, payment_addr=EXTRA_PAYMENT_ADDR)
+    runner = CollectionRunner([
+        collection_for(request, 'first', vm_test_config, PAYMENT_ADDR, blockfrost_api, cardano_cli),
+        collection_for(request, 'second', other_config, EXTRA_PAYMENT_ADDR, blockfrost_api, cardano_cli)
+    ])
+    assert runner.validate() == ['first', 'second']
+    assert runner.vend('locked', 'in_proc') == {'first': 1, 'second': 2}
+    assert len(os.listdir(vm_test_config.locked_dir)) == 2
+    assert len(os.listdir(other_config.locked_dir)) == 2
+    assert len(blockfrost_api.submitted) == 3
+
+def test_failing_collection_is_isolated(request, vm_test_config):
+    blockfrost_api = OfflineBlockfrostApi()
+    cardano_cli = offline_cardano_cli(request)
+    blockfrost_api.pay('01' * 32, MINT_PRICE)
+    runner = CollectionRunner([
+        collection_for(request, 'healthy', vm_test_config, PAYMENT_ADDR, blockfrost_api, cardano_cli),
+        collection_for(request, 'broken', VendingMachineTestConfig(), EXTRA_PAYMENT_ADDR, blockfrost_api, cardano_cli, profit_addr=EXTRA_PAYMENT_ADDR)
+    ])
+    assert runner.validate() == ['healthy']
+    assert 'cannot be the same' in runner.failed['broken']
+    assert runner.vend('locked', 'in_proc') == {'healthy': 1}
+
+def test_rate_limiter_spaces_out_calls():
+    now = [0.0]
+    sleeps = []
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+    rate_limiter = BlockfrostApi.RateLimiter(2, clock=lambda: now[0], sleep=sleep)
+    for call in range(4):
+        rate_limiter.acquire()
+    assert sleeps == [0.5, 0.5] and rate_limiter.waits == 2
+    now[0] += 10
+    rate_limiter.acquire()
+    assert len(sleeps) == 2
+
+def write_config(vm_test_config, collections):
+    config_file = os.path.join(vm_test_config.root_dir, 'collections.json')
+    with open(config_file, 'w') as config_filehandle:
+        json.dump({'blockfrost_project': 'preprodXXXX', 'output_dir': vm_test_config.root_dir, 'collections': collections}, config_filehandle)
+    return config_file
+
+def collection_config(name, payment_addr, **kwargs):
+    config = {
+        'name': name,
+        'output_dir': f"/tmp/{name}",
+        'payment_addr': payment_addr,
+        'payment_sign_key': '/path/to/payment.skey',
+        'profit_addr': PROFIT_ADDR,
+        'mint_policy': 'policy',
+        'mint_script_file': '/path/to/policy.script',
+        'mint_sign_key': '/path/to/policy.skey',
+        'metadata_dir': f"/tmp/{name}/nfts",
+        'single_vend_max': SINGLE_VEND_MAX,
+        'mint_price': MINT_PRICE
+    }
+    config.update(kwargs)
+    return config
+
+def test_read_config_fills_defaults(vm_test_config):
+    config = CollectionRunner.read_config(write_config(vm_test_config, [collection_config('first', PAYMENT_ADDR), collection_config('second', EXTRA_PAYMENT_ADDR)]))
+    assert config['api_calls_per_sec'] == 10 and not config['mainnet']
+    assert [collection['vend_randomly'] for collection in config['collections']] == [False, False]
+    assert [(collection['batch_buyers_max'], collection['lease_slots'], collection['refunds']) for collection in config['collections']] == [(1, None, False), (1, None, False)]
+
+def test_read_config_rejects_bad_collections(vm_test_config):
+    for collections, message in [
+        ([collection_config('first', PAYMENT_ADDR), collection_config('second', PAYMENT_ADDR)], "share a 'payment_addr'"),
+        ([collection_config('first', PAYMENT_ADDR, free_mint=True)], "exactly one of 'mint_price' or 'free_mint'"),
+        ([{'name': 'first'}], 'is missing'),
+        ([collection_config('first', PAYMENT_ADDR, extra_payment=[[EXTRA_PAYMENT_ADDR, '/path/to/extra.skey']])], "unsupported setting(s) ['extra_payment']"),
+        ([collection_config('first', PAYMENT_ADDR, cli_workers=4)], "unsupported setting(s) ['cli_workers']"),
+        ([], 'at least one collection')
+    ]:
+        try:
+            CollectionRunner.read_config(write_config(vm_test_config, collections))
+            assert False, f"Expected config to be rejected with '{message}'"
+        except ValueError as e:
+            assert message in str(e)
+
+def test_read_config_rejects_unsupported_shared_settings(vm_test_config):
+    config_file = write_config(vm_test_config, [collection_config('first', PAYMENT_ADDR)])
+    with open(config_file, 'r') as config_filehandle:
+        config = json.load(config_filehandle)
+    config['lease_slots'] = 600
+    with open(config_file, 'w') as config_filehandle:
+        json.dump(config, config_filehandle)
+    try:
+        CollectionRunner.read_config(config_file)
+        assert False, 'Expected a per-collection setting at the top level to be rejected'
+    except ValueError as e:
+        assert "unsupported shared setting(s) ['lease_slots']" in str(e)
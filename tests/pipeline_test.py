@@ -0,0 +1,88 @@
+import threading
+import time
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.pipeline import Pipeline
+
+def test_single_workers_preserve_order():
+    results = []
+    pipeline = Pipeline([
+        Pipeline.Stage('double', lambda item, emit: emit(item * 2)),
+        Pipeline.Stage('collect', lambda item, emit: results.append(item))
+    ], queue_size=1)
+    pipeline.run(range(100))
+    assert results == [item * 2 for item in range(100)]
+
+def test_flush_releases_held_items():
+    held = []
+    results = []
+    def hold(item, emit):
+        held.append(item)
+        if len(held) == 3:
+            emit(list(held))
+            held.clear()
+    def flush(emit):
+        if held:
+            emit(list(held))
+    pipeline = Pipeline([
+        Pipeline.Stage('batch', hold, flush=flush),
+        Pipeline.Stage('collect', lambda item, emit: results.append(item), workers=2)
+    ])
+    pipeline.run(range(7))
+    assert sorted(results) == [[0, 1, 2], [3, 4, 5], [6]]
+
+def test_workers_overlap_slow_stages():
+    active = [0, 0]
+    active_lock = threading.Lock()
+    def slow(item, emit):
+        with active_lock:
+            active[0] += 1
+            active[1] = max(active)
+        time.sleep(0.05)
+        with active_lock:
+            active[0] -= 1
+        emit(item)
+    results = []
+    pipeline = Pipeline([
+        Pipeline.Stage('slow', slow, workers=4),
+        Pipeline.Stage('collect', lambda item, emit: results.append(item))
+    ])
+    pipeline.run(range(8))
+    assert sorted(results) == list(range(8))
+    assert active[1] > 1, 'Expected slow stage workers to run concurrently'
+
+def test_uncaught_errors_do_not_stall():
+    results = []
+    def picky(item, emit):
+        if item % 2:
+            raise ValueError(f"Odd item {item}")
+        emit(item)
+    pipeline = Pipeline([
+        Pipeline.Stage('picky', picky, workers=3),
+        Pipeline.Stage('collect', lambda item, emit: results.append(item))
+    ])
+    pipeline.run(range(6))
+    assert sorted(results) == [0, 2, 4]
+    assert len(pipeline.errors) == 3
+
+def test_profiles_every_stage_call():
+    profiler = CardanoCli.Profiler()
+    def picky(item, emit):
+        if item == 3:
+            raise ValueError(f"Bad item {item}")
+        emit(item)
+    pipeline = Pipeline([
+        Pipeline.Stage('picky', picky, workers=2),
+        Pipeline.Stage('collect', lambda item, emit: None)
+    ], profiler=profiler)
+    pipeline.run(range(5))
+    stats = profiler.snapshot()
+    assert (stats['picky']['count'], stats['picky']['failures']) == (5, 1)
+    assert (stats['collect']['count'], stats['collect']['failures']) == (4, 0)
+
+def test_rejects_workerless_stage():
+    try:
+        Pipeline.Stage('empty', lambda item, emit: None, workers=0)
+        assert False, 'Expected a stage without workers to be rejected'
+    except ValueError as e:
+        assert 'at least one worker' in str(e)
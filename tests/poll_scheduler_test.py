@@ -0,0 +1,24 @@
+from cardano.wt.poll_scheduler import PollScheduler
+
+def test_repolls_immediately_with_backlog():
+    poll_scheduler = PollScheduler(min_wait=5, max_wait=120)
+    assert poll_scheduler.next_wait(30, True) == 0
+
+def test_backs_off_while_idle_up_to_ceiling():
+    poll_scheduler = PollScheduler(min_wait=5, max_wait=30, backoff_factor=2)
+    assert [poll_scheduler.next_wait(0, False) for i in range(6)] == [5, 10, 20, 30, 30, 30]
+
+def test_snaps_back_on_first_payment():
+    poll_scheduler = PollScheduler(min_wait=5, max_wait=120, backoff_factor=2)
+    for i in range(10):
+        poll_scheduler.next_wait(0, False)
+    assert poll_scheduler.next_wait(1, False) == 5
+    assert poll_scheduler.next_wait(0, False) == 5
+
+def test_rejects_bad_bounds():
+    for kwargs, message in [({'min_wait': 0}, 'must be positive'), ({'min_wait': 10, 'max_wait': 5}, 'below the minimum'), ({'backoff_factor': 0.5}, 'at least 1')]:
+        try:
+            PollScheduler(**kwargs)
+            assert False, f"Expected {kwargs} to be rejected"
+        except ValueError as e:
+            assert message in str(e)
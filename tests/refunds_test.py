@@ -0,0 +1,82 @@
+import os
+
+from test_utils.fs import protocol_file_path
+from test_utils.offline import BUYER_ADDR, OfflineBlockfrostApi, PAYMENT_ADDR, PROFIT_ADDR, TANGZ_POLICY, offline_mint, stock_metadata
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.journal import VendJournal
+from cardano.wt.nft_vending_machine import NftVendingMachine
+from cardano.wt.refunds import RefundEngine
+from cardano.wt.simulation import InMemoryCardanoCli
+from cardano.wt.utxo import Utxo
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+OTHER_ADDR = 'addr_test1vz4j3cq3xw6mm0ux5kj0wln2nj5rqpd7cydh4ucvg0lv5cgk3q2x2xxxxxx'
+
+def refund_engine_for(request, tmp_path, blockfrost_api, **kwargs):
+    journal = VendJournal(os.path.join(tmp_path, 'refund_journal.jsonl')).replay()
+    os.makedirs(os.path.join(tmp_path, 'txn'), exist_ok=True)
+    cardano_cli = InMemoryCardanoCli(protocol_params=protocol_file_path(request, 'preprod.json'))
+    return RefundEngine(PAYMENT_ADDR, '/path/to/payment.skey', blockfrost_api, cardano_cli, journal, **kwargs)
+
+def refunded_outputs(refund_engine, blockfrost_api):
+    outputs = {}
+    for signed_file in blockfrost_api.submitted:
+        for tx_out in refund_engine.cardano_cli.signed_outputs[signed_file]:
+            tokens = tx_out.split('+')
+            outputs[tokens[0]] = [int(tokens[1])] + tokens[2:]
+    return outputs
+
+def test_batches_refunds_one_output_per_sender(request, tmp_path):
+    blockfrost_api = OfflineBlockfrostApi()
+    rejected = [blockfrost_api.pay('aa' * 32, 2000000), blockfrost_api.pay('bb' * 32, 3000000), blockfrost_api.pay('cc' * 32, 4000000, sender=OTHER_ADDR)]
+    refund_engine = refund_engine_for(request, tmp_path, blockfrost_api, max_wait=0)
+    for utxo in rejected:
+        refund_engine.enqueue(utxo, 'too little lovelace')
+    assert refund_engine.refund(tmp_path) == 3
+    assert len(blockfrost_api.submitted) == 1
+    outputs = refunded_outputs(refund_engine, blockfrost_api)
+    fee = refund_engine.journal.vends[VendJournal.key_of(rejected[0])]['fee']
+    assert outputs[BUYER_ADDR][0] + outputs[OTHER_ADDR][0] == 9000000 - fee
+    assert abs(outputs[BUYER_ADDR][0] - 5000000 - (outputs[OTHER_ADDR][0] - 4000000)) <= 1
+    assert refund_engine.refund(tmp_path) == 0 and len(blockfrost_api.submitted) == 1
+
+    blockfrost_api.utxos = []
+    refund_engine.refund(tmp_path)
+    assert refund_engine.pending() == 0
+
+def test_returns_native_tokens_proportionally(request, tmp_path):
+    blockfrost_api = OfflineBlockfrostApi()
+    token_payment = blockfrost_api.pay('aa' * 32, 5000000)
+    token_payment.balances.append(Utxo.Balance(1, f"{TANGZ_POLICY}{'WildTangz 1'.encode('UTF-8').hex()}"))
+    lovelace_payment = blockfrost_api.pay('bb' * 32, 15000000, sender=OTHER_ADDR)
+    refund_engine = refund_engine_for(request, tmp_path, blockfrost_api, fee_policy=RefundEngine.FEE_PROPORTIONAL, max_wait=0)
+    refund_engine.enqueue(token_payment, 'non-lovelace balances')
+    refund_engine.enqueue(lovelace_payment, 'minUTxO error')
+    refund_engine.refund(tmp_path)
+    outputs = refunded_outputs(refund_engine, blockfrost_api)
+    assert outputs[BUYER_ADDR][1:] == [f"1 {TANGZ_POLICY}.{'WildTangz 1'.encode('UTF-8').hex()}"]
+    assert (15000000 - outputs[OTHER_ADDR][0]) > 2 * (5000000 - outputs[BUYER_ADDR][0])
+
+def test_waits_for_full_batch_and_abandons_dust(request, tmp_path):
+    blockfrost_api = OfflineBlockfrostApi()
+    refund_engine = refund_engine_for(request, tmp_path, blockfrost_api, batch_max=3)
+    dust = blockfrost_api.pay('aa' * 32, 1000000)
+    refund_engine.enqueue(dust, 'too little lovelace')
+    assert refund_engine.refund(tmp_path) == 0 and refund_engine.pending() == 1
+    assert refund_engine.refund(tmp_path, force=True) == 0
+    assert refund_engine.journal.state_of(dust) == VendJournal.FAILED
+    assert not blockfrost_api.submitted
+
+def test_vending_machine_queues_rejected_payments(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    blockfrost_api.pay('aa' * 32, 5000000)
+    refund_engine = refund_engine_for(request, vm_test_config.root_dir, blockfrost_api, max_wait=0)
+    mint = offline_mint(request, vm_test_config.metadata_dir, 15000000, NoWhitelist())
+    nft_vending_machine = NftVendingMachine(PAYMENT_ADDR, '/path/to/payment.skey', PROFIT_ADDR, False, 5, mint, blockfrost_api, refund_engine.cardano_cli, refund_engine=refund_engine)
+    nft_vending_machine.validate()
+    nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, set())
+    assert len(blockfrost_api.submitted) == 1
+    assert refunded_outputs(refund_engine, blockfrost_api)[BUYER_ADDR][1:] == []
+    assert len(os.listdir(vm_test_config.metadata_dir)) == 2
@@ -0,0 +1,52 @@
+import json
+import os
+
+from cardano.wt.retry import RetryScheduler
+
+class FakeClock(object):
+
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+def test_backoff_doubles_up_to_max():
+    retry_scheduler = RetryScheduler(max_attempts=10, base_delay=15, max_delay=100)
+    assert [retry_scheduler.delay_for(attempts) for attempts in range(1, 6)] == [15, 30, 60, 100, 100]
+
+def test_failed_utxo_waits_its_turn():
+    clock = FakeClock()
+    retry_scheduler = RetryScheduler(base_delay=10, clock=clock)
+    assert retry_scheduler.failed('utxo#0', ValueError('flaky')) == 10
+    assert not retry_scheduler.is_due('utxo#0')
+    assert retry_scheduler.is_due('utxo#1')
+    clock.now = 10
+    assert retry_scheduler.is_due('utxo#0')
+    assert retry_scheduler.failed('utxo#0', ValueError('flaky')) == 20
+    assert retry_scheduler.attempts('utxo#0') == 2
+    retry_scheduler.succeeded('utxo#0')
+    assert retry_scheduler.is_due('utxo#0') and not retry_scheduler.waiting()
+
+def test_dead_letters_after_max_attempts(tmp_path):
+    dead_letter_file = os.path.join(tmp_path, 'dead_letters.jsonl')
+    retry_scheduler = RetryScheduler(max_attempts=2, dead_letter_file=dead_letter_file, clock=FakeClock())
+    assert retry_scheduler.failed('utxo#0', ValueError('flaky')) is not None
+    assert retry_scheduler.failed('utxo#0', ValueError('flaky')) is None
+    assert retry_scheduler.is_due('utxo#0') and not retry_scheduler.waiting()
+    with open(dead_letter_file, 'r') as dead_letter_filehandle:
+        dead_letters = [json.loads(line) for line in dead_letter_filehandle]
+    assert dead_letters == retry_scheduler.dead_letters
+    assert dead_letters[0]['attempts'] == 2 and 'flaky' in dead_letters[0]['error']
+
+def test_unretryable_failures_dead_letter_immediately():
+    retry_scheduler = RetryScheduler()
+    assert retry_scheduler.failed('utxo#0', ValueError('submitted'), retryable=False) is None
+    assert len(retry_scheduler.dead_letters) == 1
+
+def test_rejects_zero_attempts():
+    try:
+        RetryScheduler(max_attempts=0)
+        assert False, 'Expected a retry scheduler without attempts to be rejected'
+    except ValueError as e:
+        assert 'at least one attempt' in str(e)
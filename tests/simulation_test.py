@@ -0,0 +1,64 @@
+import os
+
+from test_utils.offline import PAYMENT_ADDR, PROFIT_ADDR, TANGZ_POLICY, offline_mint, stock_metadata
+from test_utils.fs import protocol_file_path
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.nft_vending_machine import NftVendingMachine
+from cardano.wt.simulation import InMemoryCardanoCli, Simulation, SimulatedChain
+from cardano.wt.whitelist.asset_whitelist import SingleUseWhitelist
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+MINT_PRICE = 15000000
+SINGLE_VEND_MAX = 5
+
+def simulated_machine(request, vm_test_config, whitelist, **kwargs):
+    mint = offline_mint(request, vm_test_config.metadata_dir, MINT_PRICE, whitelist)
+    cardano_cli = InMemoryCardanoCli(protocol_params=protocol_file_path(request, 'preprod.json'))
+    chain = SimulatedChain()
+    nft_vending_machine = NftVendingMachine(PAYMENT_ADDR, '/path/to/payment.skey', PROFIT_ADDR, False, SINGLE_VEND_MAX, mint, chain, cardano_cli, **kwargs)
+    nft_vending_machine.validate()
+    return nft_vending_machine, chain
+
+def simulate(nft_vending_machine, chain, vm_test_config, payments, **kwargs):
+    simulation = Simulation(nft_vending_machine, chain, payments, **kwargs)
+    return simulation.run(vm_test_config.root_dir, os.path.basename(vm_test_config.locked_dir), os.path.basename(vm_test_config.txn_metadata_dir))
+
+def test_reports_throughput_and_end_state(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 21))
+    nft_vending_machine, chain = simulated_machine(request, vm_test_config, NoWhitelist())
+    payments = Simulation.synthetic_payments(8, MINT_PRICE, 3, num_senders=3, seed=7)
+    report = simulate(nft_vending_machine, chain, vm_test_config, payments, payments_per_cycle=3)
+    paid_for = sum([lovelace for lovelace, sender, assets in payments]) // MINT_PRICE
+    assert report['cycles'] == 4 and report['requests'] == 8 and report['vends'] == 8
+    assert report['nfts_minted'] == paid_for == report['locked_remaining']
+    assert report['inventory_remaining'] == 20 - paid_for
+    assert report['profit_lovelace'] > 0 and report['vends_per_sec'] > 0
+    for stage in ['vend_cycle', 'lookup', 'reserve', 'build', 'submit']:
+        assert report['stages'][stage]['count'] > 0, f"Missing latency for stage {stage}"
+    assert report['stages']['submit']['count'] == 8
+    for call in ['get_utxos', 'get_tx_utxos', 'submit_txn', 'build-raw', 'calculate-min-fee', 'sign']:
+        assert report['calls'][call]['count'] > 0, f"Missing latency for call {call}"
+        assert not call in report['stages']
+
+def test_reports_pipeline_stage_latency(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 11))
+    nft_vending_machine, chain = simulated_machine(request, vm_test_config, NoWhitelist(), batch_buyers_max=2, lookup_workers=2)
+    payments = Simulation.synthetic_payments(4, MINT_PRICE, 1, seed=3)
+    report = simulate(nft_vending_machine, chain, vm_test_config, payments)
+    assert report['vends'] == 4 and report['txns_submitted'] == 2
+    assert [report['stages'][stage]['count'] for stage in ['lookup', 'reserve', 'build', 'submit']] == [4, 4, 2, 2]
+
+def test_consumes_whitelist_for_real(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 11))
+    os.mkdir(vm_test_config.whitelist_dir)
+    os.mkdir(vm_test_config.consumed_dir)
+    whitelist_assets = [f"{TANGZ_POLICY}{idx:02x}" for idx in range(2)]
+    for asset in whitelist_assets:
+        open(os.path.join(vm_test_config.whitelist_dir, asset), 'w').close()
+    whitelist = SingleUseWhitelist(vm_test_config.whitelist_dir, vm_test_config.consumed_dir)
+    nft_vending_machine, chain = simulated_machine(request, vm_test_config, whitelist)
+    payments = Simulation.synthetic_payments(3, MINT_PRICE, 3, whitelist_assets=whitelist_assets, seed=1)
+    report = simulate(nft_vending_machine, chain, vm_test_config, payments)
+    assert report['vends'] == 3 and report['nfts_minted'] == 2
+    assert sorted(os.listdir(vm_test_config.consumed_dir)) == whitelist_assets
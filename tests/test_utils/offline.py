@@ -0,0 +1,70 @@
+import json
+import os
+
+from test_utils.fs import data_file_path, protocol_file_path
+
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.fake_cardano_cli import FakeCardanoCli
+from cardano.wt.mint import Mint
+from cardano.wt.utxo import Utxo
+
+BUYER_ADDR = 'addr_test1qz2fxv2umyhttkxyxp8x0dlpdt3k6cwng5pxj3jhsydzer3jcu5d8ps7zex2k2xt3uqxgjqnnj83ws8lhrn648jjxtwq2ytjqp'
+PAYMENT_ADDR = 'addr_test1vrce7uwk8vcva5j4dmehrxprwy57x20yaz9cv9vqzjutnnsrgrfey'
+PROFIT_ADDR = 'addr_test1vz4j3cq3xw6mm0ux5kj0wln2nj5rqpd7cydh4ucvg0lv5cgk3q2x2'
+TANGZ_POLICY = '33568ad11f93b3e79ae8dee5ad928ded72adcea719e92108caf1521b'
+
+"""
+In-memory stand-in for the parts of BlockfrostApi that the vending machine
+touches so vends can be exercised without network access.
+"""
+class OfflineBlockfrostApi(object):
+
+    def __init__(self):
+        self.utxos = []
+        self.utxo_addrs = {}
+        self.tx_utxos = {}
+        self.txns = {}
+        self.submitted = []
+        self.slot = 0
+
+    def pay(self, tx_hash, lovelace, sender=BUYER_ADDR, ix=0, outputs=[], payment_addr=PAYMENT_ADDR, block_height=None):
+        utxo = Utxo(tx_hash, ix, [Utxo.Balance(lovelace, None)])
+        self.utxos.append(utxo)
+        self.utxo_addrs[utxo] = payment_addr
+        self.tx_utxos[tx_hash] = {
+            'inputs': [{'address': sender, 'reference': False, 'amount': [{'unit': 'lovelace', 'quantity': str(lovelace)}]}],
+            'outputs': outputs
+        }
+        self.txns[tx_hash] = {'hash': tx_hash, 'block_height': block_height if block_height is not None else len(self.txns), 'index': 0}
+        return utxo
+
+    def get_utxos(self, address, exclusions):
+        return [utxo for utxo in self.utxos if self.utxo_addrs[utxo] == address and utxo not in exclusions]
+
+    def get_latest_slot(self):
+        return self.slot
+
+    def get_txn(self, txn_hash):
+        return self.txns.get(txn_hash)
+
+    def get_tx_utxos(self, txn_hash):
+        return self.tx_utxos[txn_hash]
+
+    def submit_txn(self, signed_file):
+        self.submitted.append(signed_file)
+        return f"{len(self.submitted):064x}"
+
+def offline_cardano_cli(request, **kwargs):
+    return CardanoCli(protocol_params=protocol_file_path(request, 'preprod.json'), cli_path=FakeCardanoCli.command(), **kwargs)
+
+def stock_metadata(request, metadata_dir, serials, policy=TANGZ_POLICY):
+    for serial in serials:
+        asset_file = f"WildTangz {serial}.json"
+        with open(data_file_path(request, os.path.join('smoketest', asset_file)), 'r') as sample_metadata:
+            sample_json = json.load(sample_metadata)
+        with open(os.path.join(metadata_dir, asset_file), 'w') as metadata_out:
+            json.dump({'721': {policy: sample_json}}, metadata_out)
+
+def offline_mint(request, metadata_dir, price, whitelist, donation=0):
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    return Mint(TANGZ_POLICY, price, donation, metadata_dir, simple_script, '/path/to/policy.skey', whitelist)
@@ -0,0 +1,82 @@
+import json
+import os
+import pytest
+
+from test_utils.fs import data_file_path
+
+from cardano.wt import cbor
+from cardano.wt.txn_size import TxnSizeEstimator
+
+ENTERPRISE_ADDR = 'addr_test1vrce7uwk8vcva5j4dmehrxprwy57x20yaz9cv9vqzjutnnsrgrfey'
+BASE_ADDR = 'addr1qx2skanhkpgdhcyxnczydg3meqcv87z4vep7u2drrr6277v5entql0xseq6a4zs8j524wvwv6k46kpf8pt9ejjk6l9gs4g94mf'
+MAX_TX_SIZE = 16384
+
+@pytest.mark.parametrize("value, expected", [
+    (0, '00'),
+    (23, '17'),
+    (24, '1818'),
+    (1000, '1903e8'),
+    (1000000, '1a000f4240'),
+    (-1, '20'),
+    (-1000, '3903e7'),
+    ('', '60'),
+    ('IETF', '6449455446'),
+    ('ü', '62c3bc'),
+    (b'\x01\x02\x03\x04', '4401020304'),
+    ([1, [2, 3], [4, 5]], '8301820203820405'),
+    ({'a': 1, 'b': [2, 3]}, 'a26161016162820203')
+])
+def test_cbor_matches_rfc_vectors(value, expected):
+    assert cbor.encode(value).hex() == expected
+
+def test_rejects_booleans():
+    try:
+        cbor.encode({'animated': True})
+        assert False, 'Encoded a boolean as metadata'
+    except ValueError as e:
+        assert "Cannot CBOR-encode metadata value of type <class 'bool'>: 'True'" in str(e)
+
+def test_metadata_labels_and_hex_strings():
+    encoded = cbor.encode_metadata_json({'721': {'name': '0xdeadbeef', 'id': '0xnothex'}})
+    assert encoded == cbor.encode({721: {'name': bytes.fromhex('deadbeef'), 'id': '0xnothex'}})
+
+def test_chunks_strings_over_64_bytes():
+    chunked = cbor.chunk_strings({'name': 'short', 'image': 'ipfs://' + 'Q' * 100, 'bio': 'ü' * 40, 'raw': b'\x01' * 65})
+    assert chunked['name'] == 'short'
+    assert chunked['image'] == ['ipfs://' + 'Q' * 57, 'Q' * 43]
+    assert chunked['bio'] == ['ü' * 32, 'ü' * 8]
+    assert chunked['raw'] == [b'\x01' * 64, b'\x01']
+
+def test_concatenated_fragments_match_metadata_encoding():
+    policy = 'ab' * 28
+    nfts = {'WildTangz 1': {'name': 'WildTangz 1', 'id': 1, 'tags': ['a', '0xdeadbeef']}, 'WildTangz 2': {'name': 'WildTangz 2'}}
+    fragments = [cbor.encode_nft_fragment(asset_name, metadata) for asset_name, metadata in nfts.items()]
+    assert cbor.encode_cip25_fragments(policy, fragments) == cbor.encode_metadata_json({'721': {policy: nfts}})
+
+def test_address_bytes():
+    assert TxnSizeEstimator.address_bytes(ENTERPRISE_ADDR) == 29
+    assert TxnSizeEstimator.address_bytes(BASE_ADDR) == 57
+
+def test_estimate_grows_with_each_nft(request):
+    estimator = TxnSizeEstimator(MAX_TX_SIZE, data_file_path(request, os.path.join('scripts', 'simple.script')))
+    sizes = []
+    for num_nfts in range(0, 5):
+        name_lens = [12] * num_nfts
+        outputs = [(BASE_ADDR, name_lens), (ENTERPRISE_ADDR, [])]
+        sizes.append(estimator.estimate(1, outputs, name_lens, 100 * num_nfts, 2))
+    assert sizes == sorted(sizes) and len(set(sizes)) == len(sizes), f"Estimates not strictly increasing: {sizes}"
+
+def test_rejects_bundles_over_max_tx_size(request):
+    estimator = TxnSizeEstimator(MAX_TX_SIZE, data_file_path(request, os.path.join('scripts', 'simple.script')))
+    outputs = [(BASE_ADDR, [12]), (ENTERPRISE_ADDR, [])]
+    assert estimator.fits(1, outputs, [12], 1000, 2)
+    assert not estimator.fits(1, outputs, [12], MAX_TX_SIZE, 2)
+
+def test_smoketest_bundle_size_is_realistic(request):
+    with open(data_file_path(request, os.path.join('smoketest', 'WildTangz 1.json')), 'r') as metadata_file:
+        metadata = json.load(metadata_file)
+    metadata_bytes = len(cbor.encode_metadata_json({'721': {'33568ad11f93b3e79ae8dee5ad928ded72adcea719e92108caf1521b': metadata}}))
+    estimator = TxnSizeEstimator(MAX_TX_SIZE, data_file_path(request, os.path.join('scripts', 'simple.script')))
+    outputs = [(BASE_ADDR, [11]), (ENTERPRISE_ADDR, [])]
+    estimate = estimator.estimate(1, outputs, [11], metadata_bytes, 2)
+    assert metadata_bytes < estimate < metadata_bytes + 1000, f"Estimate {estimate} is far from {metadata_bytes} bytes of metadata"
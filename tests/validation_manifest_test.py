@@ -0,0 +1,98 @@
+import json
+import os
+
+from test_utils.fs import data_file_path
+from test_utils.offline import TANGZ_POLICY, stock_metadata
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt.mint import Mint
+from cardano.wt.validation_manifest import ValidationManifest
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+def manifest_mint(request, vm_test_config, **kwargs):
+    simple_script = data_file_path(request, os.path.join('scripts', 'simple.script'))
+    manifest_file = os.path.join(vm_test_config.root_dir, 'validation_manifest.json')
+    return Mint(TANGZ_POLICY, None, None, vm_test_config.metadata_dir, simple_script, None, NoWhitelist(), manifest_file=manifest_file, **kwargs)
+
+def corrupt_in_place(path, mtime_ns=None):
+    """
+    Overwrite ``path`` with invalid JSON of the same size, optionally keeping
+    its mtime so that only a content check could notice
+    """
+    stat = os.stat(path)
+    with open(path, 'w') as file:
+        file.write('{' * stat.st_size)
+    if mtime_ns:
+        os.utime(path, ns=(stat.st_atime_ns, mtime_ns))
+
+def test_restart_trusts_unchanged_files(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 6))
+    first = manifest_mint(request, vm_test_config)
+    first.validate()
+    unchanged = os.path.join(vm_test_config.metadata_dir, 'WildTangz 1.json')
+    corrupt_in_place(unchanged, mtime_ns=os.stat(unchanged).st_mtime_ns)
+    restarted = manifest_mint(request, vm_test_config)
+    restarted.validate()
+    assert sorted(restarted.validated_names) == sorted(first.validated_names)
+    assert restarted.asset_index == first.asset_index
+    try:
+        manifest_mint(request, vm_test_config, full_revalidate=True).validate()
+        assert False, 'Full revalidation trusted the manifest'
+    except json.decoder.JSONDecodeError as e:
+        pass
+
+def test_restart_revalidates_changed_files(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 6))
+    manifest_mint(request, vm_test_config).validate()
+    changed = os.path.join(vm_test_config.metadata_dir, 'WildTangz 2.json')
+    corrupt_in_place(changed, mtime_ns=os.stat(changed).st_mtime_ns + 1)
+    try:
+        manifest_mint(request, vm_test_config).validate()
+        assert False, 'Trusted a file whose content changed'
+    except json.decoder.JSONDecodeError as e:
+        pass
+
+def test_touched_file_is_trusted_by_hash(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    mint = manifest_mint(request, vm_test_config)
+    mint.validate()
+    touched = os.path.join(vm_test_config.metadata_dir, 'WildTangz 1.json')
+    stat = os.stat(touched)
+    os.utime(touched, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    manifest = ValidationManifest(mint.manifest_file, TANGZ_POLICY, Mint.VALIDATION_RULES).load()
+    assert manifest.trusted_asset(vm_test_config.metadata_dir, 'WildTangz 1.json') == 'WildTangz 1'
+    assert ValidationManifest(mint.manifest_file, 'another_policy', Mint.VALIDATION_RULES).load().trusted_asset(vm_test_config.metadata_dir, 'WildTangz 1.json') is None
+
+def test_manifest_drops_vended_files(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 4))
+    mint = manifest_mint(request, vm_test_config)
+    mint.validate()
+    os.remove(os.path.join(vm_test_config.metadata_dir, 'WildTangz 3.json'))
+    mint.validate()
+    assert len(ValidationManifest(mint.manifest_file, TANGZ_POLICY, Mint.VALIDATION_RULES).load()) == 2
+
+def test_new_validation_rules_revalidate_every_file(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 4))
+    manifest_mint(request, vm_test_config).validate()
+    unchanged = os.path.join(vm_test_config.metadata_dir, 'WildTangz 1.json')
+    corrupt_in_place(unchanged, mtime_ns=os.stat(unchanged).st_mtime_ns)
+    monkeypatch.setattr(Mint, 'VALIDATION_RULES', Mint.VALIDATION_RULES + 1)
+    try:
+        manifest_mint(request, vm_test_config).validate()
+        assert False, 'Trusted a manifest written under older validation rules'
+    except json.decoder.JSONDecodeError as e:
+        pass
+
+def test_compiles_trusted_fragments_only_for_cbor_metadata(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    manifest_mint(request, vm_test_config).validate()
+    with open(os.path.join(vm_test_config.metadata_dir, 'WildTangz 1.json'), 'r') as file:
+        nft_metadata = json.load(file)['721'][TANGZ_POLICY]['WildTangz 1']
+    restarted = manifest_mint(request, vm_test_config, metadata_cbor=True)
+    restarted.validate()
+    fragment = restarted.indexed_fragment('WildTangz 1.json', 'WildTangz 1', nft_metadata)
+    assert fragment is restarted.indexed_fragment('WildTangz 1.json', 'WildTangz 1', {}), 'Trusted file was not precompiled'
+    without_cbor = manifest_mint(request, vm_test_config)
+    without_cbor.validate()
+    assert without_cbor.indexed_fragment('WildTangz 1.json', 'WildTangz 1', nft_metadata) == fragment
+    assert without_cbor.indexed_fragment('WildTangz 1.json', 'WildTangz 1', {}) != fragment, 'Kept a fragment without CBOR metadata'
@@ -0,0 +1,462 @@
+import glob
+import json
+import os
+import shutil
+import threading
+
+from test_utils.offline import OfflineBlockfrostApi, PAYMENT_ADDR, PROFIT_ADDR, TANGZ_POLICY, offline_cardano_cli, offline_mint, stock_metadata
+from test_utils.fs import protocol_file_path
+from test_utils.vending_machine import vm_test_config
+
+from cardano.wt import cbor
+from cardano.wt.artifact_store import ArtifactStore
+from cardano.wt.cardano_cli import CardanoCli
+from cardano.wt.exclusions import ExclusionTracker
+from cardano.wt.fairness import FairScheduler
+from cardano.wt.fee_cache import FeeCache
+from cardano.wt.journal import VendJournal
+from cardano.wt.leases import InventoryLeases
+from cardano.wt.nft_vending_machine import NftVendingMachine
+from cardano.wt.retry import RetryScheduler
+from cardano.wt.whitelist.asset_whitelist import SingleUseWhitelist
+from cardano.wt.whitelist.no_whitelist import NoWhitelist
+
+MINT_PRICE = 15000000
+SINGLE_VEND_MAX = 30
+
+def vending_machine_for(request, vm_test_config, blockfrost_api, whitelist=None, **kwargs):
+    mint = offline_mint(request, vm_test_config.metadata_dir, MINT_PRICE, whitelist if whitelist else NoWhitelist())
+    nft_vending_machine = NftVendingMachine(
+            PAYMENT_ADDR,
+            '/path/to/payment.skey',
+            PROFIT_ADDR,
+            False,
+            SINGLE_VEND_MAX,
+            mint,
+            blockfrost_api,
+            offline_cardano_cli(request),
+            **kwargs
+    )
+    nft_vending_machine.validate()
+    return nft_vending_machine
+
+def vend_once(nft_vending_machine, vm_test_config, exclusions):
+    nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions)
+
+def test_vends_everything_paid_for_without_size_limit(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, SINGLE_VEND_MAX + 1))
+    blockfrost_api = OfflineBlockfrostApi()
+    blockfrost_api.pay('aa' * 32, SINGLE_VEND_MAX * MINT_PRICE)
+    vend_once(vending_machine_for(request, vm_test_config, blockfrost_api), vm_test_config, set())
+    assert len(blockfrost_api.submitted) == 1
+    assert len(os.listdir(vm_test_config.locked_dir)) == SINGLE_VEND_MAX
+
+def test_trims_bundle_to_max_tx_size(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, SINGLE_VEND_MAX + 1))
+    blockfrost_api = OfflineBlockfrostApi()
+    blockfrost_api.pay('aa' * 32, SINGLE_VEND_MAX * MINT_PRICE)
+    vend_once(vending_machine_for(request, vm_test_config, blockfrost_api, max_tx_size=4096), vm_test_config, set())
+    num_locked = len(os.listdir(vm_test_config.locked_dir))
+    assert len(blockfrost_api.submitted) == 1
+    assert 0 < num_locked < SINGLE_VEND_MAX, f"Expected a partial vend under 4096 bytes, locked {num_locked}"
+    assert len(os.listdir(vm_test_config.metadata_dir)) == SINGLE_VEND_MAX - num_locked
+
+def pay_buyers(blockfrost_api, num_buyers, nfts_each):
+    for buyer in range(num_buyers):
+        blockfrost_api.pay(f"{buyer + 1:02x}" * 32, nfts_each * MINT_PRICE)
+
+def test_batches_buyers_into_one_txn(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 7))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 3, 2)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, batch_buyers_max=5)
+    vend_once(nft_vending_machine, vm_test_config, set())
+    assert len(blockfrost_api.submitted) == 1
+    assert len(os.listdir(vm_test_config.locked_dir)) == 6
+    assert nft_vending_machine.cli_stats()['sign']['count'] == 1
+
+def test_batches_capped_by_buyer_count(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 6))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 5, 1)
+    vend_once(vending_machine_for(request, vm_test_config, blockfrost_api, batch_buyers_max=2), vm_test_config, set())
+    assert len(blockfrost_api.submitted) == 3
+    assert len(os.listdir(vm_test_config.locked_dir)) == 5
+
+def test_batches_capped_by_max_tx_size(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 13))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 3, 4)
+    vend_once(vending_machine_for(request, vm_test_config, blockfrost_api, batch_buyers_max=3, max_tx_size=4096), vm_test_config, set())
+    assert 1 < len(blockfrost_api.submitted) <= 3, f"Expected bundles split across txns, got {len(blockfrost_api.submitted)}"
+    assert len(os.listdir(vm_test_config.locked_dir)) == 12
+
+def test_pipeline_vends_each_nft_once(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 21))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 10, 2)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, lookup_workers=4, submit_workers=2, batch_buyers_max=3)
+    vend_once(nft_vending_machine, vm_test_config, set())
+    assert len(blockfrost_api.submitted) == 4
+    assert len(os.listdir(vm_test_config.locked_dir)) == 20
+    assert not os.listdir(vm_test_config.metadata_dir)
+
+def test_pipeline_builds_on_cli_pool(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 5))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 4, 1)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, lookup_workers=2)
+    build_threads = set()
+    sign_txn = nft_vending_machine.cardano_cli.sign_txn
+    def recording_sign(signers, build_file):
+        build_threads.add(threading.current_thread().name)
+        return sign_txn(signers, build_file)
+    nft_vending_machine.cardano_cli.sign_txn = recording_sign
+    vend_once(nft_vending_machine, vm_test_config, set())
+    nft_vending_machine.cardano_cli.shutdown()
+    assert len(blockfrost_api.submitted) == 4
+    assert build_threads and all([name.startswith('cardano-cli') for name in build_threads])
+
+class FlakyBlockfrostApi(OfflineBlockfrostApi):
+
+    def __init__(self, flaky_hash, failures):
+        super().__init__()
+        self.flaky_hash = flaky_hash
+        self.failures = failures
+
+    def get_tx_utxos(self, txn_hash):
+        if txn_hash == self.flaky_hash and self.failures:
+            self.failures -= 1
+            raise ConnectionError(f"Flaky lookup of {txn_hash}")
+        return super().get_tx_utxos(txn_hash)
+
+def test_retries_failed_utxo_without_stalling_others(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 5))
+    blockfrost_api = FlakyBlockfrostApi('01' * 32, 1)
+    pay_buyers(blockfrost_api, 2, 2)
+    retry_scheduler = RetryScheduler(base_delay=0)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, retry_scheduler=retry_scheduler)
+    exclusions = set()
+    vend_once(nft_vending_machine, vm_test_config, exclusions)
+    assert len(blockfrost_api.submitted) == 1
+    assert len(exclusions) == 1 and retry_scheduler.waiting() == 1
+    vend_once(nft_vending_machine, vm_test_config, exclusions)
+    assert len(blockfrost_api.submitted) == 2
+    assert len(os.listdir(vm_test_config.locked_dir)) == 4
+    assert not retry_scheduler.waiting() and not retry_scheduler.dead_letters
+
+def test_releases_reserved_nfts_before_retry(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    retry_scheduler = RetryScheduler(max_attempts=1)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, retry_scheduler=retry_scheduler)
+    def failing_sign(signers, build_file):
+        raise OSError('cardano-cli crashed')
+    monkeypatch.setattr(nft_vending_machine.cardano_cli, 'sign_txn', failing_sign)
+    vend_once(nft_vending_machine, vm_test_config, set())
+    assert not blockfrost_api.submitted
+    assert not os.listdir(vm_test_config.locked_dir)
+    assert len(os.listdir(vm_test_config.metadata_dir)) == 2
+    assert len(nft_vending_machine.mint.inventory) == 2
+    assert len(retry_scheduler.dead_letters) == 1
+
+def test_reports_backlog_when_capped_per_cycle(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 4))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 3, 1)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, vends_per_cycle=2)
+    exclusions = set()
+    assert nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 2
+    assert nft_vending_machine.has_backlog()
+    assert nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 1
+    assert not nft_vending_machine.has_backlog()
+    assert nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 0
+
+def test_caps_requests_per_sender_each_cycle(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 5))
+    blockfrost_api = OfflineBlockfrostApi()
+    for whale_payment in range(3):
+        blockfrost_api.pay(f"{whale_payment + 1:02x}" * 32, MINT_PRICE, sender='addr_test_whale')
+    blockfrost_api.pay('ff' * 32, MINT_PRICE)
+    fair_scheduler = FairScheduler(FairScheduler.ROUND_ROBIN, per_address_cap=2)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, fair_scheduler=fair_scheduler)
+    exclusions = set()
+    assert nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 3
+    assert nft_vending_machine.has_backlog()
+    assert len(blockfrost_api.submitted) == 3
+    assert not blockfrost_api.utxos[2] in exclusions
+    assert nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 1
+    assert not nft_vending_machine.has_backlog()
+    assert len(os.listdir(vm_test_config.locked_dir)) == 4
+
+class CountingBlockfrostApi(OfflineBlockfrostApi):
+
+    def __init__(self):
+        super().__init__()
+        self.lookups = 0
+
+    def get_tx_utxos(self, txn_hash):
+        self.lookups += 1
+        return super().get_tx_utxos(txn_hash)
+
+class FeeTooSmallBlockfrostApi(OfflineBlockfrostApi):
+
+    def __init__(self, rejections):
+        super().__init__()
+        self.rejections = rejections
+
+    def submit_txn(self, signed_file):
+        if len(self.submitted) == 1 and self.rejections:
+            self.rejections -= 1
+            raise ValueError('ShelleyTxValidationError (FeeTooSmallUTxO (Coin 190000) (Coin 180000))')
+        return super().submit_txn(signed_file)
+
+def test_rebuilds_when_cached_fee_is_too_small(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = FeeTooSmallBlockfrostApi(1)
+    pay_buyers(blockfrost_api, 2, 1)
+    fee_cache = FeeCache(protocol_file_path(request, 'preprod.json'), bucket_bytes=4096, verify_every=0)
+    retry_scheduler = RetryScheduler(max_attempts=1)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, fee_cache=fee_cache, retry_scheduler=retry_scheduler)
+    vend_once(nft_vending_machine, vm_test_config, set())
+    assert len(blockfrost_api.submitted) == 2
+    assert not retry_scheduler.dead_letters
+    assert fee_cache.stats()['evictions'] == 1
+    assert nft_vending_machine.cli_stats()['calculate-min-fee']['count'] == 2
+
+def test_fair_scheduling_follows_chain_order_and_keeps_lookups(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 4))
+    blockfrost_api = CountingBlockfrostApi()
+    payments = [blockfrost_api.pay(f"{payment + 1:02x}" * 32, MINT_PRICE, block_height=10 - payment) for payment in range(3)]
+    fair_scheduler = FairScheduler(FairScheduler.FIFO)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, fair_scheduler=fair_scheduler, vends_per_cycle=1)
+    exclusions = set()
+    for vended in reversed(payments):
+        assert nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 1
+        assert vended in exclusions
+    assert blockfrost_api.lookups == 3
+
+def test_reuses_fees_for_same_shaped_txns(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 4))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 3, 1)
+    fee_cache = FeeCache(protocol_file_path(request, 'preprod.json'), bucket_bytes=4096, verify_every=0)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, fee_cache=fee_cache)
+    (built_sizes, keyed_sizes) = ([], [])
+    build_raw_mint_txn = nft_vending_machine.cardano_cli.build_raw_mint_txn
+    def recording_build(output_dir, txn_id, tx_in_args, tx_out_args, fee, *args, **kwargs):
+        build_file = build_raw_mint_txn(output_dir, txn_id, tx_in_args, tx_out_args, fee, *args, **kwargs)
+        if not fee:
+            built_sizes.append(CardanoCli.tx_body_size(build_file))
+        return build_file
+    key_for = fee_cache.key_for
+    def recording_key_for(tx_in_count, tx_out_count, witness_count, tx_size):
+        keyed_sizes.append(tx_size)
+        return key_for(tx_in_count, tx_out_count, witness_count, tx_size)
+    monkeypatch.setattr(nft_vending_machine.cardano_cli, 'build_raw_mint_txn', recording_build)
+    monkeypatch.setattr(fee_cache, 'key_for', recording_key_for)
+    vend_once(nft_vending_machine, vm_test_config, set())
+    cli_stats = nft_vending_machine.cli_stats()
+    assert len(blockfrost_api.submitted) == 3
+    assert cli_stats['calculate-min-fee']['count'] == 1
+    assert cli_stats['build-raw']['count'] == 6
+    assert fee_cache.stats()['hits'] == 2
+    assert len(keyed_sizes) == 3 and keyed_sizes == built_sizes
+
+def test_expired_lease_returns_nfts_and_revends(request, vm_test_config, monkeypatch):
+    wl_assets = [TANGZ_POLICY + '01', TANGZ_POLICY + '02']
+    os.makedirs(vm_test_config.whitelist_dir)
+    os.makedirs(vm_test_config.consumed_dir)
+    for wl_asset in wl_assets:
+        open(os.path.join(vm_test_config.whitelist_dir, wl_asset), 'w').close()
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE, outputs=[{'amount': [{'unit': wl_asset, 'quantity': '1'} for wl_asset in wl_assets]}])
+    blockfrost_api.slot = 1000
+    leases = InventoryLeases(ttl_slots=100)
+    whitelist = SingleUseWhitelist(vm_test_config.whitelist_dir, vm_test_config.consumed_dir)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, whitelist=whitelist, leases=leases)
+    exclusions = ExclusionTracker()
+    def lost_submit(signed_file):
+        raise ConnectionError('Submission timed out')
+    monkeypatch.setattr(blockfrost_api, 'submit_txn', lost_submit)
+    vend_once(nft_vending_machine, vm_test_config, exclusions)
+    monkeypatch.undo()
+    assert len(os.listdir(vm_test_config.locked_dir)) == 2 and len(leases) == 1
+    assert sorted(os.listdir(vm_test_config.consumed_dir)) == wl_assets
+
+    blockfrost_api.slot = 1099
+    assert nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 0
+    blockfrost_api.slot = 1100
+    assert nft_vending_machine.vend(vm_test_config.root_dir, vm_test_config.locked_dir, vm_test_config.txn_metadata_dir, exclusions) == 1
+    assert len(blockfrost_api.submitted) == 1 and len(leases) == 1
+    assert len(os.listdir(vm_test_config.locked_dir)) == 2, 'Whitelisted payment was not vended again'
+    assert sorted(os.listdir(vm_test_config.consumed_dir)) == wl_assets
+
+    blockfrost_api.utxos = []
+    vend_once(nft_vending_machine, vm_test_config, exclusions)
+    assert len(leases) == 0 and len(os.listdir(vm_test_config.locked_dir)) == 2
+
+def journal_for(vm_test_config):
+    return VendJournal(os.path.join(vm_test_config.root_dir, 'vend_journal.jsonl')).replay()
+
+def crash_vend(nft_vending_machine, vm_test_config, monkeypatch, target, name):
+    def crash(*args):
+        raise KeyboardInterrupt('Simulated crash')
+    monkeypatch.setattr(target, name, crash)
+    try:
+        vend_once(nft_vending_machine, vm_test_config, set())
+        assert False, 'Expected the simulated crash to escape vend'
+    except KeyboardInterrupt:
+        pass
+    monkeypatch.undo()
+    nft_vending_machine.journal.close()
+
+def test_recovery_rolls_back_reserved_vend(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    crashed = vending_machine_for(request, vm_test_config, blockfrost_api, journal=journal_for(vm_test_config))
+    crash_vend(crashed, vm_test_config, monkeypatch, crashed.cardano_cli, 'sign_txn')
+    assert len(os.listdir(vm_test_config.locked_dir)) == 2
+
+    restarted = vending_machine_for(request, vm_test_config, blockfrost_api, journal=journal_for(vm_test_config))
+    exclusions = set()
+    restarted.recover(exclusions)
+    assert not exclusions and not os.listdir(vm_test_config.locked_dir)
+    assert len(restarted.mint.inventory) == 2
+    vend_once(restarted, vm_test_config, exclusions)
+    assert len(blockfrost_api.submitted) == 1
+    assert len(os.listdir(vm_test_config.locked_dir)) == 2
+
+def test_recovery_resubmits_built_vend_once(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    payment = blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    crashed = vending_machine_for(request, vm_test_config, blockfrost_api, journal=journal_for(vm_test_config))
+    crash_vend(crashed, vm_test_config, monkeypatch, blockfrost_api, 'submit_txn')
+
+    restarted = vending_machine_for(request, vm_test_config, blockfrost_api, journal=journal_for(vm_test_config))
+    exclusions = set()
+    restarted.recover(exclusions)
+    assert exclusions == set([payment])
+    assert len(blockfrost_api.submitted) == 1
+    assert restarted.journal.state_of(payment) == VendJournal.SUBMITTED
+
+    vend_once(restarted, vm_test_config, exclusions)
+    assert len(blockfrost_api.submitted) == 1
+    blockfrost_api.utxos.remove(payment)
+    vend_once(restarted, vm_test_config, exclusions)
+    assert restarted.journal.state_of(payment) is None
+
+def test_recovery_resubmits_durable_copy_of_hot_signed_txn(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    payment = blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    hot_dir = os.path.join(vm_test_config.root_dir, 'hot')
+    archive_dir = os.path.join(vm_test_config.root_dir, 'archive')
+    crashed = vending_machine_for(request, vm_test_config, blockfrost_api, artifact_store=ArtifactStore(hot_dir, archive_dir), journal=journal_for(vm_test_config))
+    crash_vend(crashed, vm_test_config, monkeypatch, blockfrost_api, 'submit_txn')
+    shutil.rmtree(hot_dir)
+
+    restarted = vending_machine_for(request, vm_test_config, blockfrost_api, artifact_store=ArtifactStore(hot_dir, archive_dir), journal=journal_for(vm_test_config))
+    restarted.recover(set())
+    assert len(blockfrost_api.submitted) == 1
+    assert os.path.dirname(blockfrost_api.submitted[0]) == os.path.join(archive_dir, ArtifactStore.DURABLE_DIR)
+    assert restarted.journal.state_of(payment) == VendJournal.SUBMITTED
+
+def test_recovery_rolls_back_vend_whose_signed_txn_was_lost(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    payment = blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    crashed = vending_machine_for(request, vm_test_config, blockfrost_api, journal=journal_for(vm_test_config))
+    crash_vend(crashed, vm_test_config, monkeypatch, blockfrost_api, 'submit_txn')
+    signed_files = glob.glob(os.path.join(vm_test_config.txn_dir, '*.signed'))
+    assert signed_files
+    for signed_file in signed_files:
+        os.remove(signed_file)
+
+    restarted = vending_machine_for(request, vm_test_config, blockfrost_api, journal=journal_for(vm_test_config))
+    exclusions = set()
+    restarted.recover(exclusions)
+    assert not exclusions and not blockfrost_api.submitted
+    assert restarted.journal.state_of(payment) is None
+    assert len(restarted.mint.inventory) == 2 and not os.listdir(vm_test_config.locked_dir)
+    vend_once(restarted, vm_test_config, exclusions)
+    assert len(blockfrost_api.submitted) == 1 and len(os.listdir(vm_test_config.locked_dir)) == 2
+
+def test_recovery_releases_files_reserved_before_locking(request, vm_test_config, monkeypatch):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    payment = blockfrost_api.pay('aa' * 32, 2 * MINT_PRICE)
+    crashed = vending_machine_for(request, vm_test_config, blockfrost_api, journal=journal_for(vm_test_config))
+    crash_vend(crashed, vm_test_config, monkeypatch, crashed.mint.inventory, 'move_out')
+    assert VendJournal(crashed.journal.journal_file).replay().state_of(payment) == VendJournal.RESERVED
+
+    restarted = vending_machine_for(request, vm_test_config, blockfrost_api, journal=journal_for(vm_test_config))
+    restarted.recover(set())
+    assert restarted.journal.state_of(payment) is None
+    assert len(restarted.mint.inventory) == 2 and not os.listdir(vm_test_config.locked_dir)
+
+def test_recovery_redoes_whitelist_consumption(request, vm_test_config, monkeypatch):
+    wl_asset = TANGZ_POLICY + '01'
+    os.makedirs(vm_test_config.whitelist_dir)
+    os.makedirs(vm_test_config.consumed_dir)
+    open(os.path.join(vm_test_config.whitelist_dir, wl_asset), 'w').close()
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    payment = blockfrost_api.pay('aa' * 32, MINT_PRICE, outputs=[{'amount': [{'unit': wl_asset, 'quantity': '1'}]}])
+    whitelist = SingleUseWhitelist(vm_test_config.whitelist_dir, vm_test_config.consumed_dir)
+    crashed = vending_machine_for(request, vm_test_config, blockfrost_api, whitelist=whitelist, journal=journal_for(vm_test_config))
+    crash_vend(crashed, vm_test_config, monkeypatch, whitelist, 'consume')
+    assert whitelist.is_whitelisted(wl_asset) and not blockfrost_api.submitted
+
+    restarted = vending_machine_for(request, vm_test_config, blockfrost_api, whitelist=whitelist, journal=journal_for(vm_test_config))
+    restarted.recover(set())
+    assert not whitelist.is_whitelisted(wl_asset)
+    assert len(blockfrost_api.submitted) == 1
+    assert restarted.journal.state_of(payment) == VendJournal.SUBMITTED
+
+def test_exclusion_tracker_prunes_spent_payments(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 3))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 2, 1)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api)
+    exclusions = ExclusionTracker()
+    vend_once(nft_vending_machine, vm_test_config, exclusions)
+    assert len(blockfrost_api.submitted) == 2 and len(exclusions) == 2
+    spent = blockfrost_api.utxos.pop(0)
+    vend_once(nft_vending_machine, vm_test_config, exclusions)
+    assert len(exclusions) == 1 and not spent in exclusions
+    assert len(blockfrost_api.submitted) == 2
+
+def test_writes_combined_metadata_once_per_txn(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 7))
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 3, 2)
+    nft_vending_machine = vending_machine_for(request, vm_test_config, blockfrost_api, batch_buyers_max=3)
+    assert nft_vending_machine.mint.asset_index['WildTangz 1.json'] == ('WildTangz 1', 'WildTangz 1'.encode('UTF-8').hex(), 11)
+    vend_once(nft_vending_machine, vm_test_config, set())
+    combined_files = os.listdir(vm_test_config.txn_metadata_dir)
+    assert len(combined_files) == 1
+    with open(os.path.join(vm_test_config.txn_metadata_dir, combined_files[0]), 'r') as combined_filehandle:
+        combined = json.load(combined_filehandle)['721'][TANGZ_POLICY]
+    assert sorted(combined.keys()) == sorted([f"WildTangz {serial}" for serial in range(1, 7)])
+
+def test_writes_combined_metadata_as_cbor(request, vm_test_config):
+    stock_metadata(request, vm_test_config.metadata_dir, range(1, 5))
+    originals = {}
+    for filename in os.listdir(vm_test_config.metadata_dir):
+        with open(os.path.join(vm_test_config.metadata_dir, filename), 'r') as nft_filehandle:
+            originals.update(json.load(nft_filehandle)['721'][TANGZ_POLICY])
+    blockfrost_api = OfflineBlockfrostApi()
+    pay_buyers(blockfrost_api, 2, 2)
+    vend_once(vending_machine_for(request, vm_test_config, blockfrost_api, batch_buyers_max=2, metadata_cbor=True), vm_test_config, set())
+    combined_files = os.listdir(vm_test_config.txn_metadata_dir)
+    assert len(blockfrost_api.submitted) == 1
+    assert len(combined_files) == 1 and combined_files[0].endswith('.cbor')
+    with open(os.path.join(vm_test_config.txn_metadata_dir, combined_files[0]), 'rb') as combined_filehandle:
+        combined = combined_filehandle.read()
+    assert len(combined) == len(cbor.encode_metadata_json({'721': {TANGZ_POLICY: originals}}))
+    assert all([cbor.encode(asset_name) in combined for asset_name in originals.keys()])